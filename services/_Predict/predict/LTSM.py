@@ -2,7 +2,10 @@
 import os, math, pickle, requests, numpy as np, pandas as pd, matplotlib.pyplot as plt
 from sklearn.preprocessing import MinMaxScaler
 import torch, torch.nn as nn
-from torch.utils.data import DataLoader, TensorDataset
+from numpy.lib.stride_tricks import sliding_window_view
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+from marketdata.fetcher import interval_ms
+from marketdata.klines import last_closed_ms, load_klines
 
 # ------------ Global Config ------------
 SYMBOL      = "LTCUSDT"
@@ -16,6 +19,11 @@ LR          = 1e-3
 DEVICE      = "cuda" if torch.cuda.is_available() else "cpu"
 MODELS_DIR  = "./models"
 FORCE_TRAIN = False   # True để ép train lại dù đã có model
+FINE_TUNE   = False   # True: model đã có → chỉ fine-tune trên nến mới (xem fine_tune_saved)
+FINETUNE_EPOCHS = 5
+FINETUNE_LR     = 1e-4
+EXPORT_TORCHSCRIPT = os.getenv("EXPORT_TORCHSCRIPT", "1") == "1"  # ghi .ts khi lưu model
+EXPORT_INT8 = os.getenv("EXPORT_TORCHSCRIPT_INT8", "1") == "1"     # ghi thêm _int8.ts (dynamic quantization)
 
 os.makedirs(MODELS_DIR, exist_ok=True)
 
@@ -29,79 +37,80 @@ def horizon_for_interval(interval: str) -> int:
     # 15m và các trường hợp khác: mặc định 3 cho đồng bộ
     return 3
 
-# ------------ Binance fetch ------------
-def _interval_ms(interval: str) -> int:
-    unit = interval[-1].lower(); val = int(interval[:-1])
-    mult = {"m":60_000, "h":3_600_000, "d":86_400_000}[unit]
-    return val * mult
-
+# ------------ Klines ------------
 def _to_ms(ts: str):
     if not ts: return None
     dt = pd.to_datetime(ts, utc=True, errors="coerce")
     if pd.isna(dt): return None
     return int(dt.value // 1_000_000)
 
-def _fetch_batch(symbol, interval, start_ms=None, end_ms=None, limit=1000):
-    url = "https://api.binance.com/api/v3/klines"
-    params = {"symbol": symbol.upper(), "interval": interval, "limit": limit}
-    if start_ms is not None: params["startTime"] = start_ms
-    if end_ms   is not None: params["endTime"]   = end_ms
-    r = requests.get(url, params=params, timeout=20); r.raise_for_status()
-    data = r.json()
-    if not data:
-        return pd.DataFrame(columns=["t","open","high","low","close","volume"])
-    df = pd.DataFrame(data, columns=[
-        "open_time","open","high","low","close","volume",
-        "close_time","q_vol","n_trades","tb_base","tb_quote","ignore"
-    ])
-    df["t"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
-    df = df[["t","open","high","low","close","volume"]].astype(float, errors="ignore")
-    df["t"] = df["t"].dt.tz_convert("UTC")
-    return df
-
 def fetch_klines_all(symbol: str, interval: str, start: str=None, end: str=None):
-    start_ms = _to_ms(start)
-    end_ms   = _to_ms(end)
-    step = _interval_ms(interval) * 1000
-    frames, cur = [], start_ms
-    while True:
-        batch_end = None
-        if cur is not None and end_ms is not None:
-            batch_end = min(cur + step - 1, end_ms)
-        elif cur is not None:
-            batch_end = cur + step - 1
-        df = _fetch_batch(symbol, interval, start_ms=cur, end_ms=batch_end, limit=1000)
-        if df.empty: break
-        frames.append(df)
-        last_open = df.iloc[-1]["t"]
-        cur = int(last_open.value // 1_000_000) + _interval_ms(interval)
-        if end_ms is not None and cur > end_ms: break
-        if len(frames) > 2000: break
-    if not frames:
+    """
+    Nến [start, end] (start=None → 1000 nến mới nhất), đọc qua kho nến dùng chung
+    với service backtest (services/marketdata): khoảng đã có không tải lại.
+    """
+    cols = load_klines(symbol, interval, _to_ms(start), _to_ms(end))
+    if not len(cols["t"]):
         return pd.DataFrame(columns=["t","open","high","low","close","volume"])
-    out = pd.concat(frames, ignore_index=True).dropna()
-    if start_ms: out = out[out["t"] >= pd.to_datetime(start_ms, unit="ms", utc=True)]
-    if end_ms:   out = out[out["t"] <= pd.to_datetime(end_ms,   unit="ms", utc=True)]
-    out = out.drop_duplicates(subset=["t"]).sort_values("t").reset_index(drop=True)
+    df = pd.DataFrame({c: cols[c] for c in ("open","high","low","close","volume")})
+    df.insert(0, "t", pd.to_datetime(cols["t"], unit="ms", utc=True))
+    out = df.dropna().reset_index(drop=True)
     return out
 
+def closed_klines(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Bỏ nến đang chạy (chưa đóng) ở cuối: dữ liệu train và trained_until_ms chỉ
+    tính trên nến đã đóng, nếu không lần fine-tune sau sẽ bỏ qua giá đóng thật của nến đó.
+    """
+    if df.empty:
+        return df
+    return df[df["t"] <= pd.Timestamp(last_closed_ms(interval), unit="ms", tz="UTC")].reset_index(drop=True)
+
 # ------------ Data utils ------------
 def make_sequences_multi(series_2d: np.ndarray, seq_len: int, H: int):
     """
     series_2d: shape (N, 1) với cột 'close' đã scale
-    Trả về:
-      X: (M, seq_len, 1)
+    Trả về (view trên series, không copy — chỉ đọc):
+      X: (M, seq_len)
       y: (M, H)
+    với M = N - seq_len - H + 1; X[i] = s[i:i+seq_len], y[i] = s[i+seq_len:i+seq_len+H].
+    """
+    s = np.asarray(series_2d)[:, 0]
+    if len(s) < seq_len + H:
+        return np.empty((0, seq_len), dtype=s.dtype), np.empty((0, H), dtype=s.dtype)
+    win = sliding_window_view(s, seq_len + H)  # (M, seq_len+H), stride 1 phần tử
+    return win[:, :seq_len], win[:, seq_len:]
+
+def num_windows(n: int, seq_len: int, H: int) -> int:
+    return max(0, n - seq_len - H + 1)
+
+class SlidingWindowDataset(Dataset):
+    """
+    Dataset sinh cửa sổ (x, y) lazily từ chuỗi đã scale: chỉ giữ 1 bản float32
+    của chuỗi (O(N)), mỗi batch mới gather ra (B, seq_len, 1) và (B, H).
+    Index là int hoặc list index (dùng với BatchSampler, xem window_loader).
+    Cửa sổ [start, stop) cho phép chia train/val trên cùng một chuỗi.
     """
-    X, y = [], []
-    n = len(series_2d)
-    # cần còn đủ H phần tử phía trước để gán nhãn
-    for i in range(seq_len, n - H + 1):
-        X.append(series_2d[i-seq_len:i, 0])
-        y.append(series_2d[i:i+H, 0])
-    X = np.array(X)
-    y = np.array(y)
-    return X, y
+    def __init__(self, series_2d: np.ndarray, seq_len: int, H: int, start: int = 0, stop: int = None):
+        s = torch.from_numpy(np.ascontiguousarray(np.asarray(series_2d, dtype=np.float32).reshape(-1)))
+        m = num_windows(len(s), seq_len, H)
+        self.windows = s.unfold(0, seq_len + H, 1) if m else s.new_empty((0, seq_len + H))  # view
+        self.seq_len = seq_len
+        self.start = start
+        self.stop = m if stop is None else min(stop, m)
+    def __len__(self):
+        return max(0, self.stop - self.start)
+    def __getitem__(self, idx):
+        if isinstance(idx, int):
+            w = self.windows[self.start + idx]
+            return w[:self.seq_len].unsqueeze(-1), w[self.seq_len:]
+        w = self.windows[torch.as_tensor(idx, dtype=torch.long) + self.start]  # (B, seq_len+H)
+        return w[:, :self.seq_len].unsqueeze(-1), w[:, self.seq_len:]
+
+def window_loader(ds: SlidingWindowDataset, batch_size: int, shuffle: bool) -> DataLoader:
+    """DataLoader lấy cả batch trong 1 lần index (không collate từng mẫu)."""
+    sampler = RandomSampler(ds) if shuffle else SequentialSampler(ds)
+    return DataLoader(ds, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None)
 
 # ------------ Model ------------
 class LSTMPredictor(nn.Module):
@@ -124,15 +133,65 @@ def model_paths(symbol: str, interval: str, seq_len: int, H: int):
         os.path.join(MODELS_DIR, base + "_scaler.pkl"),
     )
 
-def save_model_and_scaler(model: nn.Module, scaler: MinMaxScaler, symbol: str, interval: str, seq_len: int, H: int):
+def script_path(symbol: str, interval: str, seq_len: int, H: int, quantized: bool = False) -> str:
+    base = f"LSTM_{symbol}_{interval}_seq{seq_len}_H{H}"
+    return os.path.join(MODELS_DIR, base + ("_int8.ts" if quantized else ".ts"))
+
+def to_torchscript(model: nn.Module, quantize: bool = False) -> torch.jit.ScriptModule:
+    """
+    TorchScript của model (CPU, eval). quantize=True: dynamic int8 cho LSTM + Linear
+    (trọng số int8, activation quantize lúc chạy) — nhỏ hơn ~4x, nhanh hơn trên CPU.
+    """
+    in_size = model.lstm.input_size
+    m = LSTMPredictor(input_size=in_size, hidden=model.lstm.hidden_size, num_layers=model.lstm.num_layers,
+                      dropout=model.lstm.dropout, output_size=model.fc.out_features)
+    m.load_state_dict({k: v.detach().cpu() for k, v in model.state_dict().items()})
+    m.eval()
+    if quantize:
+        m = torch.ao.quantization.quantize_dynamic(m, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    with torch.no_grad():
+        traced = torch.jit.trace(m, torch.zeros(1, SEQ_LEN, in_size))  # aten::lstm: không cố định B, T
+    # fp32: freeze để inline trọng số + fold hằng; module quantized giữ nguyên
+    return traced if quantize else torch.jit.freeze(traced)
+
+def export_torchscript(model: nn.Module, symbol: str, interval: str, seq_len: int, H: int,
+                       quantize: bool = False) -> str:
+    """Ghi artifact TorchScript (.ts / _int8.ts) cạnh checkpoint; trả đường dẫn."""
+    path = script_path(symbol, interval, seq_len, H, quantized=quantize)
+    torch.jit.save(to_torchscript(model, quantize=quantize), path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+def save_model_and_scaler(model: nn.Module, scaler: MinMaxScaler, symbol: str, interval: str, seq_len: int, H: int,
+                          optimizer: torch.optim.Optimizer = None, meta: dict = None):
+    """
+    meta: thông tin train lưu trong checkpoint, quan trọng nhất là trained_until_ms
+    (open time nến cuối đã dùng) để fine_tune_saved biết cần học tiếp từ đâu.
+    optimizer: lưu state (moment của Adam) để fine-tune tiếp tục thay vì khởi động lạnh.
+    """
     path_pt, path_h5, path_scl = model_paths(symbol, interval, seq_len, H)
+    # ghi ra file tạm rồi os.replace: process predict đang đọc không thấy file ghi dở
     # PyTorch checkpoint
     torch.save({"state_dict": model.state_dict(),
-                "arch": {"input_size": 1, "hidden": 64, "num_layers": 2, "dropout": 0.1, "output_size": H}},
-               path_pt)
+                "arch": {"input_size": 1, "hidden": 64, "num_layers": 2, "dropout": 0.1, "output_size": H},
+                "optimizer": optimizer.state_dict() if optimizer is not None else None,
+                "meta": meta or {}},
+               path_pt + ".tmp")
     # Scaler
-    with open(path_scl, "wb") as f:
+    with open(path_scl + ".tmp", "wb") as f:
         pickle.dump(scaler, f)
+    # TorchScript cho inference backend (predict/inference.py); ghi trước .pt để
+    # khi mtime .pt đổi thì artifact mới đã sẵn sàng
+    for quantize, enabled in ((False, EXPORT_TORCHSCRIPT), (True, EXPORT_TORCHSCRIPT and EXPORT_INT8)):
+        try:
+            if enabled:
+                print(f"Saved: {export_torchscript(model, symbol, interval, seq_len, H, quantize=quantize)}")
+            elif os.path.exists(script_path(symbol, interval, seq_len, H, quantize)):
+                os.remove(script_path(symbol, interval, seq_len, H, quantize))  # artifact cũ không còn khớp
+        except Exception as e:
+            print(f"[WARN] Không export được TorchScript (int8={quantize}): {e}")
+    os.replace(path_scl + ".tmp", path_scl)
+    os.replace(path_pt + ".tmp", path_pt)
     # HDF5 (tùy chọn)
     try:
         import h5py
@@ -154,7 +213,8 @@ def save_model_and_scaler(model: nn.Module, scaler: MinMaxScaler, symbol: str, i
     if os.path.exists(path_h5):
         print(f"Saved: {path_h5}")
 
-def load_model(symbol: str, interval: str, seq_len: int, H: int):
+def load_checkpoint(symbol: str, interval: str, seq_len: int, H: int):
+    """(model, scaler, checkpoint dict) — checkpoint gồm cả optimizer state và meta nếu có."""
     path_pt, _, path_scl = model_paths(symbol, interval, seq_len, H)
     print(f"[LOAD] model={path_pt}  scaler={path_scl}")
     with open(path_scl, "rb") as f:
@@ -166,12 +226,135 @@ def load_model(symbol: str, interval: str, seq_len: int, H: int):
     model = LSTMPredictor(**arch).to(DEVICE)
     model.load_state_dict(checkpoint["state_dict"])
     model.eval()
+    return model, scaler, checkpoint
+
+def load_model(symbol: str, interval: str, seq_len: int, H: int):
+    model, scaler, _ = load_checkpoint(symbol, interval, seq_len, H)
     return model, scaler
 
+def trained_until_ms(symbol: str, interval: str, seq_len: int, H: int):
+    """trained_until_ms trong meta của checkpoint; None nếu chưa có model hoặc checkpoint cũ."""
+    if not has_saved_model(symbol, interval, seq_len, H):
+        return None
+    checkpoint = torch.load(model_paths(symbol, interval, seq_len, H)[0], map_location="cpu")
+    return (checkpoint.get("meta") or {}).get("trained_until_ms")
+
 def has_saved_model(symbol: str, interval: str, seq_len: int, H: int) -> bool:
     path_pt, _, path_scl = model_paths(symbol, interval, seq_len, H)
     return os.path.exists(path_pt) and os.path.exists(path_scl)
 
+# ------------ Train ------------
+def _fit(model: nn.Module, opt: torch.optim.Optimizer, train_loader: DataLoader, val_loader, epochs: int, tag: str):
+    """Vòng train; val_loader=None → bỏ qua validation. Trả train_loss của epoch cuối."""
+    crit = nn.MSELoss()
+    tr_loss = float("nan")
+    for ep in range(1, epochs+1):
+        model.train()
+        tr_loss = 0.0
+        for xb, yb in train_loader:
+            xb, yb = xb.to(DEVICE), yb.to(DEVICE)
+            opt.zero_grad()
+            pred = model(xb)              # (B, H)
+            loss = crit(pred, yb)
+            loss.backward()
+            opt.step()
+            tr_loss += loss.item() * xb.size(0)
+        tr_loss /= len(train_loader.dataset)
+
+        model.eval()
+        if val_loader is None:
+            print(f"[{tag}] Epoch {ep:3d}/{epochs}  train_loss={tr_loss:.6f}")
+            continue
+        vl_loss = 0.0
+        with torch.no_grad():
+            for xb, yb in val_loader:
+                xb, yb = xb.to(DEVICE), yb.to(DEVICE)
+                pred = model(xb)
+                loss = crit(pred, yb)
+                vl_loss += loss.item() * xb.size(0)
+        vl_loss /= max(1, len(val_loader.dataset))
+        print(f"[{tag}] Epoch {ep:3d}/{epochs}  train_loss={tr_loss:.6f}  val_loss={vl_loss:.6f}")
+    model.eval()
+    return tr_loss
+
+def train_model(close_vals: np.ndarray, seq_len: int, H: int, epochs: int = EPOCHS, tag: str = ""):
+    """
+    Train LSTMPredictor từ đầu trên chuỗi close (N, 1); trả (model đã eval(), scaler, optimizer).
+    Dùng chung cho script này và training worker.
+    """
+    scaler = MinMaxScaler(feature_range=(0,1))
+    scaled = scaler.fit_transform(close_vals)
+
+    M = num_windows(len(scaled), seq_len, H)
+    if M < 10:
+        raise ValueError("not_enough_samples")
+    train_len = int(M * 0.8)
+
+    # cửa sổ sinh lazily từ chuỗi scaled: bộ nhớ O(N) thay vì O(N·seq_len)
+    train_loader = window_loader(SlidingWindowDataset(scaled, seq_len, H, 0, train_len), BATCH, shuffle=True)
+    val_loader   = window_loader(SlidingWindowDataset(scaled, seq_len, H, train_len), BATCH, shuffle=False)
+
+    model = LSTMPredictor(output_size=H).to(DEVICE)
+    opt   = torch.optim.Adam(model.parameters(), lr=LR)
+    _fit(model, opt, train_loader, val_loader, epochs, tag)
+    return model, scaler, opt
+
+def train_meta(df: pd.DataFrame, mode: str, epochs: int, **extra) -> dict:
+    """Meta lưu trong checkpoint; t là open time (UTC) của nến."""
+    t = pd.to_datetime(df["t"], utc=True)
+    return {"trained_from_ms": int(t.iloc[0].value // 1_000_000),
+            "trained_until_ms": int(t.iloc[-1].value // 1_000_000),
+            "mode": mode, "epochs": epochs, "samples": int(len(df)), **extra}
+
+def fine_tune_saved(symbol: str, interval: str, seq_len: int, H: int, end: str = None,
+                    epochs: int = FINETUNE_EPOCHS, lr: float = FINETUNE_LR) -> dict:
+    """
+    Học tiếp model đã lưu chỉ trên nến sau trained_until_ms (kèm seq_len+H nến trước
+    đó làm ngữ cảnh cho các cửa sổ đầu), khôi phục cả optimizer state.
+
+    Scaler giữ nguyên (không fit lại): cùng một giá luôn scale ra cùng giá trị nên
+    output của model trước/sau fine-tune so sánh được. Giá mới vượt khỏi [min, max]
+    cũ vẫn scale tuyến tính ra ngoài [0, 1]; tỉ lệ này được trả về (out_of_range_pct)
+    để biết khi nào nên train lại toàn bộ.
+    """
+    model, scaler, checkpoint = load_checkpoint(symbol, interval, seq_len, H)
+    meta = checkpoint.get("meta") or {}
+    until = meta.get("trained_until_ms")
+    if until is None:
+        raise ValueError("checkpoint_has_no_trained_until")
+
+    iv = interval_ms(interval)
+    since = pd.Timestamp(until - (seq_len + H) * iv, unit="ms", tz="UTC").strftime("%Y-%m-%dT%H:%M:%SZ")
+    df = closed_klines(fetch_klines_all(symbol, interval, since, end), interval)
+    new_candles = 0 if df.empty else int((df["t"] > pd.Timestamp(until, unit="ms", tz="UTC")).sum())
+    info = {"mode": "finetune", "new_candles": new_candles, "trained_until_ms": until}
+    if new_candles == 0 or num_windows(len(df), seq_len, H) == 0:
+        return info  # không có gì mới để học
+
+    close_vals = df[["close"]].values.astype(float)
+    scaled = scaler.transform(close_vals)
+    lo, hi = scaler.data_min_[0], scaler.data_max_[0]
+    new_close = close_vals[-new_candles:, 0]
+    out_of_range = float(((new_close < lo) | (new_close > hi)).mean() * 100.0)
+
+    opt = torch.optim.Adam(model.parameters(), lr=lr)
+    if checkpoint.get("optimizer"):
+        opt.load_state_dict(checkpoint["optimizer"])
+    for group in opt.param_groups:
+        group["lr"] = lr
+
+    loader = window_loader(SlidingWindowDataset(scaled, seq_len, H), BATCH, shuffle=True)
+    loss = _fit(model, opt, loader, None, epochs, f"{symbol} {interval} H={H} finetune")
+
+    new_meta = train_meta(df, "finetune", epochs,
+                          trained_from_ms_initial=meta.get("trained_from_ms_initial", meta.get("trained_from_ms")),
+                          finetunes=int(meta.get("finetunes", 0)) + 1,
+                          out_of_range_pct=round(out_of_range, 2))
+    save_model_and_scaler(model, scaler, symbol, interval, seq_len, H, optimizer=opt, meta=new_meta)
+    info.update(trained_until_ms=new_meta["trained_until_ms"], train_loss=loss,
+                out_of_range_pct=round(out_of_range, 2))
+    return info
+
 # ------------ Train or Load per timeframe ------------
 def train_or_load(interval: str):
     H = horizon_for_interval(interval)
@@ -184,57 +367,18 @@ def train_or_load(interval: str):
 
     # 2) Load hoặc train
     if has_saved_model(SYMBOL, interval, SEQ_LEN, H) and not FORCE_TRAIN:
+        if FINE_TUNE and trained_until_ms(SYMBOL, interval, SEQ_LEN, H) is not None:
+            print("[INFO] Fine-tune model đã lưu trên nến mới…")
+            print(f"[INFO] {fine_tune_saved(SYMBOL, interval, SEQ_LEN, H, END)}")
         print("[INFO] Tìm thấy model đã lưu. Đang load…")
         model, scaler = load_model(SYMBOL, interval, SEQ_LEN, H)
-        scaled = scaler.transform(close_vals)
     else:
         print("[INFO] Chưa có model hoặc FORCE_TRAIN=True → bắt đầu huấn luyện…")
-        scaler = MinMaxScaler(feature_range=(0,1))
-        scaled = scaler.fit_transform(close_vals)
-
-        X, y = make_sequences_multi(scaled, SEQ_LEN, H)  # y shape: (M, H)
-        train_len = int(len(X) * 0.8)
-        X_train, y_train = X[:train_len], y[:train_len]
-        X_val,   y_val   = X[train_len:], y[train_len:]
-
-        X_train_t = torch.tensor(X_train, dtype=torch.float32).unsqueeze(-1)  # (B, T, 1)
-        y_train_t = torch.tensor(y_train, dtype=torch.float32)                # (B, H)
-        X_val_t   = torch.tensor(X_val,   dtype=torch.float32).unsqueeze(-1)
-        y_val_t   = torch.tensor(y_val,   dtype=torch.float32)
-
-        train_loader = DataLoader(TensorDataset(X_train_t, y_train_t), batch_size=BATCH, shuffle=True)
-        val_loader   = DataLoader(TensorDataset(X_val_t,   y_val_t),   batch_size=BATCH, shuffle=False)
-
-        model = LSTMPredictor(output_size=H).to(DEVICE)
-        crit  = nn.MSELoss()
-        opt   = torch.optim.Adam(model.parameters(), lr=LR)
-
-        for ep in range(1, EPOCHS+1):
-            model.train()
-            tr_loss = 0.0
-            for xb, yb in train_loader:
-                xb, yb = xb.to(DEVICE), yb.to(DEVICE)
-                opt.zero_grad()
-                pred = model(xb)              # (B, H)
-                loss = crit(pred, yb)
-                loss.backward()
-                opt.step()
-                tr_loss += loss.item() * xb.size(0)
-            tr_loss /= len(train_loader.dataset)
-
-            model.eval()
-            vl_loss = 0.0
-            with torch.no_grad():
-                for xb, yb in val_loader:
-                    xb, yb = xb.to(DEVICE), yb.to(DEVICE)
-                    pred = model(xb)
-                    loss = crit(pred, yb)
-                    vl_loss += loss.item() * xb.size(0)
-            vl_loss /= max(1, len(val_loader.dataset))
-            print(f"[{interval} H={H}] Epoch {ep:3d}/{EPOCHS}  train_loss={tr_loss:.6f}  val_loss={vl_loss:.6f}")
-
-        # Lưu model + scaler để lần sau load
-        save_model_and_scaler(model, scaler, SYMBOL, interval, SEQ_LEN, H)
+        train_df = closed_klines(df, interval)
+        model, scaler, opt = train_model(train_df[["close"]].values.astype(float), SEQ_LEN, H, tag=f"{interval} H={H}")
+        # Lưu model + scaler (+ optimizer, trained_until) để lần sau load / fine-tune
+        save_model_and_scaler(model, scaler, SYMBOL, interval, SEQ_LEN, H,
+                              optimizer=opt, meta=train_meta(train_df, "full", EPOCHS))
 
     # 3) Dự đoán H nến kế tiếp (multi-step direct)
     scaled_full = scaler.transform(close_vals)  # đảm bảo dùng scaler hiện tại
@@ -1,7 +1,9 @@
 # backtest/api/predict.py
 from flask import Blueprint, request, jsonify
+import os
 import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 import torch
 
@@ -9,21 +11,21 @@ import torch
 # Lưu ý: sửa đường dẫn import cho khớp cấu trúc dự án của bạn
 from ..LTSM import (
     horizon_for_interval, fetch_klines_all,           # data loader
-    has_saved_model, load_model, save_model_and_scaler,
-    LSTMPredictor, make_sequences_multi,              # kiến trúc + seq
-    MinMaxScaler, SEQ_LEN, EPOCHS, BATCH, LR, DEVICE  # siêu tham số mặc định
+    has_saved_model,
+    SEQ_LEN, DEVICE                                   # siêu tham số mặc định
 )
+from ..registry import model_registry
+from ..training import training_manager
+from ..batching import arch_of, stack_predictors, grouped_forward
+from marketdata.fetcher import default_fetcher, interval_ms
 
 bp = Blueprint("predict", __name__, url_prefix="/api/predict")
 
-def _interval_ms(interval: str) -> int:
-    unit = interval[-1].lower(); val = int(interval[:-1])
-    mult = {"m":60_000, "h":3_600_000, "d":86_400_000}[unit]
-    return val * mult
+BATCH_MAX_ITEMS = int(os.getenv("PREDICT_BATCH_MAX_ITEMS", "50"))
 
 def _future_timestamps(last_ts: pd.Timestamp, interval: str, H: int):
     # last_ts là UTC Timestamp (cuối chuỗi huấn luyện)
-    step = _interval_ms(interval) // 1000  # giây
+    step = interval_ms(interval) // 1000  # giây
     out = []
     cur = last_ts
     for i in range(1, H+1):
@@ -31,6 +33,36 @@ def _future_timestamps(last_ts: pd.Timestamp, interval: str, H: int):
         out.append(cur.strftime("%Y-%m-%dT%H:%M:%SZ"))
     return out
 
+def _prediction_payload(symbol: str, interval: str, H: int, df: pd.DataFrame,
+                        close_vals: np.ndarray, next_closes: np.ndarray) -> dict:
+    last_close = float(close_vals[-1, 0])
+    last_ts = pd.to_datetime(df.iloc[-1]["t"], utc=True)
+    future_ts = _future_timestamps(last_ts, interval, H)
+
+    items = []
+    for i in range(H):
+        pred = float(next_closes[i])
+        delta = pred - last_close
+        direction = "UP" if delta > 0 else ("DOWN" if delta < 0 else "FLAT")
+        items.append({
+            "step": i + 1,
+            "t": future_ts[i],
+            "pred_close": round(pred, 6),
+            "delta": round(delta, 6),
+            "direction": direction
+        })
+
+    return {
+        "symbol": symbol,
+        "interval": interval,
+        "horizon": H,
+        "last": {
+            "t": df.iloc[-1]["t"],
+            "close": last_close
+        },
+        "predictions": items
+    }
+
 @bp.route("/run", methods=["POST"])
 def run_predict():
     """
@@ -39,7 +71,8 @@ def run_predict():
       "symbol": "BTCUSDT",
       "interval": "1h",              // 15m | 1h | 4h | 1d ...
       "seq_len": 100,                // optional, default SEQ_LEN
-      "force_train": false,          // optional
+      "force_train": false,          // optional: train lại từ đầu (job nền)
+      "update": false,               // optional: fine-tune model hiện có trên nến mới (job nền)
       "start": "2019-01-01T00:00:00Z", // optional để giới hạn dữ liệu train
       "end":   null                  // optional
     }
@@ -50,6 +83,7 @@ def run_predict():
     interval = p.get("interval", "1h")
     seq_len  = int(p.get("seq_len", SEQ_LEN))
     force    = bool(p.get("force_train", False))
+    update   = bool(p.get("update", False))
     start    = p.get("2019-01-01T00:00:00Z")  # ISO Z or None
     end      = p.get(None)    # ISO Z or None
 
@@ -58,91 +92,137 @@ def run_predict():
     # 1) Xác định chân trời dự đoán theo timeframe
     H = horizon_for_interval(interval)   # ví dụ: 15m→3, 1h→3, 1d→5
 
-    # 2) Lấy dữ liệu đóng giá
+    # 2) Model: train chạy ở worker process (predict/training.py), request không chờ.
+    #    Đang train → trả ngay "training in progress", hoặc dùng model tốt gần nhất nếu đã có.
+    training = None
+    if force or not has_saved_model(symbol, interval, seq_len, H):
+        training, _ = training_manager().submit(symbol, interval, seq_len, H, start, end)
+    elif update:
+        training, _ = training_manager().submit(symbol, interval, seq_len, H, start, end, mode="finetune")
+    if not has_saved_model(symbol, interval, seq_len, H):
+        return jsonify({"status": "training", "message": "training in progress", "job": training}), 202
+    model, scaler = model_registry().get(symbol, interval, seq_len, H)
+
+    # 3) Lấy dữ liệu đóng giá
     df = fetch_klines_all(symbol, interval, start, end)
     if df is None or df.empty:
         return jsonify({"error": "no_data"}), 400
 
     close_vals = df[["close"]].values.astype(float)
 
-    # 3) Load model nếu có & không ép train; ngược lại train nhanh
-    if has_saved_model(symbol, interval, seq_len, H) and not force:
-        model, scaler = load_model(symbol, interval, seq_len, H)
-        scaled = scaler.transform(close_vals)
-    else:
-        # Train ngắn gọn (dựa trên LTSM.py)
-        scaler = MinMaxScaler(feature_range=(0,1))
-        scaled = scaler.fit_transform(close_vals)
-
-        X, y = make_sequences_multi(scaled, seq_len, H)   # y shape: (M, H)
-        if len(X) < 10:
-            return jsonify({"error": "not_enough_samples"}), 400
-
-        # train/val split
-        train_len = int(len(X) * 0.8)
-        X_train, y_train = X[:train_len], y[:train_len]
-        X_val,   y_val   = X[train_len:], y[train_len:]
-
-        X_train_t = torch.tensor(X_train, dtype=torch.float32).unsqueeze(-1)  # (B, T, 1)
-        y_train_t = torch.tensor(y_train, dtype=torch.float32)                # (B, H)
-        X_val_t   = torch.tensor(X_val,   dtype=torch.float32).unsqueeze(-1)
-        y_val_t   = torch.tensor(y_val,   dtype=torch.float32)
-
-        model = LSTMPredictor(output_size=H).to(DEVICE)
-        crit  = torch.nn.MSELoss()
-        opt   = torch.optim.Adam(model.parameters(), lr=LR)
-
-        # quick training theo EPOCHS mặc định trong LTSM.py
-        train_ds = torch.utils.data.TensorDataset(X_train_t, y_train_t)
-        val_ds   = torch.utils.data.TensorDataset(X_val_t,   y_val_t)
-        train_loader = torch.utils.data.DataLoader(train_ds, batch_size=BATCH, shuffle=True)
-        val_loader   = torch.utils.data.DataLoader(val_ds,   batch_size=BATCH, shuffle=False)
-
-        for _ in range(EPOCHS):
-            model.train()
-            for xb, yb in train_loader:
-                xb, yb = xb.to(DEVICE), yb.to(DEVICE)
-                opt.zero_grad()
-                loss = crit(model(xb), yb)
-                loss.backward()
-                opt.step()
-
-        # lưu lại cho lần sau
-        save_model_and_scaler(model, scaler, symbol, interval, seq_len, H)
-
     # 4) Suy luận H điểm tương lai (multi-step direct)
     scaled_full = scaler.transform(close_vals)
     last_seq = scaled_full[-seq_len:].reshape(1, seq_len, 1)
     with torch.no_grad():
         next_scaled_vec = model(torch.tensor(last_seq, dtype=torch.float32, device=DEVICE)).cpu().numpy()  # (1, H)
     next_closes = scaler.inverse_transform(next_scaled_vec.reshape(-1, 1)).reshape(-1)  # (H,)
-    last_close = float(close_vals[-1, 0])
 
     # 5) Chuẩn response
-    last_ts = pd.to_datetime(df.iloc[-1]["t"], utc=True)
-    future_ts = _future_timestamps(last_ts, interval, H)
+    payload = _prediction_payload(symbol, interval, H, df, close_vals, next_closes)
+    if training is not None:
+        payload["training"] = training
+    return jsonify(payload), 200
 
-    items = []
-    for i in range(H):
-        pred = float(next_closes[i])
-        delta = pred - last_close
-        direction = "UP" if delta > 0 else ("DOWN" if delta < 0 else "FLAT")
-        items.append({
-            "step": i + 1,
-            "t": future_ts[i],
-            "pred_close": round(pred, 6),
-            "delta": round(delta, 6),
-            "direction": direction
-        })
 
-    payload = {
-        "symbol": symbol,
-        "interval": interval,
-        "horizon": H,
-        "last": {
-            "t": df.iloc[-1]["t"],
-            "close": last_close
-        },
-        "predictions": items
+@bp.route("/batch", methods=["POST"])
+def batch_predict():
+    """
+    Body JSON:
+    {
+      "items": [{"symbol": "BTCUSDT", "interval": "1h"}, {"symbol": "LTCUSDT", "interval": "1h"}, ...],
+      "seq_len": 100                 // optional, default SEQ_LEN
     }
-    return jsonify(payload), 200
+    Nến của các cặp được tải song song; các model cùng kiến trúc/horizon được
+    chạy chung một forward (predict/batching.py). results giữ đúng thứ tự items.
+    """
+    p = request.get_json(force=True)
+    seq_len = int(p.get("seq_len", SEQ_LEN))
+    raw = p.get("items") or []
+    if not isinstance(raw, list) or not raw:
+        return jsonify({"error": "items_required"}), 400
+    if len(raw) > BATCH_MAX_ITEMS:
+        return jsonify({"error": "too_many_items", "max": BATCH_MAX_ITEMS}), 400
+    try:
+        pairs = [(str(it["symbol"]).upper(), str(it["interval"])) for it in raw]
+    except (KeyError, TypeError):
+        return jsonify({"error": "invalid_items", "detail": "each item needs symbol and interval"}), 400
+
+    results = {}
+    ready = []  # (pair, H, model, scaler)
+    for pair in dict.fromkeys(pairs):
+        symbol, interval = pair
+        H = horizon_for_interval(interval)
+        if not has_saved_model(symbol, interval, seq_len, H):
+            job, _ = training_manager().submit(symbol, interval, seq_len, H)
+            results[pair] = {"symbol": symbol, "interval": interval, "status": "training",
+                             "message": "training in progress", "job": job}
+            continue
+        model, scaler = model_registry().get(symbol, interval, seq_len, H)
+        ready.append((pair, H, model, scaler))
+
+    # tải nến song song (chung rate limiter của default_fetcher)
+    def _load(pair):
+        return pair, fetch_klines_all(pair[0], pair[1], None, None)
+    frames = {}
+    if ready:
+        with ThreadPoolExecutor(max_workers=min(len(ready), default_fetcher().max_workers)) as ex:
+            for pair, df in ex.map(_load, [r[0] for r in ready]):
+                frames[pair] = df
+
+    groups = {}
+    for pair, H, model, scaler in ready:
+        df = frames[pair]
+        if df is None or len(df) < seq_len:
+            results[pair] = {"symbol": pair[0], "interval": pair[1], "error": "no_data"}
+            continue
+        close_vals = df[["close"]].values.astype(float)
+        window = scaler.transform(close_vals[-seq_len:])  # (seq_len, 1)
+        groups.setdefault(arch_of(model), []).append((pair, H, model, scaler, df, close_vals, window))
+
+    for arch, members in groups.items():
+        x = torch.tensor(np.stack([m[6] for m in members]), dtype=torch.float32, device=DEVICE)  # (G, T, 1)
+        if arch is None:
+            # backend TorchScript: mỗi model một forward
+            with torch.no_grad():
+                out = np.concatenate([m[2](x[g:g + 1]).cpu().numpy() for g, m in enumerate(members)])
+        else:
+            out = grouped_forward(stack_predictors([m[2] for m in members]), arch[2], x.unsqueeze(1))
+            out = out[:, 0].cpu().numpy()  # (G, H)
+        for (pair, H, _, scaler, df, close_vals, _), vec in zip(members, out):
+            next_closes = scaler.inverse_transform(vec.reshape(-1, 1)).reshape(-1)
+            results[pair] = _prediction_payload(pair[0], pair[1], H, df, close_vals, next_closes)
+
+    return jsonify({"seq_len": seq_len, "groups": len(groups),
+                    "results": [results[pair] for pair in pairs]}), 200
+
+
+@bp.route("/train", methods=["POST"])
+def submit_training():
+    """
+    Body JSON: {"symbol", "interval", "seq_len"?, "start"?, "end"?, "mode"?: "full" | "finetune"}
+    mode=finetune: học tiếp model đã lưu chỉ trên nến sau trained_until (LTSM.fine_tune_saved).
+    Job trùng key đang chờ/chạy → trả lại job đó (200) thay vì tạo job mới (202).
+    """
+    p = request.get_json(force=True)
+    symbol   = p.get("symbol", "BTCUSDT").upper()
+    interval = p.get("interval", "1h")
+    seq_len  = int(p.get("seq_len", SEQ_LEN))
+    mode     = p.get("mode", "full")
+    if mode not in ("full", "finetune"):
+        return jsonify({"error": "invalid_mode", "detail": mode}), 400
+    H = horizon_for_interval(interval)
+    job, created = training_manager().submit(symbol, interval, seq_len, H, p.get("start"), p.get("end"), mode=mode)
+    return jsonify(job), (202 if created else 200)
+
+
+@bp.get("/train/<job_id>")
+def training_status(job_id):
+    job = training_manager().status(job_id)
+    if job is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(job), 200
+
+
+@bp.get("/models")
+def registry_stats():
+    return jsonify(model_registry().stats()), 200
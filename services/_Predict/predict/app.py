@@ -1,8 +1,19 @@
+import multiprocessing as mp
+import os
 from flask import Flask
 from  .api.predict import bp as predict_bp
+from .registry import model_registry
+from .inference import configure_threads
 
 app = Flask(__name__)
 app.register_blueprint(predict_bp)
 
+configure_threads()
+
+# nạp sẵn các model trong models/ để request đầu không phải torch.load
+# (bỏ qua trong process train được spawn — process đó cũng import module này)
+if os.getenv("PREDICT_WARM_MODELS", "1") == "1" and mp.parent_process() is None:
+    model_registry().warm()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=9000, debug=True)
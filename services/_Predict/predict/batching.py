@@ -0,0 +1,64 @@
+# predict/batching.py
+"""
+Chạy forward cho nhiều LSTMPredictor cùng kiến trúc trong một lượt.
+
+Mỗi (symbol, interval) có bộ trọng số riêng nên không ghép batch thường được;
+thay vào đó trọng số của G model được stack thành tensor (G, ...) và LSTM được
+tính bằng bmm trên cả G model cùng lúc (cùng công thức nn.LSTM: gate i, f, g, o).
+Số phép toán Python chỉ phụ thuộc seq_len × num_layers, không phụ thuộc G.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from .LTSM import LSTMPredictor
+
+
+def arch_of(model) -> Optional[Tuple[int, int, int, int]]:
+    """
+    (input_size, hidden, num_layers, output_size) — các model cùng tuple này stack được.
+    None nếu không phải LSTMPredictor eager (vd. TorchScript): model đó chạy riêng.
+    """
+    if not isinstance(model, LSTMPredictor):
+        return None
+    return (model.lstm.input_size, model.lstm.hidden_size, model.lstm.num_layers, model.fc.out_features)
+
+
+def stack_predictors(models: List[LSTMPredictor]) -> Dict[str, torch.Tensor]:
+    sds = [m.state_dict() for m in models]
+    return {k: torch.stack([sd[k] for sd in sds]) for k in sds[0]}
+
+
+@torch.no_grad()
+def grouped_forward(stacked: Dict[str, torch.Tensor], num_layers: int, x: torch.Tensor) -> torch.Tensor:
+    """
+    stacked: output của stack_predictors (G model)
+    x: (G, B, T, input_size) — input của model g nằm ở x[g]
+    Trả (G, B, output_size), bằng model_g(x[g]) ở chế độ eval (không dropout).
+    """
+    G, B, T, _ = x.shape
+    inp = x
+    for layer in range(num_layers):
+        w_ih = stacked[f"lstm.weight_ih_l{layer}"]            # (G, 4h, in)
+        w_hh_t = stacked[f"lstm.weight_hh_l{layer}"].transpose(1, 2)  # (G, h, 4h)
+        bias = stacked[f"lstm.bias_ih_l{layer}"] + stacked[f"lstm.bias_hh_l{layer}"]  # (G, 4h)
+        hidden = w_hh_t.shape[1]
+        # phần input của các gate: tính 1 lần cho cả chuỗi
+        xw = torch.matmul(inp, w_ih.transpose(1, 2).unsqueeze(1)) + bias[:, None, None, :]  # (G, B, T, 4h)
+
+        h = x.new_zeros(G, B, hidden)
+        c = x.new_zeros(G, B, hidden)
+        last_layer = layer == num_layers - 1
+        outs = []
+        for t in range(T):
+            gates = xw[:, :, t] + torch.bmm(h, w_hh_t)  # (G, B, 4h)
+            i, f, g, o = gates.chunk(4, dim=-1)
+            c = torch.sigmoid(f) * c + torch.sigmoid(i) * torch.tanh(g)
+            h = torch.sigmoid(o) * torch.tanh(c)
+            if not last_layer:
+                outs.append(h)
+        if not last_layer:
+            inp = torch.stack(outs, dim=2)  # (G, B, T, h)
+
+    # LSTMPredictor.forward: fc(out[:, -1, :]) — h của bước cuối, layer trên cùng
+    return torch.baddbmm(stacked["fc.bias"].unsqueeze(1), h, stacked["fc.weight"].transpose(1, 2))
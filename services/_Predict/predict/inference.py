@@ -0,0 +1,61 @@
+# predict/inference.py
+"""
+Backend inference cho predict API (pod chỉ có CPU).
+
+PREDICT_BACKEND:
+  - eager:            LSTMPredictor như lúc train (mặc định)
+  - torchscript:      artifact .ts (trace + freeze) ghi cạnh checkpoint
+  - torchscript_int8: artifact _int8.ts (dynamic quantization int8)
+Thiếu artifact (model cũ, hoặc EXPORT_TORCHSCRIPT=0) → dựng TorchScript trong
+memory từ checkpoint. Trên GPU luôn dùng eager.
+
+Số thread intra-op được đặt tường minh: mặc định cpu_count / WEB_CONCURRENCY để
+nhiều worker gunicorn trên cùng pod không tranh nhau core.
+"""
+import os
+from typing import Optional
+
+import torch
+
+from .LTSM import DEVICE, load_model, script_path, to_torchscript
+
+PREDICT_BACKEND = os.getenv("PREDICT_BACKEND", "eager")
+PREDICT_TORCH_THREADS = int(os.getenv("PREDICT_TORCH_THREADS", "0"))  # 0 → tự tính
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))              # số process phục vụ trên pod
+BACKENDS = ("eager", "torchscript", "torchscript_int8")
+
+_configured = False
+
+
+def configure_threads(intra_op: Optional[int] = None, inter_op: int = 1) -> int:
+    """Đặt số thread của torch một lần cho process; trả số thread intra-op."""
+    global _configured
+    n = intra_op or PREDICT_TORCH_THREADS or max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY))
+    if _configured and intra_op is None:
+        return torch.get_num_threads()
+    torch.set_num_threads(n)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError:
+        pass  # chỉ đặt được trước khi torch chạy song song lần đầu
+    _configured = True
+    return n
+
+
+def load_for_inference(symbol: str, interval: str, seq_len: int, H: int, backend: Optional[str] = None):
+    """(module, scaler) theo backend; module nhận (B, T, 1) → (B, H) như LSTMPredictor."""
+    backend = backend or PREDICT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"PREDICT_BACKEND not supported: {backend}")
+    model, scaler = load_model(symbol, interval, seq_len, H)
+    if backend == "eager" or DEVICE != "cpu":
+        return model, scaler
+
+    quantized = backend == "torchscript_int8"
+    path = script_path(symbol, interval, seq_len, H, quantized=quantized)
+    if os.path.exists(path):
+        module = torch.jit.load(path, map_location="cpu")
+    else:
+        module = to_torchscript(model, quantize=quantized)
+    module.eval()
+    return module, scaler
@@ -0,0 +1,160 @@
+# predict/registry.py
+"""
+Registry model dùng chung trong process: tránh unpickle scaler + torch.load +
+dựng LSTMPredictor ở mỗi request.
+
+- key: (symbol, interval, seq_len, H)
+- LRU giới hạn theo bộ nhớ (tổng bytes của tham số/buffer + scaler)
+- entry bị bỏ khi mtime của file .pt hoặc _scaler.pkl thay đổi (train lại / copy model mới)
+- warm(): nạp sẵn các file trong MODELS_DIR lúc khởi động
+Model được nạp theo PREDICT_BACKEND (xem predict/inference.py).
+"""
+import io
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from .LTSM import MODELS_DIR, model_paths
+from .inference import load_for_inference
+
+MODEL_REGISTRY_MAX_MB = float(os.getenv("MODEL_REGISTRY_MAX_MB", "512"))
+
+_MODEL_FILE = re.compile(r"^LSTM_(?P<symbol>[A-Z0-9]+)_(?P<interval>\w+?)_seq(?P<seq_len>\d+)_H(?P<H>\d+)\.pt$")
+
+Key = Tuple[str, str, int, int]
+
+
+def _mtimes(key: Key) -> Optional[Tuple[int, int]]:
+    path_pt, _, path_scl = model_paths(*key)
+    try:
+        return os.stat(path_pt).st_mtime_ns, os.stat(path_scl).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _nbytes(model, scaler) -> int:
+    if isinstance(model, torch.jit.ScriptModule):
+        # frozen/quantized: trọng số là hằng/packed params, không nằm trong parameters()
+        buf = io.BytesIO()
+        torch.jit.save(model, buf)
+        n = buf.tell()
+    else:
+        n = sum(t.numel() * t.element_size() for t in model.parameters())
+        n += sum(t.numel() * t.element_size() for t in model.buffers())
+    return n + len(pickle.dumps(scaler))
+
+
+def scan_models(models_dir: str = MODELS_DIR) -> List[Key]:
+    """Các key có file .pt trong models_dir (tên dạng LSTM_<SYM>_<iv>_seq<N>_H<H>.pt)."""
+    keys = []
+    for name in sorted(os.listdir(models_dir)) if os.path.isdir(models_dir) else []:
+        m = _MODEL_FILE.match(name)
+        if m:
+            keys.append((m["symbol"], m["interval"], int(m["seq_len"]), int(m["H"])))
+    return keys
+
+
+class ModelRegistry:
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = int(max_bytes if max_bytes is not None else MODEL_REGISTRY_MAX_MB * 1024 * 1024)
+        self._lru: "OrderedDict[Key, tuple]" = OrderedDict()  # key -> (mtimes, size, model, scaler)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading: Dict[Key, threading.Lock] = {}
+        self.stats_ = {"hits": 0, "loads": 0, "reloads": 0, "evictions": 0}
+
+    def _pop(self, key: Key):
+        old = self._lru.pop(key, None)
+        if old:
+            self._bytes -= old[1]
+
+    def _put(self, key: Key, mtimes, model, scaler):
+        size = _nbytes(model, scaler)
+        with self._lock:
+            self._pop(key)
+            self._lru[key] = (mtimes, size, model, scaler)
+            self._bytes += size
+            # luôn giữ entry vừa thêm, kể cả khi một mình nó vượt ngân sách
+            while self._bytes > self.max_bytes and len(self._lru) > 1:
+                _, (_, sz, _, _) = self._lru.popitem(last=False)
+                self._bytes -= sz
+                self.stats_["evictions"] += 1
+
+    def _cached(self, key: Key, mtimes):
+        with self._lock:
+            item = self._lru.get(key)
+            if item is None:
+                return None
+            if item[0] != mtimes:
+                self._pop(key)
+                self.stats_["reloads"] += 1
+                return None
+            self._lru.move_to_end(key)
+            self.stats_["hits"] += 1
+            return item[2], item[3]
+
+    def get(self, symbol: str, interval: str, seq_len: int, H: int):
+        """(model, scaler) cho key; FileNotFoundError nếu chưa có model lưu trên đĩa."""
+        key = (symbol, interval, int(seq_len), int(H))
+        mtimes = _mtimes(key)
+        if mtimes is None:
+            with self._lock:
+                self._pop(key)
+            raise FileNotFoundError(model_paths(*key)[0])
+        hit = self._cached(key, mtimes)
+        if hit is not None:
+            return hit
+
+        # mỗi key chỉ một thread load, các thread khác chờ rồi dùng kết quả
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        with load_lock:
+            hit = self._cached(key, mtimes)
+            if hit is not None:
+                return hit
+            model, scaler = load_for_inference(*key)
+            with self._lock:
+                self.stats_["loads"] += 1
+            # file có thể bị ghi lại trong lúc load → lấy mtime sau cùng để lần sau tự reload
+            after = _mtimes(key)
+            self._put(key, mtimes if after == mtimes else None, model, scaler)
+            return model, scaler
+
+    def invalidate(self, symbol: str, interval: str, seq_len: int, H: int):
+        with self._lock:
+            self._pop((symbol, interval, int(seq_len), int(H)))
+
+    def warm(self, models_dir: str = MODELS_DIR) -> List[Key]:
+        """Nạp các model có trong models_dir; trả về các key đã nạp."""
+        loaded = []
+        for key in scan_models(models_dir):
+            try:
+                self.get(*key)
+                loaded.append(key)
+            except Exception as e:
+                print(f"[WARN] Không warm được model {key}: {e}")
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.stats_)
+            s.update({"entries": len(self._lru), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                      "keys": ["{}_{}_seq{}_H{}".format(*k) for k in self._lru]})
+        return s
+
+
+_REGISTRY: Optional[ModelRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def model_registry() -> ModelRegistry:
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = ModelRegistry()
+        return _REGISTRY
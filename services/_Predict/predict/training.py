@@ -0,0 +1,146 @@
+# predict/training.py
+"""
+Train LSTM ngoài request path.
+
+Job train chạy trong process riêng (ProcessPoolExecutor, spawn) nên Flask
+handler không bị chặn nhiều phút và GIL/torch threads của train không ảnh
+hưởng tới các request predict. Mỗi model key (symbol, interval, seq_len, H)
+chỉ có tối đa một job đang chờ/chạy: submit trùng trả lại job hiện có.
+Trạng thái job giữ trong memory của process Flask (GET /api/predict/train/<job_id>).
+"""
+import multiprocessing as mp
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+PREDICT_TRAIN_WORKERS = int(os.getenv("PREDICT_TRAIN_WORKERS", "1"))
+TRAIN_JOBS_KEEP = 200  # số job đã xong giữ lại để tra trạng thái
+
+Key = Tuple[str, str, int, int]
+
+
+def _train_job(symbol: str, interval: str, seq_len: int, H: int,
+               start: Optional[str], end: Optional[str], mode: str = "full") -> Dict[str, Any]:
+    """
+    Chạy trong worker process.
+    mode="full": tải nến (bỏ nến chưa đóng) → train từ đầu → lưu file model/scaler.
+    mode="finetune": học tiếp checkpoint trên nến mới; checkpoint cũ chưa có
+    trained_until thì train full.
+    """
+    from .LTSM import (fetch_klines_all, closed_klines, train_model, save_model_and_scaler, train_meta,
+                       trained_until_ms, fine_tune_saved, EPOCHS)
+
+    if mode == "finetune" and trained_until_ms(symbol, interval, seq_len, H) is not None:
+        return fine_tune_saved(symbol, interval, seq_len, H, end)
+
+    df = closed_klines(fetch_klines_all(symbol, interval, start, end), interval)
+    if df is None or df.empty:
+        raise ValueError("no_data")
+    close_vals = df[["close"]].values.astype(float)
+    model, scaler, opt = train_model(close_vals, seq_len, H, tag=f"{symbol} {interval} H={H}")
+    meta = train_meta(df, "full", EPOCHS)
+    save_model_and_scaler(model, scaler, symbol, interval, seq_len, H, optimizer=opt, meta=meta)
+    return {"mode": "full", "samples": meta["samples"], "trained_until_ms": meta["trained_until_ms"]}
+
+
+class TrainingManager:
+    def __init__(self, max_workers: int = PREDICT_TRAIN_WORKERS):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._active: Dict[Key, str] = {}  # key -> job_id đang queued/running
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=mp.get_context("spawn"))
+        return self._pool
+
+    def submit(self, symbol: str, interval: str, seq_len: int, H: int,
+               start: Optional[str] = None, end: Optional[str] = None,
+               mode: str = "full") -> Tuple[Dict[str, Any], bool]:
+        """
+        mode: "full" | "finetune" (xem _train_job).
+        Trả (job, created); created=False nếu key đã có job đang chờ/chạy (bất kể mode).
+        """
+        key = (symbol, interval, int(seq_len), int(H))
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id is not None:
+                return self._view(job_id), False
+            job_id = uuid.uuid4().hex
+            job = {"job_id": job_id, "symbol": symbol, "interval": interval, "seq_len": int(seq_len),
+                   "horizon": int(H), "mode": mode, "status": "queued", "submitted_at": time.time()}
+            self._jobs[job_id] = job
+            self._active[key] = job_id
+            while len(self._jobs) > TRAIN_JOBS_KEEP:
+                old_id, old = next(iter(self._jobs.items()))
+                if old["status"] in ("queued", "running"):
+                    break
+                self._jobs.pop(old_id)
+            try:
+                fut = self._executor().submit(_train_job, *key, start, end, mode)
+            except Exception as e:
+                self._active.pop(key, None)
+                job.update(status="failed", error=f"{type(e).__name__}: {e}", finished_at=time.time())
+                return dict(job), True
+            self._futures[job_id] = fut
+        fut.add_done_callback(lambda f: self._finish(key, job_id, f))
+        return dict(job), True
+
+    def _finish(self, key: Key, job_id: str, fut: Future):
+        with self._lock:
+            job = self._jobs.get(job_id, {})
+            self._active.pop(key, None)
+            self._futures.pop(job_id, None)
+            job["finished_at"] = time.time()
+            try:
+                result = fut.result()
+                job.update(status="done", **{k: v for k, v in result.items() if k != "mode"},
+                           trained_mode=result.get("mode"))
+            except Exception as e:
+                traceback.print_exception(type(e), e, e.__traceback__)
+                job.update(status="failed", error=f"{type(e).__name__}: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    self._pool = None  # worker chết (OOM, kill…) → lần submit sau tạo pool mới
+        if job.get("status") == "done":
+            from .registry import model_registry
+            # file đã đổi mtime → registry sẽ tự load lại; bỏ entry cũ luôn cho chắc
+            model_registry().invalidate(*key)
+
+    def _view(self, job_id: str) -> Dict[str, Any]:
+        job = dict(self._jobs[job_id])
+        fut = self._futures.get(job_id)
+        if job["status"] == "queued" and fut is not None and fut.running():
+            job["status"] = "running"
+        return job
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._view(job_id) if job_id in self._jobs else None
+
+    def active(self, symbol: str, interval: str, seq_len: int, H: int) -> Optional[Dict[str, Any]]:
+        """Job đang chờ/chạy của key (nếu có)."""
+        with self._lock:
+            job_id = self._active.get((symbol, interval, int(seq_len), int(H)))
+            return self._view(job_id) if job_id is not None else None
+
+
+_MANAGER: Optional[TrainingManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def training_manager() -> TrainingManager:
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = TrainingManager()
+        return _MANAGER
@@ -0,0 +1,83 @@
+"""
+Benchmark inference LSTMPredictor: eager vs TorchScript vs TorchScript int8 (CPU).
+
+    python -m scripts.bench_inference
+    python -m scripts.bench_inference --model models/LSTM_BTCUSDT_1h_seq100_H3.pt --threads 1 2 4
+
+Mỗi backend đo latency batch=1 (p50/p95, ms) và throughput với --batch (cửa sổ/giây),
+với từng số thread intra-op trong --threads. Sai khác tối đa so với eager được in
+kèm (int8 có sai số lượng tử hoá).
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from predict.LTSM import LSTMPredictor, SEQ_LEN, to_torchscript
+
+
+def _load(path):
+    if not path:
+        torch.manual_seed(0)
+        return LSTMPredictor(output_size=3).eval()
+    ckpt = torch.load(path, map_location="cpu")
+    model = LSTMPredictor(**ckpt["arch"])
+    model.load_state_dict(ckpt["state_dict"])
+    return model.eval()
+
+
+def _latency(module, x, iters):
+    times = []
+    with torch.no_grad():
+        for _ in range(iters):
+            t0 = time.perf_counter()
+            module(x)
+            times.append(time.perf_counter() - t0)
+    return np.percentile(times, 50) * 1e3, np.percentile(times, 95) * 1e3
+
+
+def _throughput(module, x, iters):
+    with torch.no_grad():
+        t0 = time.perf_counter()
+        for _ in range(iters):
+            module(x)
+    return iters * x.shape[0] / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=None, help="checkpoint .pt (mặc định: model random cùng kiến trúc)")
+    ap.add_argument("--seq-len", type=int, default=SEQ_LEN)
+    ap.add_argument("--batch", type=int, default=64)
+    ap.add_argument("--iters", type=int, default=200)
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    args = ap.parse_args()
+
+    eager = _load(args.model)
+    backends = {
+        "eager": eager,
+        "torchscript": to_torchscript(eager),
+        "torchscript_int8": to_torchscript(eager, quantize=True),
+    }
+    x1 = torch.rand(1, args.seq_len, 1)
+    xb = torch.rand(args.batch, args.seq_len, 1)
+    with torch.no_grad():
+        ref = eager(xb)
+
+    print(f"{'backend':>17} {'threads':>7} {'p50 ms':>8} {'p95 ms':>8} {'win/s':>10} {'max|Δ|':>9}")
+    for n in args.threads:
+        torch.set_num_threads(n)
+        for name, module in backends.items():
+            with torch.no_grad():
+                for _ in range(10):  # warmup (TorchScript profiling executor tối ưu sau vài lần chạy)
+                    module(x1)
+                    module(xb)
+                err = float((module(xb) - ref).abs().max())
+            p50, p95 = _latency(module, x1, args.iters)
+            tput = _throughput(module, xb, max(1, args.iters // 4))
+            print(f"{name:>17} {n:>7} {p50:>8.3f} {p95:>8.3f} {tput:>10.0f} {err:>9.2e}")
+
+
+if __name__ == "__main__":
+    main()
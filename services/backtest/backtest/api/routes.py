@@ -1,27 +1,30 @@
 # backtest/api/routes.py
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, request, jsonify
-from backtest.schemas import RunRequest, CapitalCfg, BacktestCfg, StrategyCfg
+from backtest.schemas import CapitalCfg, BacktestCfg
 from backtest.data.loader_csv import fetch_klines_all
-from backtest.core.strategies.ma_cross import prepare_ma_cross
-from backtest.core.strategies.rsi_threshold import prepare_rsi_threshold
-from backtest.core.strategies.macd import prepare_macd
-from backtest.core.engine import backtest_engine, clean_backtest_result
-from backtest.core.metrics import max_drawdown_pct, profit_factor, buy_hold_return_pct, win_rate_pct
+from backtest.core.strategies import STRATEGY_MAP
+from backtest.core.sweep import sweep
+from backtest.core.walkforward import walk_forward
+from backtest.core.portfolio import run_portfolio, PORTFOLIO_MAX_SYMBOLS
+from backtest.core.engine import clean_backtest_result
+from backtest.runner import (execute_run, engine_kwargs, check_strategy, parse_run_request,
+                             InvalidRunRequest, StrategyNotSupported)
+from backtest.core.dsl import DSLError
+from backtest import jobs
+from backtest.cache import result_cache
+from backtest.core.indicator_cache import indicator_cache
+from backtest.equity_store import read_equity, equity_points
+from backtest.core.result import _iso_ms_array
+from backtest.core.downsample import downsample_indices
+from backtest.core.montecarlo import original_path, simulate, trade_returns
+from backtest.core.metrics import period_returns
+from backtest.core import rolling
+import numpy as np
+import pandas as pd
 from ..db import get_db
-from bson import ObjectId
-from datetime import datetime
 
 bp = Blueprint("backtest", __name__, url_prefix="/api/backtest")
-STRATEGY_MAP = {
-    "MA_CROSS": lambda df, params: prepare_ma_cross(
-        df,
-        int(params.get("short_window", 20)),
-        int(params.get("long_window", 50))
-    ),
-    "RSI_THRESHOLD": lambda df, params: prepare_rsi_threshold(df, **params),
-    "MACD": lambda df, params: prepare_macd(df, **params),
-
-}
 
 def _get_user_id():
     uid = request.headers.get("X-User-Id")
@@ -29,97 +32,202 @@ def _get_user_id():
         # 401 thay vì 400 cho thiếu xác thực
         return None
     return uid
-    
+
+
 @bp.route("/run", methods=["POST"])
 def run_backtest():
+    """
+    Đồng bộ (mặc định): chạy xong mới trả kết quả (201).
+    Async (?mode=async hoặc body "async": true): enqueue job, trả ngay run_id (202);
+    theo dõi bằng GET /<run_id>/status.
+    """
     p = request.get_json(force=True)
     user_id = _get_user_id()
     if not user_id:
         return jsonify({"error": "unauthorized"}), 401
-    # ---- parse input
-    runreq = RunRequest(
-        symbol=p["symbol"],
-        timeframe=p["timeframe"],
-        start_date=p["start_date"],
-        end_date=p["end_date"],
-        market_data=p.get("market_data", {"source":"csv"}),
-        capital=CapitalCfg(**p["capital"]),
-        backtest=BacktestCfg(**p["backtest"]),
-        strategy=StrategyCfg(**p["strategy"])
-    )
-
-    #df = load_csv(runreq.symbol, runreq.timeframe, runreq.start_date, runreq.end_date)
-    df = fetch_klines_all(runreq.symbol, runreq.timeframe, runreq.start_date, runreq.end_date)
-
-    # ---- prepare signals
-    strategy_type = runreq.strategy.type
+
+    if not isinstance(p, dict):
+        return jsonify({"error": "invalid_request", "detail": "request body must be a JSON object"}), 400
+    if request.args.get("mode") == "async" or p.pop("async", False):
+        try:
+            runreq = parse_run_request(p)
+            check_strategy(runreq.strategy.type, runreq.strategy.params)
+        except InvalidRunRequest as e:
+            return jsonify({"error": "invalid_request", "detail": str(e)}), 400
+        except StrategyNotSupported:
+            return jsonify({"error": "strategy_not_supported"}), 400
+        except DSLError as e:
+            return jsonify({"error": "invalid_strategy", "detail": str(e)}), 400
+        run_id = jobs.enqueue(p, user_id)
+        return jsonify({
+            "run_id": run_id,
+            "status": "queued",
+            "status_url": f"{bp.url_prefix}/{run_id}/status",
+        }), 202
+
+    try:
+        payload = execute_run(p, user_id)
+    except StrategyNotSupported:
+        return jsonify({"error": "strategy_not_supported"}), 400
+    except DSLError as e:
+        return jsonify({"error": "invalid_strategy", "detail": str(e)}), 400
+    except ValueError as e:  # InvalidRunRequest, engine mode, ...
+        return jsonify({"error": "invalid_request", "detail": str(e)}), 400
+    return jsonify(payload), 201
+
+
+@bp.get("/<run_id>/status")
+def get_run_status(run_id):
+    user_id = _get_user_id()
+    if not user_id:
+        return jsonify({"error": "unauthorized"}), 401
+    job = jobs.get_status(run_id, user_id)
+    if job:
+        return jsonify(job)
+    # run chạy đồng bộ (không có job) → đã xong nếu có trong backtest_runs
+    run = get_db()["backtest_runs"].find_one({"run_id": run_id, "user_id": user_id}, {"_id": 0, "summary": 1})
+    if not run:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify({"run_id": run_id, "status": "done", "progress": {"phase": "done"}, "summary": run["summary"]})
+
+
+@bp.route("/sweep", methods=["POST"])
+def run_sweep():
+    """
+    Grid-search tham số strategy trên cùng dữ liệu nến (không lưu Mongo).
+    Body giống /run, nhưng strategy có thêm "grid":
+      "strategy": {"type": "MA_CROSS", "params": {...cố định}, "grid": {"short_window": [10, 20], "long_window": [50, 100]}}
+    Tuỳ chọn: "rank_by" (một cột của summary, xem sweep.RANK_KEYS; mặc định total_return_pct),
+    "ascending", "top" (số nguyên ≥ 1).
+    Số process do server quyết định (SWEEP_MAX_WORKERS), không nhận từ body.
+    """
+    p = request.get_json(force=True)
+    user_id = _get_user_id()
+    if not user_id:
+        return jsonify({"error": "unauthorized"}), 401
+
+    strat = p.get("strategy") or {}
+    strategy_type = strat.get("type")
+    grid = strat.get("grid") or {}
     if strategy_type not in STRATEGY_MAP:
         return jsonify({"error": "strategy_not_supported"}), 400
+    if not grid:
+        return jsonify({"error": "grid_required"}), 400
 
-    # ---- data with signals
-    df = STRATEGY_MAP[strategy_type](df, runreq.strategy.params)
-
-    result = backtest_engine(
-        df=df,
-        initial_capital=runreq.capital.initial,
-        position_pct=runreq.capital.position_pct,
-        fee_pct=runreq.capital.fee_pct,
-        slippage_pct=runreq.backtest.slippage_pct,
-        allow_short=runreq.backtest.allow_short,
-        stop_loss_pct=runreq.backtest.stop_loss_pct or 9999.0,
-        take_profit_pct=runreq.backtest.take_profit_pct or 9999.0,
-    )
-    trades = result["trades"]
-    equity = result["equity_curve"]
-    final_eq = result["final_equity"]
-
-    summary = {
-        "strategy": runreq.strategy.type,
-        "symbol": runreq.symbol,
-        "timeframe": runreq.timeframe,
-        "start": df.iloc[0]["t"] if not df.empty else runreq.start_date,
-        "end": df.iloc[-1]["t"] if not df.empty else runreq.end_date,
-        "initial_capital": runreq.capital.initial,
-        "final_equity": final_eq,
-        "total_return_pct": round((final_eq / runreq.capital.initial - 1.0) * 100.0, 2),
-        "buy_and_hold_return_pct": buy_hold_return_pct(df),
-        "max_drawdown_pct": max_drawdown_pct(equity),
-        "profit_factor": profit_factor(trades),
-        "num_trades": len([t for t in trades if "exit_time" in t]),
-        "win_rate_pct": win_rate_pct(trades),
-    }
-            # ---------- LƯU VÀO MONGO ----------
-    run_oid = ObjectId()
-    run_id = f"bt_{run_oid}"  # string tiện cho FE
-    db = get_db()
-    db["backtest_runs"].insert_one({
-        "user_id": user_id,
-        "_id": run_oid,
-        "run_id": run_id,
-        "created_at": datetime.utcnow(),
-        "params": p,         # lưu nguyên params FE gửi lên
-        "summary": summary,  # lưu summary đã tính
-    })
+    capital = CapitalCfg(**p["capital"])
+    bt = BacktestCfg(**p.get("backtest", {}))
+    df = fetch_klines_all(p["symbol"], p["timeframe"], p["start_date"], p["end_date"])
 
-    print('trades:', trades)
-    if trades:
-        db["backtest_trades"].insert_many(
-            [{ "run_id": run_id, "user_id": user_id, **t } for t in trades]
+    try:
+        out = sweep(
+            df, strategy_type, grid,
+            engine_kwargs=engine_kwargs(capital, bt),
+            base_params=strat.get("params") or {},
+            rank_by=p.get("rank_by", "total_return_pct"),
+            descending=not bool(p.get("ascending", False)),
+            top=p.get("top"),
         )
+    except ValueError as e:
+        return jsonify({"error": "invalid_sweep", "detail": str(e)}), 400
+
+    out.update({"symbol": p["symbol"], "timeframe": p["timeframe"]})
+    return jsonify(out), 200
+
+
+@bp.route("/walkforward", methods=["POST"])
+def run_walkforward():
+    """
+    Walk-forward optimization (không lưu Mongo). Body giống /sweep, thêm:
+      "walkforward": {"train_bars": 2000, "test_bars": 500, "step_bars": 500, "anchored": false}
+    Mỗi cửa sổ: chọn params tốt nhất theo "rank_by" trên train, chạy trên test kế tiếp;
+    equity các test được nối lại (vốn nối tiếp).
+    """
+    p = request.get_json(force=True)
+    user_id = _get_user_id()
+    if not user_id:
+        return jsonify({"error": "unauthorized"}), 401
+
+    strat = p.get("strategy") or {}
+    strategy_type = strat.get("type")
+    grid = strat.get("grid") or {}
+    wf = p.get("walkforward") or {}
+    if strategy_type not in STRATEGY_MAP:
+        return jsonify({"error": "strategy_not_supported"}), 400
+    if not grid:
+        return jsonify({"error": "grid_required"}), 400
+    if not wf.get("train_bars") or not wf.get("test_bars"):
+        return jsonify({"error": "invalid_walkforward", "detail": "train_bars and test_bars are required"}), 400
+
+    capital = CapitalCfg(**p["capital"])
+    bt = BacktestCfg(**p.get("backtest", {}))
+    df = fetch_klines_all(p["symbol"], p["timeframe"], p["start_date"], p["end_date"])
 
-    if equity:
-        db["backtest_equity"].insert_many(
-            [{ "run_id": run_id, "user_id": user_id, **pt } for pt in equity]
+    try:
+        out = walk_forward(
+            df, strategy_type, grid,
+            engine_kwargs=engine_kwargs(capital, bt),
+            train_bars=wf["train_bars"],
+            test_bars=wf["test_bars"],
+            step_bars=wf.get("step_bars"),
+            anchored=bool(wf.get("anchored", False)),
+            base_params=strat.get("params") or {},
+            rank_by=p.get("rank_by", "total_return_pct"),
+            descending=not bool(p.get("ascending", False)),
         )
+    except ValueError as e:
+        return jsonify({"error": "invalid_walkforward", "detail": str(e)}), 400
 
-    # ---------- TRẢ VỀ JSON ----------
-    payload = clean_backtest_result({
-        "run_id": run_id,
-        "summary": summary,
-        "trades": trades,
-        "equity_curve": equity,
-    })
-    return jsonify(payload), 201
+    out["summary"].update({"symbol": p["symbol"], "timeframe": p["timeframe"]})
+    return jsonify(clean_backtest_result(out)), 200
+
+
+@bp.route("/portfolio", methods=["POST"])
+def run_portfolio_backtest():
+    """
+    Backtest nhiều symbol chung tiền mặt (không lưu Mongo).
+    Body giống /run, thay "symbol" bằng "symbols": ["BTCUSDT", "ETHUSDT", ...];
+    tuỳ chọn "weights": {"BTCUSDT": 2, ...} (chuẩn hoá về tổng 1, mặc định chia đều)
+    và strategy."params_by_symbol": {"ETHUSDT": {...}} ghi đè params theo symbol.
+    """
+    p = request.get_json(force=True)
+    user_id = _get_user_id()
+    if not user_id:
+        return jsonify({"error": "unauthorized"}), 401
+
+    symbols = [str(s).upper() for s in (p.get("symbols") or [])]
+    if not symbols or len(set(symbols)) != len(symbols):
+        return jsonify({"error": "invalid_symbols", "detail": "symbols must be a non-empty list without duplicates"}), 400
+    if len(symbols) > PORTFOLIO_MAX_SYMBOLS:
+        return jsonify({"error": "invalid_symbols", "detail": f"at most {PORTFOLIO_MAX_SYMBOLS} symbols"}), 400
+    strat = p.get("strategy") or {}
+    try:
+        check_strategy(strat.get("type"), strat.get("params"))
+    except StrategyNotSupported:
+        return jsonify({"error": "strategy_not_supported"}), 400
+    except DSLError as e:
+        return jsonify({"error": "invalid_strategy", "detail": str(e)}), 400
+
+    capital = CapitalCfg(**p["capital"])
+    bt = BacktestCfg(**p.get("backtest", {}))
+    # tải nến các symbol song song (I/O)
+    with ThreadPoolExecutor(max_workers=min(8, len(symbols))) as ex:
+        dfs = ex.map(lambda s: fetch_klines_all(s, p["timeframe"], p["start_date"], p["end_date"]), symbols)
+        frames = {s: df for s, df in zip(symbols, dfs) if not df.empty}
+    if not frames:
+        return jsonify({"error": "no_data"}), 404
+
+    try:
+        out = run_portfolio(
+            frames, strat["type"], strat.get("params") or {},
+            engine_kwargs=engine_kwargs(capital, bt),
+            weights={str(k).upper(): v for k, v in (p.get("weights") or {}).items()},
+            params_by_symbol={str(k).upper(): v for k, v in (strat.get("params_by_symbol") or {}).items()},
+        )
+    except ValueError as e:
+        return jsonify({"error": "invalid_portfolio", "detail": str(e)}), 400
+
+    out["summary"].update({"timeframe": p["timeframe"], "missing_symbols": [s for s in symbols if s not in frames]})
+    return jsonify(clean_backtest_result(out)), 200
 
 
 @bp.get("/")
@@ -183,20 +291,161 @@ def get_equity(run_id):
         return jsonify({"error": "unauthorized"}), 401
 
     db = get_db()
-    # optional range:
-    frm = request.args.get("from")  # ISO
-    to  = request.args.get("to")    # ISO
-    q = {"run_id": run_id, "user_id": user_id}
-    if frm or to:
-        rng = {}
-        if frm: rng["$gte"] = frm
-        if to:  rng["$lte"] = to
-        q["t"] = rng
-
-    pts = list(db["backtest_equity"]
-               .find(q, {"_id": 0, "run_id": 0, "user_id": 0})
-               .sort("t", 1))
-    return jsonify(pts)
+    # optional range (ISO): chỉ giải nén các block giao với [from, to]
+    frm = request.args.get("from")
+    to  = request.args.get("to")
+    try:
+        frm_ms = int(pd.to_datetime(frm, utc=True).value // 1_000_000) if frm else None
+        to_ms  = int(pd.to_datetime(to,  utc=True).value // 1_000_000) if to  else None
+    except ValueError:
+        return jsonify({"error": "invalid_range"}), 400
+
+    # optional ?points=N[&method=lttb|minmax]: giảm số điểm để vẽ chart
+    points = request.args.get("points", type=int)
+    method = request.args.get("method", "lttb")
+    if points is not None and points < 3:
+        return jsonify({"error": "invalid_points", "detail": "points must be >= 3"}), 400
+    if method not in ("lttb", "minmax"):
+        return jsonify({"error": "invalid_method", "detail": method}), 400
+
+    t, eq = read_equity(db, run_id, user_id, frm_ms, to_ms)
+    if points is not None and len(t) > points:
+        idx = downsample_indices(t, eq, points, method)
+        t, eq = t[idx], eq[idx]
+    return jsonify(equity_points(t, eq))
+
+def _float_pair(name):
+    lo, hi = request.args.get(f"{name}_min"), request.args.get(f"{name}_max")
+    if lo is None and hi is None:
+        return None
+    return float(lo if lo is not None else hi), float(hi if hi is not None else lo)
+
+
+@bp.get("/<run_id>/montecarlo")
+def get_montecarlo(run_id):
+    """
+    Monte Carlo trên trade đã lưu của run (xem core/montecarlo.py).
+    Query: paths (mặc định 10000), method=bootstrap|shuffle, seed, ruin_pct (mặc định 50),
+    fee_pct_min/fee_pct_max, slippage_pct_min/slippage_pct_max (nhiễu chi phí mỗi path),
+    bins (histogram, 1..1000, mặc định 50). paths × số trade ≤ MONTECARLO_MAX_WORK, vượt → 400.
+    """
+    user_id = _get_user_id()
+    if not user_id:
+        return jsonify({"error": "unauthorized"}), 401
+    db = get_db()
+    run = db["backtest_runs"].find_one({"run_id": run_id, "user_id": user_id}, {"params": 1, "summary": 1})
+    if not run:
+        return jsonify({"error": "not_found"}), 404
+
+    params = run.get("params") or {}
+    fee_pct = float((params.get("capital") or {}).get("fee_pct", CapitalCfg.fee_pct))
+    slippage_pct = float((params.get("backtest") or {}).get("slippage_pct", BacktestCfg.slippage_pct))
+    initial = float(run["summary"]["initial_capital"])
+    trades = list(db["backtest_trades"].find(
+        {"run_id": run_id}, {"_id": 0, "pnl": 1, "entry_price": 1, "size": 1}).sort("id", 1))
+
+    try:
+        f, w = trade_returns(trades, initial, fee_pct)
+        seed = request.args.get("seed")
+        out = simulate(
+            f, w, initial,
+            paths=int(request.args.get("paths", 10_000)),
+            method=request.args.get("method", "bootstrap"),
+            fee_pct=fee_pct,
+            slippage_pct=slippage_pct,
+            fee_pct_range=_float_pair("fee_pct"),
+            slippage_pct_range=_float_pair("slippage_pct"),
+            ruin_pct=float(request.args.get("ruin_pct", 50.0)),
+            seed=int(seed) if seed is not None else None,
+            bins=int(request.args.get("bins", 50)),
+        )
+    except ValueError as e:
+        return jsonify({"error": "invalid_montecarlo", "detail": str(e)}), 400
+
+    out.update({"run_id": run_id, "initial_capital": initial, "fee_pct": fee_pct,
+                "slippage_pct": slippage_pct, "original": original_path(f, initial)})
+    return jsonify(out)
+
+
+@bp.get("/<run_id>/returns")
+def get_period_returns(run_id):
+    """Bảng lợi nhuận theo kỳ từ equity đã lưu. Query: period=monthly (mặc định) | daily."""
+    user_id = _get_user_id()
+    if not user_id:
+        return jsonify({"error": "unauthorized"}), 401
+    db = get_db()
+    run = db["backtest_runs"].find_one({"run_id": run_id, "user_id": user_id}, {"summary": 1})
+    if not run:
+        return jsonify({"error": "not_found"}), 404
+
+    period = request.args.get("period", "monthly")
+    initial = float(run["summary"]["initial_capital"])
+    t, eq = read_equity(db, run_id, user_id)
+    try:
+        rows = period_returns(t, eq, initial, period)
+    except ValueError as e:
+        return jsonify({"error": "invalid_period", "detail": str(e)}), 400
+    return jsonify({"run_id": run_id, "period": period, "initial_capital": initial, "returns": rows})
+
+
+@bp.get("/<run_id>/rolling")
+def get_rolling(run_id):
+    """
+    Chỉ số trượt từ equity / trade đã lưu (xem core/rolling.py).
+    Query: window (số bar, mặc định 500), trade_window (số trade, mặc định 20),
+    points (tuỳ chọn: lấy mẫu đều còn tối đa N điểm cho chart).
+    """
+    user_id = _get_user_id()
+    if not user_id:
+        return jsonify({"error": "unauthorized"}), 401
+    db = get_db()
+    run = db["backtest_runs"].find_one({"run_id": run_id, "user_id": user_id}, {"_id": 1})
+    if not run:
+        return jsonify({"error": "not_found"}), 404
+
+    window = request.args.get("window", 500, type=int)
+    trade_window = request.args.get("trade_window", 20, type=int)
+    points = request.args.get("points", type=int)
+    if points is not None and points < 2:
+        return jsonify({"error": "invalid_points", "detail": "points must be >= 2"}), 400
+
+    t, eq = read_equity(db, run_id, user_id)
+    trades = list(db["backtest_trades"].find(
+        {"run_id": run_id}, {"_id": 0, "pnl": 1, "exit_time": 1}).sort("id", 1))
+    pnl = np.array([float(tr["pnl"]) for tr in trades], dtype=np.float64)
+    try:
+        sharpe = rolling.rolling_sharpe(t, eq, window)
+        vol = rolling.rolling_volatility_pct(t, eq, window)
+        dd = rolling.rolling_drawdown_pct(eq, window)
+        win = rolling.rolling_win_rate_pct(pnl, trade_window)
+    except ValueError as e:
+        return jsonify({"error": "invalid_window", "detail": str(e)}), 400
+
+    idx = np.arange(len(t))
+    if points is not None and len(t) > points:
+        idx = np.unique(np.linspace(0, len(t) - 1, points).astype(np.int64))
+    return jsonify({
+        "run_id": run_id,
+        "window": window,
+        "trade_window": trade_window,
+        "bars": {
+            "t": _iso_ms_array(t[idx]),
+            "sharpe_ratio": rolling.to_json_list(sharpe[idx]),
+            "volatility_pct": rolling.to_json_list(vol[idx], 2),
+            "drawdown_pct": rolling.to_json_list(dd[idx], 2),
+        },
+        "trades": {
+            "t": [tr.get("exit_time") for tr in trades],
+            "win_rate_pct": rolling.to_json_list(win, 2),
+        },
+    })
+
+
+@bp.get("/cache/stats")
+def cache_stats():
+    stats = result_cache().stats()
+    stats["indicators"] = indicator_cache().stats()
+    return jsonify(stats)
 
 @bp.route("/debug", methods=["GET", "POST"])
 def debug():
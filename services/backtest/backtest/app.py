@@ -1,9 +1,15 @@
 # app.py
+import os
 from flask import Flask, jsonify
 from .api.routes import bp as backtest_bp
 from .db import get_db
+from .jobs import init_jobs, start_workers
+from .equity_store import init_equity_store
 from pymongo.errors import CollectionInvalid
 
+# số thread worker xử lý job async ngay trong process app (0 = chỉ dùng backtest.worker)
+BACKTEST_JOB_WORKERS = int(os.getenv("BACKTEST_JOB_WORKERS", "0"))
+
 def init_mongo(db):
     try:
         db.create_collection("backtest_runs")
@@ -21,9 +27,12 @@ def init_mongo(db):
         pass
 
     db["backtest_runs"].create_index([("user_id", 1), ("created_at", -1)])
+    db["backtest_runs"].create_index([("user_id", 1), ("params_hash", 1)])
     db["backtest_trades"].create_index([("run_id", 1), ("user_id", 1), ("seq", 1)])
     db["backtest_trades"].create_index([("run_id", 1), ("user_id", 1)])  # cho count_documents
     db["backtest_equity"].create_index([("run_id", 1), ("user_id", 1), ("t", 1)])
+    init_equity_store(db)
+    init_jobs(db)
     print("Indexes created ✅")
 
 
@@ -48,6 +57,8 @@ def create_app():
 
     # Gọi init ngay lúc khởi động (an toàn khi chạy nhiều lần)
     init_mongo(db)
+    if BACKTEST_JOB_WORKERS > 0:
+        start_workers(BACKTEST_JOB_WORKERS)
 
     return app
 
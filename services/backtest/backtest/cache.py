@@ -0,0 +1,155 @@
+# backtest/cache.py
+"""
+Cache kết quả backtest theo bộ tham số chuẩn hoá của RunRequest.
+
+Chỉ cache khi khoảng [start_date, end_date] đã nằm hoàn toàn trong quá khứ
+(nến không đổi nữa). Hai tầng:
+  - LRU trong process: TTL + giới hạn tổng dung lượng (ước lượng theo pickle).
+  - Redis (tuỳ chọn, khi có REDIS_URL và cài `redis`): dùng chung giữa các replica.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any, Dict, Optional
+
+from marketdata.fetcher import interval_ms
+from backtest.schemas import RunRequest
+from backtest.core.result import _to_ms
+
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "86400"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+REDIS_URL = os.getenv("REDIS_URL")
+_KEY_PREFIX = "bt:result:v2:"  # v2: equity lưu dạng mảng (t, eq)
+
+try:
+    import redis
+except ImportError:  # tầng Redis là tuỳ chọn
+    redis = None
+
+
+def canonical_key(runreq: RunRequest, now_ms: Optional[int] = None) -> Optional[str]:
+    """
+    sha256 của tham số đã chuẩn hoá; None nếu không nên cache (end_date chưa qua
+    hoặc ngày không parse được). Không gồm market_data và engine (không đổi kết quả).
+    """
+    try:
+        start_ms, end_ms = _to_ms(runreq.start_date), _to_ms(runreq.end_date)
+        iv = interval_ms(runreq.timeframe)
+    except (ValueError, KeyError, TypeError):
+        return None
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    if end_ms + iv > now_ms:
+        return None
+    bt = asdict(runreq.backtest)
+    bt.pop("engine", None)
+    canon = {
+        "symbol": runreq.symbol.upper(),
+        "timeframe": runreq.timeframe,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "capital": asdict(runreq.capital),
+        "backtest": bt,
+        "strategy": {"type": runreq.strategy.type, "params": runreq.strategy.params},
+    }
+    raw = json.dumps(canon, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: Optional[int] = None, ttl: Optional[int] = None,
+                 redis_url: Optional[str] = None):
+        self.max_bytes = int(max_bytes if max_bytes is not None else RESULT_CACHE_MAX_MB * 1024 * 1024)
+        self.ttl = ttl if ttl is not None else RESULT_CACHE_TTL
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, size, blob)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats_ = {"hits": 0, "hits_redis": 0, "misses": 0, "stores": 0, "evictions": 0}
+        url = redis_url if redis_url is not None else REDIS_URL
+        self._redis = redis.Redis.from_url(url) if (url and redis is not None) else None
+
+    @staticmethod
+    def _dump(value: Any) -> bytes:
+        return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+    @staticmethod
+    def _load(blob: bytes) -> Any:
+        return pickle.loads(zlib.decompress(blob))
+
+    def _put_local(self, key: str, blob: bytes):
+        size = len(blob)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._lru.pop(key, None)
+            if old:
+                self._bytes -= old[1]
+            self._lru[key] = (time.monotonic() + self.ttl, size, blob)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._lru:
+                _, (_, sz, _) = self._lru.popitem(last=False)
+                self._bytes -= sz
+                self.stats_["evictions"] += 1
+
+    def get(self, key: Optional[str]) -> Optional[Any]:
+        if key is None:
+            return None
+        with self._lock:
+            item = self._lru.get(key)
+            if item is not None:
+                if item[0] > time.monotonic():
+                    self._lru.move_to_end(key)
+                    self.stats_["hits"] += 1
+                    return self._load(item[2])
+                self._lru.pop(key)
+                self._bytes -= item[1]
+        if self._redis is not None:
+            try:
+                blob = self._redis.get(_KEY_PREFIX + key)
+            except redis.RedisError:
+                blob = None
+            if blob is not None:
+                self._put_local(key, blob)
+                with self._lock:
+                    self.stats_["hits_redis"] += 1
+                return self._load(blob)
+        with self._lock:
+            self.stats_["misses"] += 1
+        return None
+
+    def set(self, key: Optional[str], value: Any):
+        if key is None:
+            return
+        blob = self._dump(value)
+        self._put_local(key, blob)
+        if self._redis is not None:
+            try:
+                self._redis.setex(_KEY_PREFIX + key, self.ttl, blob)
+            except redis.RedisError:
+                pass
+        with self._lock:
+            self.stats_["stores"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.stats_)
+            s.update({"entries": len(self._lru), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                      "ttl": self.ttl, "redis": self._redis is not None})
+        lookups = s["hits"] + s["hits_redis"] + s["misses"]
+        s["hit_rate"] = round((s["hits"] + s["hits_redis"]) / lookups, 4) if lookups else None
+        return s
+
+
+_CACHE: Optional[ResultCache] = None
+
+
+def result_cache() -> ResultCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ResultCache()
+    return _CACHE
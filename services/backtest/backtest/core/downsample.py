@@ -0,0 +1,70 @@
+# backtest/core/downsample.py
+"""
+Giảm số điểm của chuỗi (equity curve) để vẽ chart mà vẫn giữ các cực trị.
+
+- lttb:   Largest-Triangle-Three-Buckets (Steinarsson 2013). Mỗi bucket chọn
+          điểm tạo tam giác lớn nhất với điểm đã chọn trước và trung bình bucket sau.
+- minmax: mỗi bucket giữ điểm min và max (đảm bảo không mất đáy drawdown/spike).
+
+Cả hai trả về mảng index (tăng dần, gồm điểm đầu và cuối) để caller tự cắt x/y.
+"""
+import numpy as np
+
+
+def _bucket_edges(n: int, buckets: int) -> np.ndarray:
+    # bucket cho các điểm 1..n-2 (điểm đầu/cuối luôn giữ)
+    return np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+
+
+def lttb(x, y, n_out: int) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = _bucket_edges(n, n_out - 2)
+    starts, ends = edges[:-1], edges[1:]
+    # trung bình (x, y) của từng bucket, tính 1 lần
+    cx = np.add.reduceat(x[1:n - 1], starts - 1) / (ends - starts)
+    cy = np.add.reduceat(y[1:n - 1], starts - 1) / (ends - starts)
+    # bucket cuối dùng điểm cuối làm "bucket kế"
+    nx = np.append(cx[1:], x[-1])
+    ny = np.append(cy[1:], y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        s, e = starts[b], ends[b]
+        xs, ys = x[s:e], y[s:e]
+        area = np.abs((x[a] - nx[b]) * (ys - y[a]) - (x[a] - xs) * (ny[b] - y[a]))
+        a = s + int(np.argmax(area))
+        out[b + 1] = a
+    return out
+
+
+def minmax(y, n_out: int) -> np.ndarray:
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    buckets = (n_out - 2) // 2
+    edges = _bucket_edges(n, buckets)
+    bucket_id = np.repeat(np.arange(buckets), np.diff(edges))
+    idx = np.arange(1, n - 1)
+    # sắp theo (bucket, y): phần tử đầu mỗi bucket là min, cuối là max
+    order = idx[np.lexsort((y[1:n - 1], bucket_id))]
+    firsts = edges[:-1] - 1
+    lasts = edges[1:] - 2
+    picked = np.concatenate([[0], order[firsts], order[lasts], [n - 1]])
+    return np.unique(picked)
+
+
+def downsample_indices(x, y, n_out: int, method: str = "lttb") -> np.ndarray:
+    if method == "lttb":
+        return lttb(x, y, n_out)
+    if method == "minmax":
+        return minmax(y, n_out)
+    raise ValueError(f"downsample method not supported: {method}")
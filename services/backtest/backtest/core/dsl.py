@@ -0,0 +1,285 @@
+# backtest/core/dsl.py
+"""
+DSL JSON cho strategy tự định nghĩa (strategy.type = "CUSTOM").
+
+params:
+    {
+      "long":  <điều kiện>,   # true → signal 1  (vào long / đóng short)
+      "short": <điều kiện>    # true → signal -1 (đóng long / vào short nếu allow_short)
+    }
+Bar mà cả hai cùng true → signal 0. Cần ít nhất một trong hai.
+
+Biểu thức:
+  - số, true/false
+  - cột nến: "open" | "high" | "low" | "close" | "volume"
+  - node {"<op>": args} (đúng một key):
+      indicator   sma/ema/rsi: [src, n] | n          (src mặc định "close")
+                  macd/macd_signal/macd_hist: [src, fast, slow, signal] (mặc định close, 12, 26, 9)
+      số học      "+", "-", "*", "/": [a, b]
+      so sánh     ">", ">=", "<", "<=", "==", "!=": [a, b]
+      cross       cross_above / cross_below: [a, b]   (như MA_CROSS: a>b ở bar trước ≠ bar này)
+      logic       and / or: [c1, c2, ...];  not: c
+      lookback    prev: [x, n=1] (giá trị n bar trước)
+                  any / all: [c, n] (c đúng ở ít nhất một / mọi bar trong n bar gần nhất)
+                  highest / lowest: [x, n] (max / min trượt n bar)
+  Độ dài cửa sổ / n nằm trong [1, MAX_LOOKBACK] và không được vượt số bar của dữ liệu.
+Ví dụ "MACD cross lên VÀ RSI < 40":
+    {"long": {"and": [{"cross_above": [{"macd": []}, {"macd_signal": []}]},
+                      {"<": [{"rsi": 14}, 40]}]}}
+
+Spec được compile một lần (cache theo JSON chuẩn hoá) thành plan tuần tự các
+bước NumPy; node trùng nhau (kể cả and/or/+/*/==/!= khác thứ tự đối số) chỉ
+thành một bước. Indicator đi qua indicator_cache nên dùng chung với các
+strategy khác.
+"""
+import functools
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest.core.indicators import sma, ema, rsi, macd
+from backtest.core.indicator_cache import fingerprint, indicator_cache
+
+COLUMNS = ("open", "high", "low", "close", "volume")
+MAX_NODES = 500
+MAX_LOOKBACK = 100_000  # chặn trên cho độ dài indicator / n của prev, any, all, highest, lowest
+
+_NUM, _BOOL = "num", "bool"
+_INDICATORS = {"sma", "ema", "rsi"}
+_MACD = {"macd": 0, "macd_signal": 1, "macd_hist": 2}
+_ARITH = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.divide}
+_COMPARE = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal,
+            "==": np.equal, "!=": np.not_equal}
+_COMMUTATIVE = {"+", "*", "==", "!=", "and", "or"}
+_LOOKBACK_OPS = _INDICATORS | set(_MACD) | {"prev", "any", "all", "highest", "lowest"}
+
+
+class DSLError(ValueError):
+    pass
+
+
+# Một bước của plan: (op, slot đầu vào, tham số hằng, kiểu output)
+Step = Tuple[str, Tuple[int, ...], Tuple[Any, ...], str]
+
+
+class Plan:
+    def __init__(self, steps: List[Step], long_slot: Optional[int], short_slot: Optional[int]):
+        self.steps = steps
+        self.long_slot = long_slot
+        self.short_slot = short_slot
+
+    def __len__(self):
+        return len(self.steps)
+
+    def evaluate(self, df: pd.DataFrame) -> Tuple[np.ndarray, int]:
+        """(signal int8, số bar warm-up đầu chuỗi có indicator/giá trị số còn NaN)."""
+        n = len(df)
+        longest = max((max(params) for op, _, params, _ in self.steps if op in _LOOKBACK_OPS), default=0)
+        if longest > n:
+            raise DSLError(f"lookback {longest} exceeds the {n} bars in range")
+        vals: List[Any] = []
+        warmup = 0
+        cache = indicator_cache()
+        fps: Dict[int, str] = {}
+
+        def cached(slot, name, params, fn):
+            src = pd.Series(vals[slot], index=df.index)
+            if slot not in fps:
+                fps[slot] = fingerprint(src)
+            return cache.get(src, name, params, lambda: fn(src), fp=fps[slot])
+
+        for op, args, params, kind in self.steps:
+            a = [vals[i] for i in args]
+            if op == "const":
+                v = params[0]
+            elif op == "col":
+                v = pd.to_numeric(df[params[0]], errors="coerce").to_numpy(dtype=np.float64)
+            elif op in _INDICATORS:
+                fn = {"sma": sma, "ema": ema, "rsi": rsi}[op]
+                v = cached(args[0], op, params, lambda s: fn(s, params[0])).to_numpy(dtype=np.float64)
+            elif op in _MACD:
+                lines = cached(args[0], "macd", params, lambda s: macd(s, *params))
+                v = lines[_MACD[op]].to_numpy(dtype=np.float64)
+            elif op in _ARITH:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    v = _ARITH[op](a[0], a[1])
+            elif op in _COMPARE:
+                v = _COMPARE[op](a[0], a[1])
+            elif op in ("cross_above", "cross_below"):
+                curr = np.greater(a[0], a[1])
+                prev = _shift(curr, 1)
+                v = (~prev & curr) if op == "cross_above" else (prev & ~curr)
+            elif op == "and":
+                v = functools.reduce(np.logical_and, a)
+            elif op == "or":
+                v = functools.reduce(np.logical_or, a)
+            elif op == "not":
+                v = np.logical_not(a[0])
+            elif op == "prev":
+                v = _shift(a[0], params[0])
+            elif op in ("any", "all"):
+                cnt = _window_count(np.broadcast_to(a[0], (n,)), params[0])
+                v = cnt > 0 if op == "any" else cnt == params[0]
+            else:  # highest / lowest
+                s = pd.Series(np.broadcast_to(a[0], (n,)), dtype=np.float64)
+                r = s.rolling(params[0])
+                v = (r.max() if op == "highest" else r.min()).to_numpy()
+            if kind == _NUM and isinstance(v, np.ndarray) and v.shape == (n,):
+                valid = ~np.isnan(v)
+                first = int(valid.argmax()) if valid.any() else n
+                warmup = max(warmup, first)
+            vals.append(v)
+
+        sig = np.zeros(n, dtype=np.int8)
+        if self.long_slot is not None:
+            sig += np.broadcast_to(vals[self.long_slot], (n,)).astype(np.int8)
+        if self.short_slot is not None:
+            sig -= np.broadcast_to(vals[self.short_slot], (n,)).astype(np.int8)
+        return sig, warmup
+
+
+def _shift(x, k: int):
+    """x dịch k bar về sau; chỗ trống là NaN (số) hoặc False (bool)."""
+    if np.ndim(x) == 0:
+        return x
+    k = min(k, len(x))
+    out = np.empty_like(x)
+    out[:k] = False if x.dtype == bool else np.nan
+    out[k:] = x[:len(x) - k]
+    return out
+
+
+def _window_count(mask: np.ndarray, k: int) -> np.ndarray:
+    """Số bar true trong k bar gần nhất (tính cả bar hiện tại), dùng cumsum."""
+    cs = np.cumsum(mask, dtype=np.int64)
+    out = cs.copy()
+    out[k:] -= cs[:-k] if k < len(cs) else cs[:0]
+    return out
+
+
+def _int_arg(v, name: str, minimum: int = 1, maximum: int = MAX_LOOKBACK) -> int:
+    if isinstance(v, bool) or not isinstance(v, (int, float)) or int(v) != v or not minimum <= v <= maximum:
+        raise DSLError(f"{name} must be an integer in [{minimum}, {maximum}], got {v!r}")
+    return int(v)
+
+
+class _Compiler:
+    def __init__(self):
+        self.steps: List[Step] = []
+        self.index: Dict[Tuple, int] = {}
+
+    def emit(self, op: str, args: Tuple[int, ...], params: Tuple[Any, ...], kind: str) -> int:
+        if op in _COMMUTATIVE:
+            args = tuple(sorted(set(args) if op in ("and", "or") else args))
+        key = (op, args, params, kind)  # kind: tránh gộp const True với const 1.0
+        slot = self.index.get(key)
+        if slot is None:
+            if len(self.steps) >= MAX_NODES:
+                raise DSLError(f"expression too large (> {MAX_NODES} nodes)")
+            slot = len(self.steps)
+            self.steps.append((op, args, params, kind))
+            self.index[key] = slot
+        return slot
+
+    def kind(self, slot: int) -> str:
+        return self.steps[slot][3]
+
+    def expect(self, slot: int, kind: str, op: str) -> int:
+        if self.kind(slot) != kind:
+            raise DSLError(f"'{op}' expects {'a number' if kind == _NUM else 'a condition'} operand")
+        return slot
+
+    def compile(self, node) -> int:
+        if isinstance(node, bool):
+            return self.emit("const", (), (node,), _BOOL)
+        if isinstance(node, (int, float)):
+            return self.emit("const", (), (float(node),), _NUM)
+        if isinstance(node, str):
+            if node not in COLUMNS:
+                raise DSLError(f"unknown column: {node!r} (expected one of {', '.join(COLUMNS)})")
+            return self.emit("col", (), (node,), _NUM)
+        if not isinstance(node, dict) or len(node) != 1:
+            raise DSLError(f"expression must be a number, column name or single-key object, got {node!r}")
+
+        op, raw = next(iter(node.items()))
+        args = list(raw) if isinstance(raw, list) else [raw]
+
+        if op in _INDICATORS or op in _MACD:
+            # src có thể bỏ qua → mặc định close
+            if not args or isinstance(args[0], (int, float)) and not isinstance(args[0], bool):
+                args = ["close"] + args
+            src = self.expect(self.compile(args[0]), _NUM, op)
+            if op in _INDICATORS:
+                if len(args) != 2:
+                    raise DSLError(f"'{op}' expects [src, n] or n")
+                return self.emit(op, (src,), (_int_arg(args[1], f"{op} length"),), _NUM)
+            rest = args[1:] + [12, 26, 9][len(args) - 1:]
+            if len(rest) != 3:
+                raise DSLError(f"'{op}' expects [src, fast, slow, signal]")
+            fast, slow, sig = (_int_arg(v, f"{op} period") for v in rest)
+            if fast >= slow:
+                raise DSLError(f"'{op}': fast must be < slow")
+            return self.emit(op, (src,), (fast, slow, sig), _NUM)
+
+        if op in _ARITH or op in _COMPARE or op in ("cross_above", "cross_below"):
+            if len(args) != 2:
+                raise DSLError(f"'{op}' expects exactly 2 operands")
+            a, b = (self.expect(self.compile(x), _NUM, op) for x in args)
+            return self.emit(op, (a, b), (), _NUM if op in _ARITH else _BOOL)
+
+        if op in ("and", "or"):
+            if len(args) < 2:
+                raise DSLError(f"'{op}' expects at least 2 operands")
+            slots = []
+            for x in args:
+                s = self.expect(self.compile(x), _BOOL, op)
+                # gộp and/or lồng nhau cùng loại: (a and (b and c)) ≡ and(a, b, c)
+                slots.extend(self.steps[s][1] if self.steps[s][0] == op else (s,))
+            return self.emit(op, tuple(slots), (), _BOOL)
+
+        if op == "not":
+            if len(args) != 1:
+                raise DSLError("'not' expects 1 operand")
+            return self.emit(op, (self.expect(self.compile(args[0]), _BOOL, op),), (), _BOOL)
+
+        if op == "prev":
+            if len(args) not in (1, 2):
+                raise DSLError("'prev' expects [x, n]")
+            x = self.compile(args[0])
+            return self.emit(op, (x,), (_int_arg(args[1] if len(args) == 2 else 1, "prev n"),), self.kind(x))
+
+        if op in ("any", "all", "highest", "lowest"):
+            if len(args) != 2:
+                raise DSLError(f"'{op}' expects [x, n]")
+            want = _BOOL if op in ("any", "all") else _NUM
+            x = self.expect(self.compile(args[0]), want, op)
+            return self.emit(op, (x,), (_int_arg(args[1], f"{op} n"),), want if want == _NUM else _BOOL)
+
+        raise DSLError(f"unknown operator: {op!r}")
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_canonical(raw: str) -> Plan:
+    spec = json.loads(raw)
+    if not isinstance(spec, dict) or not ({"long", "short"} & spec.keys()):
+        raise DSLError("CUSTOM strategy params need a 'long' and/or 'short' condition")
+    extra = set(spec) - {"long", "short"}
+    if extra:
+        raise DSLError(f"unknown CUSTOM params: {', '.join(sorted(extra))}")
+    c = _Compiler()
+    slots = {}
+    for side in ("long", "short"):
+        if side in spec:
+            slots[side] = c.expect(c.compile(spec[side]), _BOOL, side)
+    return Plan(c.steps, slots.get("long"), slots.get("short"))
+
+
+def compile_strategy(params: Dict[str, Any]) -> Plan:
+    """Compile (có cache) params của strategy CUSTOM thành Plan; DSLError nếu spec sai."""
+    try:
+        raw = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError) as e:
+        raise DSLError(f"params must be JSON: {e}")
+    return _compile_canonical(raw)
@@ -1,15 +1,17 @@
 # backtest/core/engine.py
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional
-from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Union
+from array import array
 import math
 
-def _fmt_duration(start_iso: str, end_iso: str) -> str:
-    s = pd.to_datetime(start_iso); e = pd.to_datetime(end_iso)
-    d = e - s
-    days = d.days
-    hhmm = str(timedelta(seconds=d.seconds))[:-3]
-    return f"{days}d {hhmm}" if days > 0 else hhmm
+from backtest.core.downsample import lttb
+from backtest.core.result import REASONS, BacktestResult, _fmt_durations_ms, _result_arrays, _to_ms_array, trade_columns
+
+EQUITY_MAX_POINTS = 500
+ENGINE_MODES = ("pandas", "numpy")
+
+_SIGNAL, _SL, _TP, _END = (REASONS.index(r) for r in ("SignalChange", "StopLoss", "TakeProfit", "End"))
 
 def clean_backtest_result(result):
     # Xử lý NaN/inf trong summary (nếu có)
@@ -17,17 +19,31 @@ def clean_backtest_result(result):
         if isinstance(v, float) and (math.isnan(v) or math.isinf(v)):
             result["summary"][k] = "inf" if math.isinf(v) else None
 
-    # Downsample equity_curve nếu quá dài
+    # Downsample equity_curve nếu quá dài (LTTB: giữ đỉnh/đáy drawdown, không lấy mẫu đều)
     eq = result.get("equity_curve", [])
-    if len(eq) > 500:
-        step = math.ceil(len(eq) / 500)
-        eq_ds = eq[::step]
-        if eq_ds and eq and eq_ds[-1] != eq[-1]:
-            eq_ds.append(eq[-1])
-        result["equity_curve"] = eq_ds
+    if len(eq) > EQUITY_MAX_POINTS:
+        y = np.fromiter((p["eq"] for p in eq), dtype=np.float64, count=len(eq))
+        idx = lttb(np.arange(len(eq), dtype=np.float64), y, EQUITY_MAX_POINTS)
+        result["equity_curve"] = [eq[i] for i in idx.tolist()]
     return result
  
 
+def frame_to_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Chuyển df (t, open, high, low, close[, signal]) sang các mảng NumPy liền kề:
+    t int64 (epoch ms), OHLC float64, signal int8 (0 nếu không có cột signal).
+    """
+    n = len(df)
+    out = {"t": np.ascontiguousarray(_to_ms_array(df["t"]), dtype=np.int64)}
+    for col in ("open", "high", "low", "close"):
+        out[col] = np.ascontiguousarray(df[col].to_numpy(), dtype=np.float64)
+    if "signal" in df.columns:
+        out["signal"] = np.ascontiguousarray(df["signal"].to_numpy(), dtype=np.int8)
+    else:
+        out["signal"] = np.zeros(n, dtype=np.int8)
+    return out
+
+
 def backtest_engine(df: pd.DataFrame,
                     initial_capital: float,
                     position_pct: float,
@@ -35,14 +51,41 @@ def backtest_engine(df: pd.DataFrame,
                     slippage_pct: float,
                     allow_short: bool,
                     stop_loss_pct: Optional[float],
-                    take_profit_pct: Optional[float]) -> Dict:
+                    take_profit_pct: Optional[float],
+                    mode: str = "pandas",
+                    progress: Optional[Callable[[int, int], None]] = None,
+                    progress_every: int = 50_000) -> Union[Dict, BacktestResult]:
+    """
+    mode="pandas": vòng lặp gốc đọc từng ô của df.
+    mode="numpy":  cùng state machine chạy trên mảng NumPy (xem backtest_engine_arrays),
+                   kết quả giống hệt từng trade; trả BacktestResult (đọc được như dict).
+    progress(bars_done, trades_so_far): gọi mỗi `progress_every` bar và khi kết thúc.
+    """
+    if mode == "numpy":
+        arrs = frame_to_arrays(df)
+        return backtest_engine_arrays(
+            arrs["t"], arrs["open"], arrs["high"], arrs["low"], arrs["close"], arrs["signal"],
+            initial_capital=initial_capital,
+            position_pct=position_pct,
+            fee_pct=fee_pct,
+            slippage_pct=slippage_pct,
+            allow_short=allow_short,
+            stop_loss_pct=stop_loss_pct,
+            take_profit_pct=take_profit_pct,
+            labels=df["t"].tolist(),
+            progress=progress,
+            progress_every=progress_every,
+        )
+    if mode not in ENGINE_MODES:
+        raise ValueError(f"engine mode not supported: {mode!r} (expected one of {', '.join(ENGINE_MODES)})")
 
     cash = float(initial_capital)
     qty = 0.0
     entry_price: Optional[float] = None
-    entry_time: Optional[str] = None
+    entry_i = -1
     trades: List[Dict] = []
-    equity_curve: List[Dict] = []
+    spans: List[List[int]] = []  # [entry_i, exit_i] theo trade; thời gian / duration điền ở cuối
+    eq: List[float] = []         # equity theo bar (+1 điểm nếu đóng "End")
     trade_id = 0
 
     def apply_fee(price, q): return float(price) * abs(float(q)) * float(fee_pct)
@@ -53,9 +96,14 @@ def backtest_engine(df: pd.DataFrame,
 
     df = df.reset_index(drop=True)
     n = len(df)
+    t_ms = _to_ms_array(df["t"])  # thời gian dạng int64 ms, parse một lần; "t" của df chỉ dùng làm nhãn output
+    # vòng lặp chỉ giữ index bar; nhãn thời gian lấy từ df["t"] một lần khi dựng output
+    report_at = progress_every if progress is not None else -1
 
     for i in range(n):
-        t = df.at[i, "t"]
+        if i == report_at:
+            progress(i, len(trades))
+            report_at += progress_every
         o = float(df.at[i, "open"])
         h = float(df.at[i, "high"])
         l = float(df.at[i, "low"])
@@ -70,15 +118,15 @@ def backtest_engine(df: pd.DataFrame,
             # PnL: KHÔNG trừ lại entry fee (đã trừ khi mở)
             pnl = (fill_px - entry_price) * qty - fee_out
             trades[-1].update({
-                "exit_time": t, "exit_price": float(fill_px),
+                "exit_time": None, "exit_price": float(fill_px),
                 "pnl": round(float(pnl), 4),
                 "return_pct": round(float(pnl) / (entry_price * abs(qty)) * 100.0, 4),
-                "duration": _fmt_duration(entry_time, t),
+                "duration": None,
                 "reason": "SignalChange"
             })
+            spans[-1][1] = i
             qty = 0.0
             entry_price = None
-            entry_time = None
             pending_exit = False
 
         if pending_enter is not None and qty == 0.0:
@@ -92,13 +140,14 @@ def backtest_engine(df: pd.DataFrame,
                     cash -= fill_px * new_qty + fee_in
                     qty = new_qty
                     entry_price = fill_px
-                    entry_time = t
+                    entry_i = i
                     trade_id += 1
                     trades.append({
                         "id": trade_id, "side": "LONG",
                         "size": float(abs(qty)),
-                        "entry_time": t, "entry_price": float(entry_price),
+                        "entry_time": None, "entry_price": float(entry_price),
                     })
+                    spans.append([entry_i, -1])
                     # if enter_after_exit:
                     #     print("Pending enter:", "Long" if pending_enter == 1 else "Short")
                     #     print("Trade info:", trades[-1], "\n")
@@ -113,13 +162,14 @@ def backtest_engine(df: pd.DataFrame,
                     cash += fill_px * abs(new_qty) - fee_in
                     qty = new_qty
                     entry_price = fill_px
-                    entry_time = t
+                    entry_i = i
                     trade_id += 1
                     trades.append({
                         "id": trade_id, "side": "SHORT",
                         "size": float(abs(qty)),
-                        "entry_time": t, "entry_price": float(entry_price),
+                        "entry_time": None, "entry_price": float(entry_price),
                     })
+                    spans.append([entry_i, -1])
                     # if enter_after_exit:
                     #     print("Pending enter:", "Long" if pending_enter == 1 else "Short")
                     #     print("Trade info:", trades[-1], "\n")
@@ -143,14 +193,15 @@ def backtest_engine(df: pd.DataFrame,
                     cash += exit_px * qty - fee_out
                     pnl = (exit_px - entry_price) * qty - fee_out
                     trades[-1].update({
-                        "exit_time": t, "exit_price": float(exit_px),
+                        "exit_time": None, "exit_price": float(exit_px),
                         "pnl": round(float(pnl), 4),
                         "return_pct": round(float(pnl) / (entry_price * abs(qty)) * 100.0, 4),
-                        "duration": _fmt_duration(entry_time, t),
+                        "duration": None,
                         "reason": reason
                     })
-                    qty = 0.0; entry_price = None; entry_time = None
-                    equity_curve.append({"t": t, "eq": float(cash)})
+                    spans[-1][1] = i
+                    qty = 0.0; entry_price = None
+                    eq.append(float(cash))
                     continue
             else:  # SHORT
                 tp_hit = (take_profit_pct is not None) and (l <= entry_price * (1 - take_profit_pct))
@@ -166,16 +217,17 @@ def backtest_engine(df: pd.DataFrame,
                     cash += exit_px * qty - fee_out
                     pnl = (exit_px - entry_price) * qty - fee_out
                     trades[-1].update({
-                        "exit_time": t, "exit_price": float(exit_px),
+                        "exit_time": None, "exit_price": float(exit_px),
                         "pnl": round(float(pnl), 4),
                         "return_pct": round(float(pnl) / (entry_price * abs(qty)) * 100.0, 4),
-                        "duration": _fmt_duration(entry_time, t),
+                        "duration": None,
                         "reason": reason
                     })
-                    qty = 0.0; entry_price = None; entry_time = None
+                    spans[-1][1] = i
+                    qty = 0.0; entry_price = None
                     pending_exit = False          
                     pending_enter = None          
-                    equity_curve.append({"t": t, "eq": float(cash)})
+                    eq.append(float(cash))
                     continue
 
         # (3) XỬ LÝ SIGNAL (strict theo signal, KHÔNG exit ngay bar hiện tại)
@@ -195,23 +247,185 @@ def backtest_engine(df: pd.DataFrame,
                 pending_enter = sig if (sig == 1 or (sig == -1 and allow_short)) else None
 
         # (4) Mark-to-market cuối bar
-        equity_curve.append({"t": t, "eq": float(cash + qty * c)})
+        eq.append(float(cash + qty * c))
 
     # (5) Đóng cuối kỳ nếu còn vị thế
     if qty != 0.0:
-        last = df.iloc[-1]; t = last["t"]; c = float(last["close"])
+        c = float(df.at[n - 1, "close"])
         fill_px = c * (1 - slippage_pct) if qty > 0 else c * (1 + slippage_pct)
         fee_out = apply_fee(fill_px, qty)
         cash += fill_px * qty - fee_out
         pnl = (fill_px - entry_price) * qty - fee_out
         trades[-1].update({
-            "exit_time": t, "exit_price": float(fill_px),
+            "exit_time": None, "exit_price": float(fill_px),
             "pnl": round(float(pnl), 4),
             "return_pct": round(float(pnl) / (entry_price * abs(qty)) * 100.0, 4),
-            "duration": _fmt_duration(entry_time, t),
+            "duration": None,
             "reason": "End"
         })
-        qty = 0.0; entry_price = None; entry_time = None
-        equity_curve.append({"t": t, "eq": float(cash)})
+        spans[-1][1] = n - 1
+        qty = 0.0; entry_price = None
+        eq.append(float(cash))
+
+    if progress is not None:
+        progress(n, len(trades))
+
+    # thời gian + duration của mọi trade từ index bar: một lượt ở cuối (duration vector hoá trên t_ms)
+    labels = df["t"].tolist()
+    ei = np.fromiter((sp[0] for sp in spans), dtype=np.int64, count=len(spans))
+    xi = np.fromiter((sp[1] for sp in spans), dtype=np.int64, count=len(spans))
+    for tr, (e, x), d in zip(trades, spans, _fmt_durations_ms(t_ms[ei], t_ms[xi])):
+        tr["entry_time"], tr["exit_time"], tr["duration"] = labels[e], labels[x], d
+    equity_curve = [{"t": labels[min(k, n - 1)], "eq": v} for k, v in enumerate(eq)]
+    arrays = _result_arrays(t_ms, eq,
+                            (ei, xi, [tr["pnl"] for tr in trades], [tr["return_pct"] for tr in trades]))
+    return {"final_equity": float(cash), "trades": trades, "equity_curve": equity_curve, "arrays": arrays}
+
+
+def backtest_engine_arrays(t: np.ndarray,
+                           o: np.ndarray,
+                           h: np.ndarray,
+                           l: np.ndarray,
+                           c: np.ndarray,
+                           sig: np.ndarray,
+                           initial_capital: float,
+                           position_pct: float,
+                           fee_pct: float,
+                           slippage_pct: float,
+                           allow_short: bool,
+                           stop_loss_pct: Optional[float],
+                           take_profit_pct: Optional[float],
+                           labels: Optional[Sequence] = None,
+                           progress: Optional[Callable[[int, int], None]] = None,
+                           progress_every: int = 50_000) -> BacktestResult:
+    """
+    Engine trên mảng: t int64 (epoch ms), o/h/l/c float64, sig int8.
+    Cùng logic fill / SL-TP / pending order với backtest_engine (mode="pandas").
+    Trong vòng lặp chỉ giữ index của bar; trả BacktestResult dạng cột — thời gian
+    (labels hoặc ISO từ t), duration và dict trade / equity chỉ được dựng khi đọc.
+    """
+    t_ms = np.asarray(t, dtype=np.int64)
+    n = len(t_ms)
+    # list Python: truy cập phần tử nhanh hơn nhiều so với scalar NumPy/pandas
+    O = np.asarray(o, dtype=np.float64).tolist()
+    H = np.asarray(h, dtype=np.float64).tolist()
+    L = np.asarray(l, dtype=np.float64).tolist()
+    C = np.asarray(c, dtype=np.float64).tolist()
+    S = np.asarray(sig, dtype=np.int8).tolist() if sig is not None else [0] * n
+
+    fee_pct = float(fee_pct)
+    use_sl = stop_loss_pct is not None
+    use_tp = take_profit_pct is not None
+    check_sltp = use_sl or use_tp
+
+    cash = float(initial_capital)
+    qty = 0.0
+    entry_price = 0.0
+    # mỗi trade: [side, size, entry_i, entry_price, exit_i, exit_price, pnl, return_pct, reason]
+    # (side / reason là mã trong result.SIDES / result.REASONS)
+    trades: List[list] = []
+    eq = array("d")  # float64 liền kề, không tạo object Python cho mỗi bar
+
+    pending_enter: Optional[int] = None
+    pending_exit = False
+    report_at = progress_every if progress is not None else -1
+
+    def close(i, px, reason):
+        fee_out = px * abs(qty) * fee_pct
+        pnl = (px - entry_price) * qty - fee_out
+        tr = trades[-1]
+        tr[4] = i; tr[5] = float(px); tr[8] = reason
+        tr[6] = round(float(pnl), 4)
+        tr[7] = round(float(pnl) / (entry_price * abs(qty)) * 100.0, 4)
+        return px * qty - fee_out
+
+    for i in range(n):
+        if i == report_at:
+            progress(i, len(trades))
+            report_at += progress_every
+        o_ = O[i]
+
+        # (1) pending EXIT rồi mới ENTER tại OPEN hiện tại
+        if qty != 0.0 and pending_exit:
+            fill_px = o_ * (1 - slippage_pct) if qty > 0 else o_ * (1 + slippage_pct)
+            cash += close(i, fill_px, _SIGNAL)
+            qty = 0.0
+            pending_exit = False
+
+        if pending_enter is not None and qty == 0.0:
+            if pending_enter == 1:
+                fill_px = o_ * (1 + slippage_pct)
+                cash_to_use = cash * position_pct
+                if cash_to_use > 0:
+                    new_qty = cash_to_use / fill_px
+                    fee_in = fill_px * abs(new_qty) * fee_pct
+                    cash -= fill_px * new_qty + fee_in
+                    qty = new_qty
+                    entry_price = fill_px
+                    trades.append([0, float(abs(qty)), i, float(entry_price), -1, None, None, None, None])
+            elif pending_enter == -1 and allow_short:
+                fill_px = o_ * (1 - slippage_pct)
+                cash_to_use = cash * position_pct
+                if cash_to_use > 0:
+                    new_qty = -(cash_to_use / fill_px)
+                    fee_in = fill_px * abs(new_qty) * fee_pct
+                    cash += fill_px * abs(new_qty) - fee_in
+                    qty = new_qty
+                    entry_price = fill_px
+                    trades.append([1, float(abs(qty)), i, float(entry_price), -1, None, None, None, None])
+            pending_enter = None
+
+        # (2) SL/TP intrabar (ưu tiên SL nếu cùng chạm)
+        if qty != 0.0 and check_sltp:
+            exit_px = None
+            if qty > 0:
+                if use_sl and L[i] <= entry_price * (1 - stop_loss_pct):
+                    exit_px = entry_price * (1 - stop_loss_pct); reason = _SL
+                elif use_tp and H[i] >= entry_price * (1 + take_profit_pct):
+                    exit_px = entry_price * (1 + take_profit_pct); reason = _TP
+                if exit_px is not None:
+                    exit_px *= (1 - slippage_pct)
+            else:
+                if use_sl and H[i] >= entry_price * (1 + stop_loss_pct):
+                    exit_px = entry_price * (1 + stop_loss_pct); reason = _SL
+                elif use_tp and L[i] <= entry_price * (1 - take_profit_pct):
+                    exit_px = entry_price * (1 - take_profit_pct); reason = _TP
+                if exit_px is not None:
+                    exit_px *= (1 + slippage_pct)
+                    # engine gốc chỉ reset pending ở nhánh SHORT
+                    pending_exit = False
+                    pending_enter = None
+            if exit_px is not None:
+                cash += close(i, exit_px, reason)
+                qty = 0.0
+                eq.append(float(cash))
+                continue
+
+        # (3) xử lý signal cho OPEN bar kế
+        s_ = S[i]
+        if qty > 0:
+            if s_ == -1:
+                pending_exit = True
+                pending_enter = s_ if allow_short else None
+        elif qty < 0:
+            if s_ == 1:
+                pending_exit = True
+                pending_enter = s_
+        elif s_ == 1 or (s_ == -1 and allow_short):
+            pending_enter = s_
+
+        # (4) mark-to-market cuối bar
+        eq.append(float(cash + qty * C[i]))
+
+    # (5) đóng cuối kỳ nếu còn vị thế
+    if qty != 0.0:
+        i = n - 1
+        fill_px = C[i] * (1 - slippage_pct) if qty > 0 else C[i] * (1 + slippage_pct)
+        cash += close(i, fill_px, _END)
+        qty = 0.0
+        eq.append(float(cash))
+    if progress is not None:
+        progress(n, len(trades))
 
-    return {"final_equity": float(cash), "trades": trades, "equity_curve": equity_curve}
+    # ---- output dạng cột; dict / chuỗi thời gian chỉ được dựng khi đọc (xem core/result.py)
+    return BacktestResult(cash, t_ms, np.frombuffer(eq, dtype=np.float64), trade_columns(trades), labels)
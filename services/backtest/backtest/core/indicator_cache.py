@@ -0,0 +1,115 @@
+# backtest/core/indicator_cache.py
+"""
+Cache indicator dùng chung trong process, cho mọi strategy / mọi run / sweep.
+
+- key: (fingerprint dữ liệu, tên indicator, tham số). Fingerprint là blake2b
+  của các giá trị (không gồm index) → cùng chuỗi close thì dùng lại được dù
+  df khác object, khác run.
+- Lưu mảng numpy read-only; khi trả về được bọc lại thành Series theo index
+  của input hiện tại.
+- LRU giới hạn theo tổng bytes (INDICATOR_CACHE_MAX_MB).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+INDICATOR_CACHE_MAX_MB = float(os.getenv("INDICATOR_CACHE_MAX_MB", "256"))
+
+Key = Tuple[str, str, Hashable]
+
+
+def fingerprint(series: pd.Series) -> str:
+    """Hash nội dung (dtype + giá trị) của series."""
+    arr = series.to_numpy()
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{arr.dtype.str}:{len(arr)}".encode())
+    if arr.dtype == object:
+        h.update(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+    else:
+        h.update(np.ascontiguousarray(arr).view(np.uint8))
+    return h.hexdigest()
+
+
+def _freeze(s: pd.Series) -> np.ndarray:
+    arr = np.array(s.to_numpy(), copy=True)
+    arr.flags.writeable = False
+    return arr
+
+
+class IndicatorCache:
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = int(max_bytes if max_bytes is not None else INDICATOR_CACHE_MAX_MB * 1024 * 1024)
+        self._lru: "OrderedDict[Key, tuple]" = OrderedDict()  # key -> (size, arrays, is_tuple)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats_ = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _put(self, key: Key, arrays: Tuple[np.ndarray, ...], is_tuple: bool):
+        size = sum(a.nbytes for a in arrays)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._lru.pop(key, None)
+            if old:
+                self._bytes -= old[0]
+            self._lru[key] = (size, arrays, is_tuple)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._lru:
+                _, (sz, _, _) = self._lru.popitem(last=False)
+                self._bytes -= sz
+                self.stats_["evictions"] += 1
+
+    def get(self, series: pd.Series, name: str, params: Hashable, fn: Callable[[], Any],
+            fp: Optional[str] = None):
+        """
+        Kết quả của fn() (Series hoặc tuple Series, cùng độ dài với `series`)
+        cho indicator `name` với `params` trên dữ liệu `series`.
+        fp: fingerprint đã tính sẵn của series (khi gọi nhiều lần trên cùng dữ liệu).
+        """
+        key = (fp or fingerprint(series), name, params)
+        with self._lock:
+            item = self._lru.get(key)
+            if item is not None:
+                self._lru.move_to_end(key)
+                self.stats_["hits"] += 1
+            else:
+                self.stats_["misses"] += 1
+        if item is not None:
+            _, arrays, is_tuple = item
+            out = tuple(pd.Series(a, index=series.index, copy=False) for a in arrays)
+            return out if is_tuple else out[0]
+
+        value = fn()
+        is_tuple = isinstance(value, tuple)
+        self._put(key, tuple(_freeze(s) for s in (value if is_tuple else (value,))), is_tuple)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.stats_)
+            s.update({"entries": len(self._lru), "bytes": self._bytes, "max_bytes": self.max_bytes})
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / lookups, 4) if lookups else None
+        return s
+
+
+_CACHE: Optional[IndicatorCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def indicator_cache() -> IndicatorCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = IndicatorCache()
+        return _CACHE
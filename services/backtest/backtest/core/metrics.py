@@ -1,11 +1,230 @@
 import math
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
+import numpy as np
 import pandas as pd
 
+from backtest.core.result import _fmt_duration_ms
+
+YEAR_MS = 365.25 * 86_400_000
+
 def _round2_safe(x: float) -> Optional[float]:
     """Round 2 decimals, return None if not finite."""
     return round(x, 2) if isinstance(x, (int, float)) and math.isfinite(x) else None
 
+def _round_safe(x, nd: int = 4) -> Optional[float]:
+    x = float(x)
+    return round(x, nd) if math.isfinite(x) else None
+
+def _to_float(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _pnl_array(trades: List[Dict]) -> np.ndarray:
+    """pnl của các trade; giá trị không parse được → NaN (bị bỏ qua như bản cũ)."""
+    return np.fromiter((_to_float(t.get("pnl", 0.0)) for t in trades), dtype=np.float64, count=len(trades))
+
+def _eq_array(equity: List[Dict]) -> np.ndarray:
+    return np.fromiter((_to_float(p.get("eq", 0.0)) for p in equity), dtype=np.float64, count=len(equity))
+
+
+# ---------------------------------------------------------------------------
+# Bản vector: nhận thẳng mảng NumPy (engine trả trong result["arrays"])
+# ---------------------------------------------------------------------------
+
+def win_rate_pct_arr(pnl: np.ndarray, *, count_breakeven_in_denom: bool = True,
+                     win_threshold: float = 0.0) -> Optional[float]:
+    pnl = np.asarray(pnl, dtype=np.float64)
+    pnl = pnl[np.isfinite(pnl)]
+    denom = len(pnl) if count_breakeven_in_denom else int(np.count_nonzero(pnl))
+    if denom == 0:
+        return None
+    return round((int(np.count_nonzero(pnl > win_threshold)) / denom) * 100.0, 2)
+
+def max_drawdown_pct_arr(eq: np.ndarray) -> Optional[float]:
+    eq = np.asarray(eq, dtype=np.float64)
+    eq = eq[np.isfinite(eq)]
+    if not len(eq):
+        return 0.0
+    peak = np.maximum.accumulate(eq)
+    if peak[-1] <= 0:
+        return 0.0
+    pos = peak > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = (eq[pos] / peak[pos] - 1.0) * 100.0
+    dd = dd[np.isfinite(dd)]
+    mdd = min(float(dd.min()), 0.0) if len(dd) else 0.0
+    return _round2_safe(mdd) or 0.0
+
+def profit_factor_arr(pnl: np.ndarray) -> Optional[float]:
+    pnl = np.asarray(pnl, dtype=np.float64)
+    pnl = pnl[np.isfinite(pnl)]
+    gross_win = float(pnl[pnl >= 0].sum())
+    gross_loss = float(pnl[pnl < 0].sum())
+    if abs(gross_loss) < 1e-12:
+        return None if gross_win > 0 else 0.0
+    return _round2_safe(gross_win / abs(gross_loss))
+
+def periods_per_year(t: np.ndarray) -> Optional[float]:
+    """Số bar/năm theo khoảng cách trung vị giữa các mốc t (ms)."""
+    if len(t) < 2:
+        return None
+    step = float(np.median(np.diff(np.asarray(t, dtype=np.int64))))
+    return YEAR_MS / step if step > 0 else None
+
+def longest_drawdown(t: np.ndarray, eq: np.ndarray) -> Dict[str, Any]:
+    """
+    Giai đoạn dưới đỉnh dài nhất (tính cả drawdown chưa hồi phục ở cuối chuỗi):
+    số bar và thời lượng từ đỉnh tới lúc vượt lại đỉnh.
+    """
+    n = len(eq)
+    if n < 2:
+        return {"bars": 0, "ms": 0, "start": None, "end": None}
+    idx = np.arange(n)
+    peak = np.maximum.accumulate(eq)
+    last_peak = np.maximum.accumulate(np.where(eq >= peak, idx, 0))
+    span_ms = t - t[last_peak]
+    k = int(np.argmax(span_ms))
+    return {"bars": int(k - last_peak[k]), "ms": int(span_ms[k]),
+            "start": int(t[last_peak[k]]), "end": int(t[k])}
+
+def _max_run(mask: np.ndarray) -> int:
+    """Độ dài dãy True liên tiếp dài nhất."""
+    if not mask.any():
+        return 0
+    m = np.concatenate(([False], mask, [False])).astype(np.int8)
+    d = np.diff(m)
+    return int((np.flatnonzero(d == -1) - np.flatnonzero(d == 1)).max())
+
+def compute_metrics(t: np.ndarray,
+                    eq: np.ndarray,
+                    pnl: np.ndarray,
+                    return_pct: np.ndarray,
+                    entry_i: np.ndarray,
+                    exit_i: np.ndarray,
+                    n_bars: int,
+                    initial_capital: float) -> Dict[str, Any]:
+    """
+    Toàn bộ chỉ số của một run trong một lượt vector hoá.
+    t/eq: equity theo bar (ms, float64); pnl/return_pct/entry_i/exit_i: theo trade.
+    Sharpe/Sortino/volatility annualize theo số bar/năm suy ra từ t (rf = 0).
+    """
+    t = np.asarray(t, dtype=np.int64)
+    eq = np.asarray(eq, dtype=np.float64)
+    pnl = np.asarray(pnl, dtype=np.float64)
+    ret_t = np.asarray(return_pct, dtype=np.float64)
+    entry_i = np.asarray(entry_i, dtype=np.int64)
+    exit_i = np.asarray(exit_i, dtype=np.int64)
+    initial = float(initial_capital)
+    final = float(eq[-1]) if len(eq) else initial
+
+    out: Dict[str, Any] = {
+        "max_drawdown_pct": max_drawdown_pct_arr(eq),
+        "profit_factor": profit_factor_arr(pnl),
+        "win_rate_pct": win_rate_pct_arr(pnl),
+    }
+
+    # ---- theo bar
+    ppy = periods_per_year(t)
+    sharpe = sortino = vol = cagr = None
+    if len(eq) > 1:
+        prev = np.concatenate(([initial], eq[:-1]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.where(prev > 0, eq / prev - 1.0, 0.0)
+        mu, sd = float(r.mean()), float(r.std(ddof=1))
+        downside = float(np.sqrt(np.mean(np.minimum(r, 0.0) ** 2)))
+        if ppy:
+            ann = math.sqrt(ppy)
+            vol = sd * ann * 100.0
+            sharpe = mu / sd * ann if sd > 0 else None
+            sortino = mu / downside * ann if downside > 0 else None
+            years = (t[-1] - t[0]) / YEAR_MS
+            if years > 0 and final > 0 and initial > 0:
+                cagr = ((final / initial) ** (1.0 / years) - 1.0) * 100.0
+    mdd = out["max_drawdown_pct"]
+    calmar = cagr / abs(mdd) if (cagr is not None and mdd) else None
+    dd_long = longest_drawdown(t, eq) if len(eq) else {"bars": 0, "ms": 0}
+
+    # ---- theo trade
+    m = len(pnl)
+    held = int(np.sum(exit_i - entry_i + 1)) if m else 0
+    wins, losses = pnl > 0, pnl < 0
+    out.update({
+        "sharpe_ratio": _round_safe(sharpe, 4) if sharpe is not None else None,
+        "sortino_ratio": _round_safe(sortino, 4) if sortino is not None else None,
+        "volatility_pct": _round_safe(vol, 2) if vol is not None else None,
+        "cagr_pct": _round_safe(cagr, 2) if cagr is not None else None,
+        "calmar_ratio": _round_safe(calmar, 4) if calmar is not None else None,
+        "exposure_pct": round(min(held, n_bars) / n_bars * 100.0, 2) if n_bars else 0.0,
+        "longest_drawdown_bars": dd_long["bars"],
+        "longest_drawdown_duration": _fmt_duration_ms(0, dd_long["ms"]),
+        "avg_trade_pnl": _round_safe(pnl.mean(), 4) if m else None,
+        "avg_trade_return_pct": _round_safe(ret_t.mean(), 4) if m else None,
+        "avg_win_pnl": _round_safe(pnl[wins].mean(), 4) if wins.any() else None,
+        "avg_loss_pnl": _round_safe(pnl[losses].mean(), 4) if losses.any() else None,
+        "largest_win_pnl": _round_safe(pnl.max(), 4) if wins.any() else None,
+        "largest_loss_pnl": _round_safe(pnl.min(), 4) if losses.any() else None,
+        "avg_bars_in_trade": round(held / m, 2) if m else None,
+        "max_consecutive_wins": _max_run(wins),
+        "max_consecutive_losses": _max_run(losses),
+    })
+    return out
+
+def arrays_from_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Mảng cho compute_metrics từ output engine: dùng result["arrays"] nếu có (engine numpy),
+    nếu không (engine pandas) thì tách từ trades / equity_curve dạng dict.
+    """
+    if result.get("arrays") is not None:
+        return result["arrays"]
+    equity, trades = result["equity_curve"], result["trades"]
+
+    def ms(values):
+        if not len(values):
+            return np.empty(0, dtype=np.int64)
+        return pd.to_datetime(pd.Series(values), utc=True).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+
+    t = ms([p["t"] for p in equity])
+    bars = np.unique(t)
+    return {
+        "t": t,
+        "eq": _eq_array(equity),
+        "entry_i": np.searchsorted(bars, ms([x["entry_time"] for x in trades])),
+        "exit_i": np.searchsorted(bars, ms([x["exit_time"] for x in trades])),
+        "pnl": _pnl_array(trades),
+        "return_pct": np.fromiter((_to_float(x.get("return_pct")) for x in trades), dtype=np.float64, count=len(trades)),
+        "n_bars": len(bars),
+    }
+
+def period_returns(t: np.ndarray, eq: np.ndarray, initial_capital: float,
+                   period: str = "monthly") -> List[Dict[str, Any]]:
+    """
+    Bảng lợi nhuận theo kỳ (daily / monthly, UTC): equity cuối kỳ so với cuối kỳ trước
+    (kỳ đầu so với vốn ban đầu).
+    """
+    unit = {"daily": "D", "monthly": "M"}.get(period)
+    if unit is None:
+        raise ValueError(f"period not supported: {period}")
+    t = np.asarray(t, dtype=np.int64)
+    eq = np.asarray(eq, dtype=np.float64)
+    if not len(t):
+        return []
+    p = t.astype("datetime64[ms]").astype(f"datetime64[{unit}]")
+    last = np.flatnonzero(np.concatenate((p[1:] != p[:-1], [True])))
+    end_eq = eq[last]
+    start_eq = np.concatenate(([float(initial_capital)], end_eq[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = (end_eq / start_eq - 1.0) * 100.0
+    labels = np.datetime_as_string(p[last], unit=unit).tolist()
+    return [{"period": k, "return_pct": _round_safe(r, 4), "equity": float(e)}
+            for k, r, e in zip(labels, ret.tolist(), end_eq.tolist())]
+
+
+# ---------------------------------------------------------------------------
+# API cũ trên list dict (trades / equity_curve): tách mảng rồi gọi bản vector
+# ---------------------------------------------------------------------------
+
 def win_rate_pct(trades: List[Dict], *, count_breakeven_in_denom: bool = True, win_threshold: float = 0.0) -> Optional[float]:
     """
     Engine đã đảm bảo mọi lệnh đều đóng.
@@ -13,34 +232,8 @@ def win_rate_pct(trades: List[Dict], *, count_breakeven_in_denom: bool = True, w
     """
     if not trades:
         return None
-
-    wins = 0
-    denom = 0
-
-    for t in trades:
-        pnl_raw = t.get("pnl", 0.0)
-        try:
-            pnl = float(pnl_raw)
-        except Exception:
-            continue
-        if not math.isfinite(pnl):
-            continue
-
-        # mẫu số
-        if count_breakeven_in_denom:
-            denom += 1
-        else:
-            if pnl != 0.0:
-                denom += 1
-
-        # lệnh thắng
-        if pnl > win_threshold:
-            wins += 1
-
-    if denom == 0:
-        return None
-
-    return round((wins / denom) * 100.0, 2)
+    return win_rate_pct_arr(_pnl_array(trades), count_breakeven_in_denom=count_breakeven_in_denom,
+                            win_threshold=win_threshold)
 
 def max_drawdown_pct(equity: List[Dict]) -> Optional[float]:
     """
@@ -48,22 +241,7 @@ def max_drawdown_pct(equity: List[Dict]) -> Optional[float]:
     """
     if not equity:
         return 0.0
-
-    peak = -math.inf
-    mdd = 0.0  # mdd là số âm hoặc 0
-    for p in equity:
-        eq = float(p.get("eq", 0.0))
-        if not math.isfinite(eq):
-            continue
-        peak = max(peak, eq)
-        if peak > 0:
-            dd = (eq / peak - 1.0) * 100.0
-            if math.isfinite(dd):
-                mdd = min(mdd, dd)
-
-    if peak <= 0:
-        return 0.0  # không có mốc đỉnh > 0 → xem như không có drawdown hữu ích
-    return _round2_safe(mdd) or 0.0  # mdd luôn hữu hạn ở đây, nhưng phòng vệ
+    return max_drawdown_pct_arr(_eq_array(equity))
 
 def profit_factor(trades: List[Dict]) -> Optional[float]:
     """
@@ -71,22 +249,7 @@ def profit_factor(trades: List[Dict]) -> Optional[float]:
     - Nếu không có lệnh thua (gross_loss ~ 0) và có lệnh thắng → PF = ∞ → trả None (để JSON-safe), FE hiển thị '∞'.
     - Nếu không có thắng lẫn thua (gross_win=0, gross_loss=0) → PF = 0.0.
     """
-    gross_win = 0.0
-    gross_loss = 0.0
-    for t in trades:
-        pnl = float(t.get("pnl", 0.0))
-        if not math.isfinite(pnl):
-            continue
-        if pnl >= 0:
-            gross_win += pnl
-        else:
-            gross_loss += pnl  # âm
-
-    if abs(gross_loss) < 1e-12:
-        return None if gross_win > 0 else 0.0  # ∞ → None; 0/0 → 0.0
-
-    pf = gross_win / abs(gross_loss)
-    return _round2_safe(pf)
+    return profit_factor_arr(_pnl_array(trades))
 
 def buy_hold_return_pct(df: pd.DataFrame) -> Optional[float]:
     """
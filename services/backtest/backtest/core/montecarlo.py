@@ -0,0 +1,161 @@
+# backtest/core/montecarlo.py
+"""
+Monte Carlo trên danh sách trade của một run (đánh giá độ "mong manh" của kết quả).
+
+Mỗi trade được quy về tỉ suất trên equity trước lệnh:
+    f_i = (pnl_i - phí vào_i) / E_{i-1},   E_i = E_{i-1} + pnl_i - phí vào_i
+(pnl của engine đã trừ phí ra; phí vào trừ thẳng vào cash) → nhân dồn các
+(1 + f_i) theo thứ tự gốc cho lại final_equity của run (sai số nhỏ do pnl
+đã làm tròn 4 chữ số). Tỉ trọng vị thế w_i = notional_i / E_{i-1} dùng để
+nhiễu chi phí.
+
+Mô phỏng (toàn bộ là phép toán ma trận NumPy, paths × trades, chia khối để
+giới hạn bộ nhớ):
+  - method="bootstrap": lấy mẫu có hoàn lại m trade; "shuffle": hoán vị thứ tự.
+  - fee/slippage mỗi path lấy ngẫu nhiên đều trong khoảng cho trước; chênh lệch
+    so với run gốc được áp lên cả hai chiều lệnh: f -= 2 · w · (Δfee + Δslippage)
+    (xấp xỉ tuyến tính của chi phí khứ hồi).
+  - drawdown tính trên equity sau từng trade (không phải từng bar).
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MONTECARLO_MAX_PATHS = 100_000
+MONTECARLO_MAX_BINS = 1_000
+# trần paths × trades của một request (chạy đồng bộ trong handler; 10M ≈ 0.4 s)
+MONTECARLO_MAX_WORK = int(os.getenv("MONTECARLO_MAX_WORK", "10000000"))
+_CHUNK_ELEMS = 4_000_000  # số phần tử tối đa của một khối paths × trades
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def trade_returns(trades: List[Dict[str, Any]], initial_capital: float,
+                  fee_pct: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(f, w) theo thứ tự trade; bỏ qua trade chưa đóng (pnl None)."""
+    done = [t for t in trades if t.get("pnl") is not None]
+    m = len(done)
+    pnl = np.fromiter((float(t["pnl"]) for t in done), dtype=np.float64, count=m)
+    notional = np.fromiter((float(t["entry_price"]) * float(t["size"]) for t in done), dtype=np.float64, count=m)
+    delta = pnl - notional * float(fee_pct)
+    # E_{i-1}: equity trước trade i
+    before = float(initial_capital) + np.concatenate(([0.0], np.cumsum(delta)[:-1])) if m else np.empty(0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f = np.where(before > 0, delta / before, 0.0)
+        w = np.where(before > 0, notional / before, 0.0)
+    return f, w
+
+
+def _dist(x: np.ndarray, bins: int) -> Dict[str, Any]:
+    lo, hi = float(x.min()), float(x.max())
+    # mọi path (gần như) bằng nhau, vd. shuffle không nhiễu chi phí: tích không đổi theo thứ tự
+    span = (lo - 0.5, hi + 0.5) if hi - lo <= 1e-9 * max(1.0, abs(hi)) else None
+    counts, edges = np.histogram(x, bins=bins, range=span)
+    return {
+        "mean": float(x.mean()),
+        "std": float(x.std()),
+        "min": float(x.min()),
+        "max": float(x.max()),
+        "percentiles": {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(x, PERCENTILES))},
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+    }
+
+
+def _draw_range(rng, rng_pair: Optional[Sequence[float]], base: float, n: int) -> np.ndarray:
+    if rng_pair is None:
+        return np.full(n, float(base))
+    lo, hi = float(rng_pair[0]), float(rng_pair[1])
+    if lo < 0 or hi < lo:
+        raise ValueError("cost ranges must satisfy 0 <= min <= max")
+    return rng.uniform(lo, hi, n)
+
+
+def simulate(f: np.ndarray,
+             w: np.ndarray,
+             initial_capital: float,
+             paths: int = 10_000,
+             method: str = "bootstrap",
+             fee_pct: float = 0.0,
+             slippage_pct: float = 0.0,
+             fee_pct_range: Optional[Sequence[float]] = None,
+             slippage_pct_range: Optional[Sequence[float]] = None,
+             ruin_pct: float = 50.0,
+             seed: Optional[int] = None,
+             bins: int = 50) -> Dict[str, Any]:
+    """
+    Phân phối final_equity / total_return_pct / max_drawdown_pct trên `paths` path.
+    ruin: equity chạm ≤ initial × (1 - ruin_pct/100) ở bất kỳ trade nào.
+    """
+    if method not in ("bootstrap", "shuffle"):
+        raise ValueError(f"method not supported: {method}")
+    paths = int(paths)
+    if not 1 <= paths <= MONTECARLO_MAX_PATHS:
+        raise ValueError(f"paths must be in [1, {MONTECARLO_MAX_PATHS}]")
+    bins = int(bins)
+    if not 1 <= bins <= MONTECARLO_MAX_BINS:
+        raise ValueError(f"bins must be in [1, {MONTECARLO_MAX_BINS}]")
+    m = len(f)
+    if m == 0:
+        raise ValueError("run has no closed trades")
+    if paths * m > MONTECARLO_MAX_WORK:
+        raise ValueError(f"paths x trades too large: {paths} x {m} > {MONTECARLO_MAX_WORK}; "
+                         f"use paths <= {max(1, MONTECARLO_MAX_WORK // m)}")
+
+    rng = np.random.default_rng(seed)
+    initial = float(initial_capital)
+    ruin_level = initial * (1.0 - float(ruin_pct) / 100.0)
+    d_cost = (_draw_range(rng, fee_pct_range, fee_pct, paths) - float(fee_pct)) \
+        + (_draw_range(rng, slippage_pct_range, slippage_pct, paths) - float(slippage_pct))
+
+    with_costs = bool(np.any(d_cost))
+    final = np.empty(paths)
+    mdd = np.empty(paths)
+    ruined = np.empty(paths, dtype=bool)
+    chunk = max(1, _CHUNK_ELEMS // m)
+    for s in range(0, paths, chunk):
+        e = min(s + chunk, paths)
+        p = e - s
+        if method == "bootstrap":
+            idx = rng.integers(0, m, size=(p, m), dtype=np.int32)
+        else:
+            idx = rng.permuted(np.broadcast_to(np.arange(m, dtype=np.int32), (p, m)), axis=1)
+        eq = f[idx]
+        eq += 1.0
+        if with_costs:
+            eq -= 2.0 * w[idx] * d_cost[s:e, None]
+        np.maximum(eq, 0.0, out=eq)  # không âm vốn: equity về 0 là hết
+        np.cumprod(eq, axis=1, out=eq)
+        eq *= initial
+        final[s:e] = eq[:, -1]
+        ruined[s:e] = eq.min(axis=1) <= ruin_level
+        peak = np.maximum.accumulate(eq, axis=1)
+        np.maximum(peak, initial, out=peak)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.divide(eq, peak, out=eq)
+        mdd[s:e] = (np.minimum(eq.min(axis=1), 1.0) - 1.0) * 100.0
+
+    total_ret = (final / initial - 1.0) * 100.0
+    return {
+        "paths": paths,
+        "trades": m,
+        "method": method,
+        "seed": seed,
+        "final_equity": _dist(final, bins),
+        "total_return_pct": _dist(total_ret, bins),
+        "max_drawdown_pct": _dist(mdd, bins),
+        "ruin_pct": float(ruin_pct),
+        "ruin_probability": float(ruined.mean()),
+        "loss_probability": float((final < initial).mean()),
+    }
+
+
+def original_path(f: np.ndarray, initial_capital: float) -> Dict[str, float]:
+    """final_equity / max_drawdown_pct (theo trade) của thứ tự trade gốc, để so với phân phối."""
+    initial = float(initial_capital)
+    eq = initial * np.cumprod(1.0 + f) if len(f) else np.array([initial])
+    peak = np.maximum(np.maximum.accumulate(eq), initial)
+    return {
+        "final_equity": float(eq[-1]),
+        "max_drawdown_pct": float(min((eq / peak - 1.0).min(), 0.0) * 100.0),
+    }
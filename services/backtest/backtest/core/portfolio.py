@@ -0,0 +1,331 @@
+# backtest/core/portfolio.py
+"""
+Backtest nhiều symbol với chung một khoản tiền mặt (portfolio).
+
+- Căn dữ liệu: hợp các timestamp của mọi symbol thành một trục t, OHLC/signal
+  thành ma trận (T, N) bằng một lần scatter; bar mà symbol không có nến là NaN
+  (không khớp lệnh, không SL/TP, mark-to-market theo close gần nhất).
+- Signal của từng symbol qua STRATEGY_MAP (indicator dùng chung indicator_cache).
+- Mỗi bar chỉ xử lý (vòng lặp vô hướng, theo thứ tự symbol) các symbol đang
+  có pending order, vị thế hoặc signal; bar không có gì xảy ra bị bỏ qua.
+  Mark-to-market tính vector trên cả (T, N) một lần sau vòng lặp.
+- Khớp lệnh / phí / slippage / SL-TP / pending order giống backtest_engine_arrays;
+  với 1 symbol và weight 1 kết quả trùng với engine đơn.
+
+Sizing: lệnh vào của symbol j dùng equity hiện tại × position_pct × weight_j
+(weights chuẩn hoá về tổng 1, mặc định chia đều); lệnh long bị chặn bởi tiền
+mặt còn lại.
+"""
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest.core.engine import frame_to_arrays
+from backtest.core.result import _fmt_durations_ms, _iso_ms, _iso_ms_array
+from backtest.core.metrics import max_drawdown_pct, profit_factor, win_rate_pct
+from backtest.core.strategies import STRATEGY_MAP
+
+PORTFOLIO_MAX_SYMBOLS = 50
+
+
+def align_frames(frames: Dict[str, Dict[str, np.ndarray]], symbols: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    frames[sym]: mảng t (int64 ms), open/high/low/close (float64), signal (int8).
+    Trả t (T,) là hợp các timestamp, và ma trận (T, N) theo thứ tự `symbols`:
+    OHLC (NaN khi không có nến), signal (0), close_ff (close forward-fill).
+    """
+    ts = [np.asarray(frames[s]["t"], dtype=np.int64) for s in symbols]
+    t = np.unique(np.concatenate(ts)) if ts else np.empty(0, dtype=np.int64)
+    T, N = len(t), len(symbols)
+    rows = np.concatenate([np.searchsorted(t, x) for x in ts]) if ts else np.empty(0, dtype=np.int64)
+    cols = np.repeat(np.arange(N), [len(x) for x in ts])
+
+    out = {"t": t}
+    for name in ("open", "high", "low", "close"):
+        m = np.full((T, N), np.nan)
+        m[rows, cols] = np.concatenate([np.asarray(frames[s][name], dtype=np.float64) for s in symbols])
+        out[name] = m
+    sig = np.zeros((T, N), dtype=np.int8)
+    sig[rows, cols] = np.concatenate([np.asarray(frames[s]["signal"], dtype=np.int8) for s in symbols])
+    out["signal"] = sig
+    out["close_ff"] = pd.DataFrame(out["close"]).ffill().to_numpy()
+    return out
+
+
+def _normalize_weights(symbols: Sequence[str], weights: Optional[Dict[str, float]]) -> np.ndarray:
+    if not weights:
+        return np.full(len(symbols), 1.0 / len(symbols))
+    w = np.array([float(weights.get(s, 0.0)) for s in symbols])
+    if (w < 0).any() or w.sum() <= 0:
+        raise ValueError("weights must be >= 0 with a positive sum")
+    return w / w.sum()
+
+
+def portfolio_engine(bars: Dict[str, np.ndarray],
+                     symbols: Sequence[str],
+                     initial_capital: float,
+                     position_pct: float,
+                     fee_pct: float,
+                     slippage_pct: float,
+                     allow_short: bool,
+                     stop_loss_pct: Optional[float],
+                     take_profit_pct: Optional[float],
+                     weights: Optional[Dict[str, float]] = None,
+                     progress: Optional[Callable[[int, int], None]] = None,
+                     progress_every: int = 50_000) -> Dict[str, Any]:
+    """bars: output của align_frames. Trả final_equity, trades (có "symbol"), equity_curve."""
+    t_ms = bars["t"]
+    O, H, L, C, S, CF = (bars[k] for k in ("open", "high", "low", "close", "signal", "close_ff"))
+    T, N = O.shape
+    w = _normalize_weights(symbols, weights)
+    present = ~np.isnan(O)
+    fee_pct = float(fee_pct)
+    use_sl = stop_loss_pct is not None
+    use_tp = take_profit_pct is not None
+
+    cash = float(initial_capital)
+    qty = [0.0] * N
+    entry_px = [0.0] * N
+    open_trade = [-1] * N
+    held: List[int] = []            # symbol đang có vị thế, tăng dần theo j
+    pend_exit = set()
+    pend_enter: Dict[int, int] = {}  # j → 1 LONG / -1 SHORT
+    # mỗi trade: [j, side, size, entry_i, entry_price, exit_i, exit_price, pnl, return_pct, reason]
+    trades: List[list] = []
+    cash_eq = np.empty(T)            # tiền mặt cuối mỗi bar
+    qty_set: List[tuple] = []        # (i, j, qty) mỗi lần vị thế đổi trong vòng lặp
+    report_at = progress_every if progress is not None else -1
+
+    # signal khác 0 theo bar (S = 0 ở bar không có nến): sig_at[i]..sig_at[i+1] trong sig_j / sig_v
+    sig_i, sig_j = np.nonzero(S)
+    sig_at = np.searchsorted(sig_i, np.arange(T + 1)).tolist()
+    sig_v = S[sig_i, sig_j].tolist()
+    sig_j = sig_j.tolist()
+
+    def close(j, i, px, reason):
+        q, ep = qty[j], entry_px[j]
+        fee_out = px * abs(q) * fee_pct
+        pnl = (px - ep) * q - fee_out
+        tr = trades[open_trade[j]]
+        tr[5] = i; tr[6] = float(px); tr[9] = reason
+        tr[7] = round(float(pnl), 4)
+        tr[8] = round(float(pnl) / (ep * abs(q)) * 100.0, 4)
+        qty[j] = 0.0
+        open_trade[j] = -1
+        held.remove(j)
+        qty_set.append((i, j, 0.0))
+        return px * q - fee_out
+
+    # Chỉ duyệt các symbol "đang hoạt động" của bar (có pending, đang giữ, hoặc có signal)
+    # bằng vòng lặp vô hướng; bar không có gì xảy ra chỉ còn ghi tiền mặt. Mark-to-market
+    # tính vector một lần sau vòng lặp từ lịch sử vị thế.
+    for i in range(T):
+        if i == report_at:
+            progress(i, len(trades))
+            report_at += progress_every
+        if not (held or pend_exit or pend_enter or sig_at[i] != sig_at[i + 1]):
+            cash_eq[i] = cash
+            continue
+        o_ = O[i].tolist()
+
+        # (1) pending EXIT tại OPEN (cộng tiền theo thứ tự symbol)
+        if pend_exit:
+            for j in sorted(pend_exit):
+                if o_[j] == o_[j] and qty[j] != 0.0:
+                    fill = o_[j] * (1 - slippage_pct) if qty[j] > 0 else o_[j] * (1 + slippage_pct)
+                    cash += close(j, i, float(fill), "SignalChange")
+                    pend_exit.discard(j)
+
+        # (2) pending ENTER: dùng chung tiền mặt → lần lượt từng symbol
+        if pend_enter:
+            enter = [j for j in sorted(pend_enter) if o_[j] == o_[j] and qty[j] == 0.0]
+            if enter:
+                equity_now = cash
+                if held:
+                    equity_now = cash + float(np.dot([qty[k] for k in held], CF[i - 1, held]))
+                for j in enter:
+                    side = pend_enter.pop(j)
+                    target = equity_now * position_pct * w[j]
+                    if side == 1:
+                        fill_px = o_[j] * (1 + slippage_pct)
+                        cash_to_use = min(target, cash)
+                        if cash_to_use > 0:
+                            new_qty = cash_to_use / fill_px
+                            cash -= fill_px * new_qty + fill_px * new_qty * fee_pct
+                            qty[j], entry_px[j], open_trade[j] = new_qty, fill_px, len(trades)
+                            trades.append([j, "LONG", float(new_qty), i, fill_px, -1, None, None, None, None])
+                    elif allow_short:
+                        fill_px = o_[j] * (1 - slippage_pct)
+                        cash_to_use = target
+                        if cash_to_use > 0:
+                            new_qty = -(cash_to_use / fill_px)
+                            cash += fill_px * abs(new_qty) - fill_px * abs(new_qty) * fee_pct
+                            qty[j], entry_px[j], open_trade[j] = new_qty, fill_px, len(trades)
+                            trades.append([j, "SHORT", float(abs(new_qty)), i, fill_px, -1, None, None, None, None])
+                    if qty[j] != 0.0:
+                        bisect.insort(held, j)
+                        qty_set.append((i, j, qty[j]))
+
+        # (3) SL/TP intrabar trên các symbol đang giữ (ưu tiên SL nếu cùng chạm)
+        exited = ()
+        if (use_sl or use_tp) and held:
+            lo, hi = L[i].tolist(), H[i].tolist()
+            hits = []
+            for j in held:
+                if lo[j] != lo[j]:
+                    continue  # không có nến
+                ep, px, reason = entry_px[j], None, None
+                if qty[j] > 0:
+                    if use_sl and lo[j] <= ep * (1 - stop_loss_pct):
+                        px, reason = ep * (1 - stop_loss_pct), "StopLoss"
+                    elif use_tp and hi[j] >= ep * (1 + take_profit_pct):
+                        px, reason = ep * (1 + take_profit_pct), "TakeProfit"
+                    if px is not None:
+                        hits.append((j, px * (1 - slippage_pct), reason))
+                else:
+                    if use_sl and hi[j] >= ep * (1 + stop_loss_pct):
+                        px, reason = ep * (1 + stop_loss_pct), "StopLoss"
+                    elif use_tp and lo[j] <= ep * (1 - take_profit_pct):
+                        px, reason = ep * (1 - take_profit_pct), "TakeProfit"
+                    if px is not None:
+                        # như engine đơn: chỉ nhánh SHORT reset pending
+                        pend_exit.discard(j)
+                        pend_enter.pop(j, None)
+                        hits.append((j, px * (1 + slippage_pct), reason))
+            for j, px, reason in hits:
+                cash += close(j, i, float(px), reason)
+            exited = {j for j, _, _ in hits}
+
+        # (4) signal → pending cho OPEN bar kế (bar vừa SL/TP thì bỏ qua, như engine đơn)
+        for k in range(sig_at[i], sig_at[i + 1]):
+            j, s_ = sig_j[k], sig_v[k]
+            if j in exited:
+                continue
+            q = qty[j]
+            if q > 0.0:
+                if s_ == -1:
+                    pend_exit.add(j)
+                    if allow_short:
+                        pend_enter[j] = -1
+                    else:
+                        pend_enter.pop(j, None)
+            elif q < 0.0:
+                if s_ == 1:
+                    pend_exit.add(j)
+                    pend_enter[j] = 1
+            elif s_ == 1 or allow_short:
+                pend_enter[j] = s_
+
+        cash_eq[i] = cash
+
+    # (5) mark-to-market cuối bar (symbol không có nến: close gần nhất), vector trên cả (T, N)
+    eq = cash_eq
+    if qty_set:
+        Q = np.full((T, N), np.nan)
+        Q[0] = 0.0
+        for i, j, q in qty_set:
+            Q[i, j] = q
+        Q = pd.DataFrame(Q).ffill().to_numpy()
+        held_m = Q != 0.0
+        eq = cash_eq + np.where(held_m, Q * np.where(held_m, CF, 0.0), 0.0).sum(axis=1)
+    eq = eq.tolist()
+
+    # (6) đóng cuối kỳ: mỗi symbol tại close của nến cuối cùng của nó
+    if held:
+        last_i = T - 1 - np.argmax(present[::-1], axis=0)
+        for j in list(held):
+            i = int(last_i[j])
+            c_ = float(C[i, j])
+            fill_px = c_ * (1 - slippage_pct) if qty[j] > 0 else c_ * (1 + slippage_pct)
+            cash += close(j, i, fill_px, "End")
+        eq.append(float(cash))
+    if progress is not None:
+        progress(T, len(trades))
+
+    # ---- output: format thời gian một lần ở biên
+    labels = _iso_ms_array(t_ms)
+    m = len(trades)
+    durations = _fmt_durations_ms(t_ms[np.fromiter((tr[3] for tr in trades), dtype=np.int64, count=m)],
+                                  t_ms[np.fromiter((tr[5] for tr in trades), dtype=np.int64, count=m)])
+    out_trades = []
+    for k, ((j, side, size, ei, ep, xi, xp, pnl, ret, reason), dur) in enumerate(zip(trades, durations), start=1):
+        out_trades.append({
+            "id": k, "symbol": symbols[j], "side": side, "size": size,
+            "entry_time": labels[ei], "entry_price": ep,
+            "exit_time": labels[xi], "exit_price": xp,
+            "pnl": pnl, "return_pct": ret,
+            "duration": dur,
+            "reason": reason,
+        })
+    equity_curve = [{"t": labels[min(i, T - 1)], "eq": v} for i, v in enumerate(eq)]
+    return {"final_equity": float(cash), "trades": out_trades, "equity_curve": equity_curve}
+
+
+def _prepare_symbol(df: pd.DataFrame, strategy_type: str, params: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    return frame_to_arrays(STRATEGY_MAP[strategy_type](df, params))
+
+
+def run_portfolio(frames: Dict[str, pd.DataFrame],
+                  strategy_type: str,
+                  params: Dict[str, Any],
+                  engine_kwargs: Dict[str, Any],
+                  weights: Optional[Dict[str, float]] = None,
+                  params_by_symbol: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    frames: symbol → df nến (t, OHLC). Chuẩn bị signal cho từng symbol (song song
+    theo thread: phần lớn thời gian nằm trong pandas/NumPy), căn trục thời gian,
+    chạy portfolio_engine và tính summary tổng + theo symbol.
+    """
+    if strategy_type not in STRATEGY_MAP:
+        raise ValueError(f"strategy not supported: {strategy_type}")
+    symbols = list(frames)
+    if not symbols:
+        raise ValueError("at least one symbol is required")
+    if len(symbols) > PORTFOLIO_MAX_SYMBOLS:
+        raise ValueError(f"too many symbols: {len(symbols)} > {PORTFOLIO_MAX_SYMBOLS}")
+    params_by_symbol = params_by_symbol or {}
+
+    with ThreadPoolExecutor(max_workers=min(8, len(symbols))) as ex:
+        prepared = dict(zip(symbols, ex.map(
+            lambda s: _prepare_symbol(frames[s], strategy_type, {**params, **params_by_symbol.get(s, {})}),
+            symbols)))
+    bars = align_frames(prepared, symbols)
+    res = portfolio_engine(bars, symbols, weights=weights, **engine_kwargs)
+
+    initial = float(engine_kwargs["initial_capital"])
+    final_eq = res["final_equity"]
+    per_symbol = {}
+    for j, s in enumerate(symbols):
+        tr = [x for x in res["trades"] if x["symbol"] == s]
+        close = prepared[s]["close"]
+        bh = None
+        if len(close) and close[0] > 0:
+            bh = round((float(close[-1]) / float(close[0]) - 1.0) * 100.0, 2)
+        per_symbol[s] = {
+            "bars": int(len(close)),
+            "num_trades": len(tr),
+            "pnl": round(sum(float(x["pnl"]) for x in tr), 4),
+            "win_rate_pct": win_rate_pct(tr),
+            "profit_factor": profit_factor(tr),
+            "buy_and_hold_return_pct": bh,
+        }
+
+    t = bars["t"]
+    summary = {
+        "strategy": strategy_type,
+        "symbols": symbols,
+        "weights": dict(zip(symbols, _normalize_weights(symbols, weights).round(6).tolist())),
+        "start": _iso_ms(int(t[0])) if len(t) else None,
+        "end": _iso_ms(int(t[-1])) if len(t) else None,
+        "initial_capital": initial,
+        "final_equity": final_eq,
+        "total_return_pct": round((final_eq / initial - 1.0) * 100.0, 2),
+        "max_drawdown_pct": max_drawdown_pct(res["equity_curve"]),
+        "profit_factor": profit_factor(res["trades"]),
+        "num_trades": len(res["trades"]),
+        "win_rate_pct": win_rate_pct(res["trades"]),
+    }
+    return {"summary": summary, "per_symbol": per_symbol, "trades": res["trades"], "equity_curve": res["equity_curve"]}
@@ -0,0 +1,234 @@
+# backtest/core/result.py
+"""
+Kết quả engine dạng cột (struct-of-arrays) + các hàm chuyển / format thời gian
+(ISO ↔ epoch ms) dùng chung cho engine, cache, equity store và output.
+
+BacktestResult giữ trade theo cột NumPy (side / reason là mã int8) và equity là
+mảng float64 theo bar; list dict `trades` / `equity_curve` (schema như API cũ)
+chỉ được dựng khi có người đọc, một lần rồi giữ lại. Sweep / walk-forward chỉ
+cần `arrays` cho summary nên không bao giờ tạo dict nào.
+
+Truy cập kiểu dict (res["trades"], res.get("arrays"), "arrays" in res) vẫn dùng
+được như output cũ. to_numpy() / to_arrow() trả buffer cột cho phân tích tiếp
+(to_arrow cần cài `pyarrow`).
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # to_arrow là tuỳ chọn
+    pa = None
+
+SIDES = ("LONG", "SHORT")
+REASONS = ("SignalChange", "StopLoss", "TakeProfit", "End")
+TRADE_COLUMNS = ("side", "size", "entry_i", "entry_price", "exit_i", "exit_price", "pnl", "return_pct", "reason")
+_TRADE_DTYPES = (np.int8, np.float64, np.int64, np.float64, np.int64, np.float64, np.float64, np.float64, np.int8)
+
+
+def _fmt_duration_ms(start_ms: int, end_ms: int) -> str:
+    # "Dd H:MM" (hoặc "H:MM" khi < 1 ngày), tính trực tiếp trên epoch ms (không parse chuỗi)
+    days, rem = divmod(int(end_ms) - int(start_ms), 86_400_000)
+    hhmm = str(timedelta(seconds=rem // 1000))[:-3]
+    return f"{days}d {hhmm}" if days > 0 else hhmm
+
+def _fmt_durations_ms(start_ms: np.ndarray, end_ms: np.ndarray) -> List[str]:
+    """Bản vector của _fmt_duration_ms: tách ngày / giờ / phút cho cả mảng rồi ghép chuỗi một lượt."""
+    d = np.asarray(end_ms, dtype=np.int64) - np.asarray(start_ms, dtype=np.int64)
+    days, rem = np.divmod(d, 86_400_000)
+    secs = rem // 1000
+    hh, mm = secs // 3600, secs % 3600 // 60
+    return [f"{dd}d {h}:{m:02d}" if dd > 0 else f"{h}:{m:02d}"
+            for dd, h, m in zip(days.tolist(), hh.tolist(), mm.tolist())]
+
+def _to_ms(ts) -> int:
+    """Một mốc thời gian (ISO / datetime) → epoch ms."""
+    return int(pd.to_datetime(ts, utc=True).value // 1_000_000)
+
+def _to_ms_array(values) -> np.ndarray:
+    """Cột thời gian (ISO / datetime) → int64 epoch ms, parse một lần cho cả cột."""
+    if not len(values):
+        return np.empty(0, dtype=np.int64)
+    return pd.to_datetime(pd.Series(values), utc=True).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+
+def _iso_ms(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _iso_ms_array(ms: np.ndarray) -> List[str]:
+    """Bản vector của _iso_ms (epoch ms → "YYYY-MM-DDTHH:MM:SSZ")."""
+    s = np.datetime_as_string(np.asarray(ms, dtype="datetime64[ms]").astype("datetime64[s]"), unit="s")
+    return np.char.add(s, "Z").tolist()
+
+def _result_arrays(t_ms: np.ndarray, eq, trade_cols) -> Dict:
+    """
+    Output dạng mảng cho metrics vector hoá (backtest.core.metrics.compute_metrics).
+    trade_cols: (entry_i, exit_i, pnl, return_pct) theo trade.
+    """
+    n = len(t_ms)
+    entry_i, exit_i, pnl, ret = trade_cols
+    eq = np.asarray(eq, dtype=np.float64)
+    return {
+        "t": t_ms[np.minimum(np.arange(len(eq)), n - 1)] if n else np.empty(0, dtype=np.int64),
+        "eq": eq,
+        "entry_i": np.asarray(entry_i, dtype=np.int64),
+        "exit_i": np.asarray(exit_i, dtype=np.int64),
+        "pnl": np.asarray(pnl, dtype=np.float64),
+        "return_pct": np.asarray(ret, dtype=np.float64),
+        "n_bars": n,
+    }
+
+
+def trade_columns(records: List[list]) -> Dict[str, np.ndarray]:
+    """Record trade của engine [side, size, entry_i, ..., reason] (side / reason là mã trong SIDES / REASONS) → cột NumPy."""
+    m = len(records)
+    return {name: np.fromiter((r[k] for r in records), dtype=dtype, count=m)
+            for k, (name, dtype) in enumerate(zip(TRADE_COLUMNS, _TRADE_DTYPES))}
+
+
+class BacktestResult:
+    """
+    t: int64 epoch ms theo bar (n); eq: float64 theo bar (n, thêm 1 điểm nếu đóng "End"
+    cuối kỳ — cùng mốc t của bar cuối); cols: các cột trade (xem trade_columns);
+    labels: nhãn thời gian output theo bar (vd. cột "t" gốc của df), None → ISO từ t.
+    """
+    __slots__ = ("final_equity", "t", "eq", "cols", "labels", "_iso_labels", "_trades", "_equity_curve")
+
+    _KEYS = ("final_equity", "trades", "equity_curve", "arrays")
+
+    def __init__(self, final_equity: float, t: np.ndarray, eq: np.ndarray,
+                 cols: Dict[str, np.ndarray], labels: Optional[Sequence] = None):
+        self.final_equity = float(final_equity)
+        self.t = np.asarray(t, dtype=np.int64)
+        self.eq = np.asarray(eq, dtype=np.float64)
+        self.cols = cols
+        self.labels = labels
+        self._iso_labels: Optional[List[str]] = None
+        self._trades: Optional[List[Dict[str, Any]]] = None
+        self._equity_curve: Optional[List[Dict[str, Any]]] = None
+
+    # pickle (cache / process pool): chỉ gửi các cột, dict đã dựng được bỏ lại
+    def __getstate__(self):
+        return (self.final_equity, self.t, self.eq, self.cols, self.labels)
+
+    def __setstate__(self, state):
+        self.final_equity, self.t, self.eq, self.cols, self.labels = state
+        self._iso_labels = self._trades = self._equity_curve = None
+
+    # ---- truy cập kiểu dict như output cũ của engine
+    def __getitem__(self, key: str):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self._KEYS else default
+
+    def __contains__(self, key) -> bool:
+        return key in self._KEYS
+
+    def keys(self):
+        return self._KEYS
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng dict như output cũ (không gồm arrays)."""
+        return {"final_equity": self.final_equity, "trades": self.trades, "equity_curve": self.equity_curve}
+
+    @property
+    def num_trades(self) -> int:
+        return len(self.cols["pnl"])
+
+    @property
+    def equity_t(self) -> np.ndarray:
+        """Mốc t (ms) của từng điểm equity."""
+        n = len(self.t)
+        if not n:
+            return np.empty(0, dtype=np.int64)
+        return self.t[np.minimum(np.arange(len(self.eq)), n - 1)]
+
+    def _labels(self) -> Sequence:
+        if self.labels is not None:
+            return self.labels
+        if self._iso_labels is None:
+            self._iso_labels = _iso_ms_array(self.t)
+        return self._iso_labels
+
+    # ---- dựng dict khi cần (một lần)
+    @property
+    def trades(self) -> List[Dict[str, Any]]:
+        if self._trades is None:
+            c = self.cols
+            labels = self._labels()
+            ei, xi = c["entry_i"], c["exit_i"]
+            rows = zip(
+                (SIDES[k] for k in c["side"].tolist()), c["size"].tolist(),
+                ei.tolist(), c["entry_price"].tolist(), xi.tolist(), c["exit_price"].tolist(),
+                c["pnl"].tolist(), c["return_pct"].tolist(),
+                _fmt_durations_ms(self.t[ei], self.t[xi]), (REASONS[k] for k in c["reason"].tolist()),
+            )
+            self._trades = [{
+                "id": k, "side": side, "size": size,
+                "entry_time": labels[e], "entry_price": ep,
+                "exit_time": labels[x], "exit_price": xp,
+                "pnl": pnl, "return_pct": ret,
+                "duration": dur,
+                "reason": reason,
+            } for k, (side, size, e, ep, x, xp, pnl, ret, dur, reason) in enumerate(rows, start=1)]
+        return self._trades
+
+    @property
+    def equity_curve(self) -> List[Dict[str, Any]]:
+        if self._equity_curve is None:
+            labels = self._labels()
+            last = len(self.t) - 1
+            self._equity_curve = [{"t": labels[min(i, last)], "eq": v} for i, v in enumerate(self.eq.tolist())]
+        return self._equity_curve
+
+    @property
+    def arrays(self) -> Dict[str, Any]:
+        c = self.cols
+        return _result_arrays(self.t, self.eq, (c["entry_i"], c["exit_i"], c["pnl"], c["return_pct"]))
+
+    # ---- buffer cột cho phân tích
+    def to_numpy(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """{"trades": cột trade, "equity": {"t", "eq"}}; thời gian là datetime64[ms] (UTC), side / reason là chuỗi."""
+        c = self.cols
+        t = self.t.astype("datetime64[ms]")
+        trades = {
+            "id": np.arange(1, self.num_trades + 1, dtype=np.int64),
+            "side": np.asarray(SIDES)[c["side"]],
+            "size": c["size"],
+            "entry_time": t[c["entry_i"]],
+            "entry_price": c["entry_price"],
+            "exit_time": t[c["exit_i"]],
+            "exit_price": c["exit_price"],
+            "pnl": c["pnl"],
+            "return_pct": c["return_pct"],
+            "duration_ms": self.t[c["exit_i"]] - self.t[c["entry_i"]],
+            "reason": np.asarray(REASONS)[c["reason"]],
+        }
+        return {"trades": trades, "equity": {"t": self.equity_t.astype("datetime64[ms]"), "eq": self.eq}}
+
+    def to_arrow(self) -> Dict[str, Any]:
+        """{"trades": pyarrow.Table, "equity": pyarrow.Table}; side / reason là cột dictionary."""
+        if pa is None:
+            raise ImportError("to_arrow() requires pyarrow")
+        c = self.cols
+        ts = pa.timestamp("ms", tz="UTC")
+        trades = pa.table({
+            "id": pa.array(np.arange(1, self.num_trades + 1, dtype=np.int64)),
+            "side": pa.DictionaryArray.from_arrays(c["side"], list(SIDES)),
+            "size": pa.array(c["size"]),
+            "entry_time": pa.array(self.t[c["entry_i"]], type=ts),
+            "entry_price": pa.array(c["entry_price"]),
+            "exit_time": pa.array(self.t[c["exit_i"]], type=ts),
+            "exit_price": pa.array(c["exit_price"]),
+            "pnl": pa.array(c["pnl"]),
+            "return_pct": pa.array(c["return_pct"]),
+            "duration_ms": pa.array(self.t[c["exit_i"]] - self.t[c["entry_i"]]),
+            "reason": pa.DictionaryArray.from_arrays(c["reason"], list(REASONS)),
+        })
+        equity = pa.table({"t": pa.array(self.equity_t, type=ts), "eq": pa.array(self.eq)})
+        return {"trades": trades, "equity": equity}
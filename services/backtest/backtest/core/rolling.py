@@ -0,0 +1,112 @@
+# backtest/core/rolling.py
+"""
+Chỉ số trượt theo cửa sổ (xem chiến lược suy yếu theo thời gian), O(N):
+
+  - sharpe / volatility: return theo bar, tổng & tổng bình phương trong cửa sổ
+    lấy từ hiệu hai cumsum (không tính lại từng cửa sổ); annualize theo số bar/năm.
+  - drawdown: equity so với đỉnh trong cửa sổ; đỉnh trượt tìm bằng deque đơn điệu
+    (mỗi index vào/ra deque đúng một lần).
+  - win_rate: theo trade (cửa sổ = số trade gần nhất), từ cumsum của cờ thắng.
+
+Các vị trí chưa đủ cửa sổ là NaN (→ None khi trả JSON).
+"""
+import math
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+from backtest.core.metrics import periods_per_year
+
+ROLLING_MAX_WINDOW = 1_000_000
+
+
+def _check_window(window: int) -> int:
+    window = int(window)
+    if not 2 <= window <= ROLLING_MAX_WINDOW:
+        raise ValueError(f"window must be in [2, {ROLLING_MAX_WINDOW}]")
+    return window
+
+
+def _window_sum(x: np.ndarray, window: int) -> np.ndarray:
+    """Tổng trượt của `window` phần tử cuối (NaN khi chưa đủ) qua hiệu cumsum."""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        cs = np.concatenate(([0.0], np.cumsum(x)))
+        out[window - 1:] = cs[window:] - cs[:-window]
+    return out
+
+
+def bar_returns(eq: np.ndarray) -> np.ndarray:
+    """Return theo bar; phần tử đầu = 0 (không có bar trước)."""
+    eq = np.asarray(eq, dtype=np.float64)
+    r = np.zeros(len(eq))
+    if len(eq) > 1:
+        prev = eq[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r[1:] = np.where(prev > 0, eq[1:] / prev - 1.0, 0.0)
+    return r
+
+
+def rolling_mean_std(r: np.ndarray, window: int):
+    """(mean, std ddof=1) trượt. Trừ mean toàn chuỗi trước khi cộng dồn để giảm sai số triệt tiêu."""
+    window = _check_window(window)
+    shift = float(r.mean()) if len(r) else 0.0
+    d = r - shift
+    s1 = _window_sum(d, window)
+    s2 = _window_sum(d * d, window)
+    mean = s1 / window
+    var = np.maximum(s2 - s1 * mean, 0.0) / (window - 1)
+    return mean + shift, np.sqrt(var)
+
+
+def rolling_sharpe(t: np.ndarray, eq: np.ndarray, window: int,
+                   ppy: Optional[float] = None) -> np.ndarray:
+    """Sharpe trượt (rf = 0), annualize theo số bar/năm suy ra từ t; NaN khi std = 0."""
+    mean, sd = rolling_mean_std(bar_returns(eq), window)
+    ann = math.sqrt(ppy or periods_per_year(t) or 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(sd > 0, mean / sd * ann, np.nan)
+
+
+def rolling_volatility_pct(t: np.ndarray, eq: np.ndarray, window: int,
+                           ppy: Optional[float] = None) -> np.ndarray:
+    _, sd = rolling_mean_std(bar_returns(eq), window)
+    return sd * math.sqrt(ppy or periods_per_year(t) or 1.0) * 100.0
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    """Max trượt của `window` phần tử cuối (cửa sổ ngắn hơn ở đầu chuỗi) bằng deque đơn điệu."""
+    window = _check_window(window)
+    vals = np.asarray(x, dtype=np.float64).tolist()
+    out = [0.0] * len(vals)
+    dq = deque()  # index, giá trị giảm dần từ đầu → cuối
+    for i, v in enumerate(vals):
+        while dq and vals[dq[-1]] <= v:
+            dq.pop()
+        dq.append(i)
+        if dq[0] <= i - window:
+            dq.popleft()
+        out[i] = vals[dq[0]]
+    return np.asarray(out, dtype=np.float64)
+
+
+def rolling_drawdown_pct(eq: np.ndarray, window: int) -> np.ndarray:
+    """% equity dưới đỉnh của `window` bar gần nhất (≤ 0)."""
+    eq = np.asarray(eq, dtype=np.float64)
+    peak = rolling_max(eq, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peak > 0, (eq / peak - 1.0) * 100.0, 0.0)
+    return np.minimum(dd, 0.0)
+
+
+def rolling_win_rate_pct(pnl: np.ndarray, window: int) -> np.ndarray:
+    """% trade thắng (pnl > 0) trong `window` trade gần nhất."""
+    window = _check_window(window)
+    wins = (np.asarray(pnl, dtype=np.float64) > 0).astype(np.float64)
+    return _window_sum(wins, window) / window * 100.0
+
+
+def to_json_list(x: np.ndarray, nd: int = 4) -> List[Optional[float]]:
+    """NaN/inf → None, còn lại làm tròn `nd` chữ số."""
+    return [round(v, nd) if math.isfinite(v) else None for v in np.asarray(x, dtype=np.float64).tolist()]
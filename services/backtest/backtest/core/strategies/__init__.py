@@ -0,0 +1,17 @@
+# backtest/core/strategies/__init__.py
+from backtest.core.strategies.ma_cross import prepare_ma_cross
+from backtest.core.strategies.rsi_threshold import prepare_rsi_threshold
+from backtest.core.strategies.macd import prepare_macd
+from backtest.core.strategies.custom import prepare_custom
+
+# (df, params) -> df có cột "signal"; indicator được cache qua backtest.core.indicator_cache
+STRATEGY_MAP = {
+    "MA_CROSS": lambda df, params: prepare_ma_cross(
+        df,
+        int(params.get("short_window", 20)),
+        int(params.get("long_window", 50)),
+    ),
+    "RSI_THRESHOLD": lambda df, params: prepare_rsi_threshold(df, **params),
+    "MACD": lambda df, params: prepare_macd(df, **params),
+    "CUSTOM": lambda df, params: prepare_custom(df, params),
+}
@@ -0,0 +1,15 @@
+# backtest/core/strategies/custom.py
+import pandas as pd
+from typing import Any, Dict
+from backtest.core.dsl import compile_strategy
+
+def prepare_custom(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Strategy CUSTOM: params là spec DSL {"long": ..., "short": ...} (xem backtest/core/dsl.py).
+    Các hàng warm-up (indicator chưa đủ dữ liệu) ở đầu bị cắt như các prepare_* khác.
+    """
+    plan = compile_strategy(params)
+    df = df.copy()
+    sig, warmup = plan.evaluate(df)
+    df["signal"] = sig
+    return df.iloc[warmup:].reset_index(drop=True)
@@ -1,11 +1,14 @@
 # backtest/core/strategies/ma_cross.py
 import pandas as pd
 from backtest.core.indicators import sma
+from backtest.core.indicator_cache import fingerprint, indicator_cache
 
 def prepare_ma_cross(df: pd.DataFrame, short_window: int, long_window: int) -> pd.DataFrame:
     df = df.copy()
-    df["sma_s"] = sma(df["close"], short_window)
-    df["sma_l"] = sma(df["close"], long_window)
+    cache, close = indicator_cache(), df["close"]
+    fp = fingerprint(close)
+    df["sma_s"] = cache.get(close, "sma", (short_window,), lambda: sma(close, short_window), fp=fp)
+    df["sma_l"] = cache.get(close, "sma", (long_window,), lambda: sma(close, long_window), fp=fp)
     prev = (df["sma_s"].shift(1) > df["sma_l"].shift(1))
     curr = (df["sma_s"] > df["sma_l"])
     df["signal"] = 0
@@ -1,21 +1,42 @@
 # strategies/macd.py
 import pandas as pd
-from backtest.core.indicators import macd, ema
+from backtest.core.indicators import ema
+from backtest.core.indicator_cache import fingerprint, indicator_cache
 
 def prepare_macd(df, fast=12, slow=26, signal=9, trend_len=200):
+    """trend_len=0/None → bỏ bộ lọc xu hướng EMA (không tính EMA trend)."""
+    assert fast > 0 and slow > 0 and signal > 0
+    assert fast < slow, "MACD expects fast < slow"
     df = df.copy()
     df["close"] = pd.to_numeric(df["close"], errors="coerce")
-    df["macd"], df["macd_signal"], df["macd_hist"] = macd(df["close"], fast, slow, signal)
-    df["ema_trend"] = ema(df["close"], trend_len)
+    cache, close = indicator_cache(), df["close"]
+    fp = fingerprint(close)
+
+    # EMA cache theo span → EMA nhanh/chậm dùng lại giữa các combo (fast, slow, signal) và với ema_trend
+    def _ema(span):
+        return cache.get(close, "ema", (span,), lambda: ema(close, span), fp=fp)
+
+    def _macd():
+        # như indicators.macd
+        line = _ema(fast) - _ema(slow)
+        sig_line = ema(line, signal)
+        return line, sig_line, line - sig_line
+
+    df["macd"], df["macd_signal"], df["macd_hist"] = cache.get(close, "macd", (fast, slow, signal), _macd, fp=fp)
 
     prev = (df["macd"].shift(1) > df["macd_signal"].shift(1))
     curr = (df["macd"] > df["macd_signal"])
     
     sig = pd.Series(0, index=df.index, dtype="int8")
-    # cross up chỉ khi giá > EMA200
-    sig[(~prev) & curr & (df["close"] > df["ema_trend"])] = 1
-    # cross down chỉ khi giá < EMA200
-    sig[prev & (~curr) & (df["close"] < df["ema_trend"])] = -1
+    if trend_len:
+        df["ema_trend"] = _ema(trend_len)
+        # cross up chỉ khi giá > EMA200
+        sig[(~prev) & curr & (df["close"] > df["ema_trend"])] = 1
+        # cross down chỉ khi giá < EMA200
+        sig[prev & (~curr) & (df["close"] < df["ema_trend"])] = -1
+    else:
+        sig[(~prev) & curr] = 1
+        sig[prev & (~curr)] = -1
 
     df["signal"] = sig
-    return df.dropna().reset_index(drop=True)
\ No newline at end of file
+    return df.dropna().reset_index(drop=True)
@@ -1,6 +1,7 @@
 # backtest/core/strategies/rsi_threshold.py
 import pandas as pd
 from backtest.core.indicators import rsi
+from backtest.core.indicator_cache import indicator_cache
 import numpy as np
 def prepare_rsi_threshold(
     df: pd.DataFrame,
@@ -13,13 +14,14 @@ def prepare_rsi_threshold(
       - Long when RSI crosses up through `lower` (default 30).
       - Short when RSI crosses down through `upper` (default 70).
     Exits are handled by your SL/TP or by opposite signal (via `position`).
+    The RSI series is shared through the indicator cache (same candles + period → computed once).
 
     Returns columns: ['rsi', 'signal', 'position'] + original df columns.
     """
     out = df.copy()
 
     # Tính RSI (yêu cầu bạn có hàm rsi(series, period) đã định nghĩa)
-    out["rsi"] = rsi(out["close"], period)
+    out["rsi"] = indicator_cache().get(out["close"], "rsi", (period,), lambda: rsi(out["close"], period))
 
     # Khởi tạo signal = 0
     sig = pd.Series(0, index=out.index, dtype="int8")
@@ -0,0 +1,275 @@
+# backtest/core/streaming.py
+"""
+Phiên bản streaming (cập nhật từng nến, O(1)/nến) của các indicator trong
+indicators.py: SMA, EMA, RSI (Wilder), MACD.
+
+Output giống bản batch tới từng bit: các phép tính lặp lại đúng thứ tự của
+pandas (window/aggregations.pyx):
+  - rolling mean: tổng Kahan, bù riêng cho phần cộng/phần trừ, đếm số âm để
+    kẹp về 0, và trả đúng giá trị khi cửa sổ toàn giá trị giống nhau;
+  - ewm(adjust=False): w = ((1-a)*w + a*x) / ((1-a) + a), bỏ qua khi w == x,
+    với a = 1 / (1 + com) (com tính như pandas từ span/alpha).
+
+Mọi class có update(x) → giá trị mới, update_many(xs) → np.ndarray (micro-batch),
+state_dict() → dict JSON được (checkpoint) và restore(state) dựng lại từ dict.
+"""
+import math
+from collections import deque
+from typing import Any, Dict, Iterable, Tuple
+
+import numpy as np
+
+NaN = float("nan")
+
+
+class _Streaming:
+    kind = ""
+
+    def update(self, x: float):
+        raise NotImplementedError
+
+    def update_many(self, xs: Iterable[float]) -> np.ndarray:
+        out = [self.update(x) for x in np.asarray(xs, dtype=np.float64).tolist()]
+        return np.asarray(out, dtype=np.float64)
+
+    def _params(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _state(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _load(self, state: Dict[str, Any]):
+        raise NotImplementedError
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "params": self._params(), "state": self._state()}
+
+
+class StreamingSMA(_Streaming):
+    """series.rolling(window).mean()"""
+    kind = "sma"
+
+    def __init__(self, window: int):
+        self.window = int(window)
+        self._buf: deque = deque()  # window giá trị gần nhất (để trừ ra khỏi tổng)
+        self._nobs = 0
+        self._neg_ct = 0
+        self._sum = 0.0
+        self._comp_add = 0.0
+        self._comp_remove = 0.0
+        self._same = 0              # số giá trị liên tiếp bằng _prev
+        self._prev = NaN
+
+    def _add(self, val: float):
+        if val == val:
+            self._nobs += 1
+            y = val - self._comp_add
+            t = self._sum + y
+            self._comp_add = t - self._sum - y
+            self._sum = t
+            if math.copysign(1.0, val) < 0:
+                self._neg_ct += 1
+            if val == self._prev:
+                self._same += 1
+            else:
+                self._same = 1
+            self._prev = val
+
+    def _remove(self, val: float):
+        if val == val:
+            self._nobs -= 1
+            y = -val - self._comp_remove
+            t = self._sum + y
+            self._comp_remove = t - self._sum - y
+            self._sum = t
+            if math.copysign(1.0, val) < 0:
+                self._neg_ct -= 1
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        if len(self._buf) == self.window:
+            self._remove(self._buf.popleft())
+        self._buf.append(x)
+        self._add(x)
+
+        # calc_mean của pandas
+        nobs = self._nobs
+        if nobs >= self.window and nobs > 0:
+            result = self._sum / nobs
+            if self._same >= nobs:
+                result = self._prev       # cửa sổ toàn giá trị giống nhau: trả đúng giá trị đó
+            elif self._neg_ct == 0 and result < 0:
+                result = 0.0              # toàn số dương
+            elif self._neg_ct == nobs and result > 0:
+                result = 0.0              # toàn số âm
+            return result
+        return NaN
+
+    def _params(self):
+        return {"window": self.window}
+
+    def _state(self):
+        return {"buf": list(self._buf), "nobs": self._nobs, "neg_ct": self._neg_ct, "sum": self._sum,
+                "comp_add": self._comp_add, "comp_remove": self._comp_remove,
+                "same": self._same, "prev": self._prev}
+
+    def _load(self, st):
+        self._buf = deque(float(v) for v in st["buf"])
+        self._nobs, self._neg_ct, self._same = int(st["nobs"]), int(st["neg_ct"]), int(st["same"])
+        self._sum, self._comp_add, self._comp_remove = float(st["sum"]), float(st["comp_add"]), float(st["comp_remove"])
+        self._prev = float(st["prev"])
+
+
+def _com_from(span=None, alpha=None) -> float:
+    # như pandas.core.window.ewm.get_center_of_mass
+    if span is not None:
+        return float((span - 1) / 2)
+    return float((1 - alpha) / alpha)
+
+
+class StreamingEWM(_Streaming):
+    """series.ewm(span=.. | alpha=.., adjust=False, min_periods=..).mean()"""
+    kind = "ewm"
+
+    def __init__(self, span=None, alpha=None, min_periods: int = 0):
+        if (span is None) == (alpha is None):
+            raise ValueError("pass exactly one of span, alpha")
+        self.span, self.alpha = span, alpha
+        self.min_periods = max(int(min_periods), 1)
+        self._a = 1.0 / (1.0 + _com_from(span, alpha))
+        self._weighted = NaN
+        self._old_wt = 1.0
+        self._nobs = 0
+        self._started = False
+
+    def update(self, x: float) -> float:
+        cur = float(x)
+        is_obs = cur == cur
+        self._nobs += is_obs
+        if not self._started:
+            self._started = True
+            self._weighted = cur
+        elif self._weighted == self._weighted:
+            # ignore_na=False: nến NaN vẫn làm giảm trọng số của giá trị cũ
+            self._old_wt *= 1.0 - self._a
+            if is_obs:
+                if self._weighted != cur:
+                    self._weighted = self._old_wt * self._weighted + self._a * cur
+                    self._weighted /= (self._old_wt + self._a)
+                self._old_wt = 1.0
+        elif is_obs:
+            self._weighted = cur
+        return self._weighted if self._nobs >= self.min_periods else NaN
+
+    def _params(self):
+        return {"span": self.span, "alpha": self.alpha, "min_periods": self.min_periods}
+
+    def _state(self):
+        return {"weighted": self._weighted, "old_wt": self._old_wt, "nobs": self._nobs, "started": self._started}
+
+    def _load(self, st):
+        self._weighted, self._old_wt = float(st["weighted"]), float(st["old_wt"])
+        self._nobs, self._started = int(st["nobs"]), bool(st["started"])
+
+
+class StreamingEMA(StreamingEWM):
+    """indicators.ema: series.ewm(span=span, adjust=False).mean()"""
+    kind = "ema"
+
+    def __init__(self, span: int):
+        super().__init__(span=span)
+
+    def _params(self):
+        return {"span": self.span}
+
+
+class StreamingRSI(_Streaming):
+    """indicators.rsi (Wilder: ewm alpha=1/period, min_periods=period)."""
+    kind = "rsi"
+
+    def __init__(self, period: int = 14):
+        self.period = int(period)
+        self._gain = StreamingEWM(alpha=1 / self.period, min_periods=self.period)
+        self._loss = StreamingEWM(alpha=1 / self.period, min_periods=self.period)
+        self._last = NaN
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        delta = x - self._last  # nến đầu: NaN như series.diff()
+        self._last = x
+        if delta == delta:
+            gain = delta if delta >= 0.0 else 0.0
+            loss = -(delta if delta <= 0.0 else 0.0)  # -0.0 khi delta > 0, như -clip(upper=0)
+        else:
+            gain = loss = NaN
+        g = self._gain.update(gain)
+        l = self._loss.update(loss)
+
+        if g == 0 and l == 0:
+            return 50.0
+        if g == 0:
+            return 0.0
+        if l == 0:
+            return 100.0
+        if g != g or l != l:
+            return NaN
+        rs = g / l
+        return 100 - (100 / (1 + rs))
+
+    def _params(self):
+        return {"period": self.period}
+
+    def _state(self):
+        return {"last": self._last, "gain": self._gain._state(), "loss": self._loss._state()}
+
+    def _load(self, st):
+        self._last = float(st["last"])
+        self._gain._load(st["gain"])
+        self._loss._load(st["loss"])
+
+
+class StreamingMACD(_Streaming):
+    """indicators.macd → update trả (macd_line, signal_line, hist)."""
+    kind = "macd"
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal_period: int = 9):
+        assert fast > 0 and slow > 0 and signal_period > 0
+        assert fast < slow, "MACD expects fast < slow"
+        self.fast, self.slow, self.signal_period = fast, slow, signal_period
+        self._fast = StreamingEMA(fast)
+        self._slow = StreamingEMA(slow)
+        self._signal = StreamingEMA(signal_period)
+
+    def update(self, x: float) -> Tuple[float, float, float]:
+        line = self._fast.update(x) - self._slow.update(x)
+        sig = self._signal.update(line)
+        return line, sig, line - sig
+
+    def update_many(self, xs: Iterable[float]) -> np.ndarray:
+        """(n, 3): cột macd_line, signal_line, hist."""
+        out = [self.update(x) for x in np.asarray(xs, dtype=np.float64).tolist()]
+        return np.asarray(out, dtype=np.float64).reshape(-1, 3)
+
+    def _params(self):
+        return {"fast": self.fast, "slow": self.slow, "signal_period": self.signal_period}
+
+    def _state(self):
+        return {"fast": self._fast._state(), "slow": self._slow._state(), "signal": self._signal._state()}
+
+    def _load(self, st):
+        self._fast._load(st["fast"])
+        self._slow._load(st["slow"])
+        self._signal._load(st["signal"])
+
+
+_KINDS = {cls.kind: cls for cls in (StreamingSMA, StreamingEWM, StreamingEMA, StreamingRSI, StreamingMACD)}
+
+
+def restore(state: Dict[str, Any]) -> _Streaming:
+    """Dựng lại indicator từ state_dict() (vd. sau khi đọc checkpoint JSON)."""
+    cls = _KINDS.get(state.get("kind"))
+    if cls is None:
+        raise ValueError(f"unknown streaming indicator: {state.get('kind')}")
+    ind = cls(**state["params"])
+    ind._load(state["state"])
+    return ind
@@ -0,0 +1,202 @@
+# backtest/core/sweep.py
+import itertools
+import math
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest.core.engine import backtest_engine_arrays, frame_to_arrays
+from backtest.core.metrics import max_drawdown_pct_arr, profit_factor_arr, win_rate_pct_arr
+from backtest.core.strategies import STRATEGY_MAP
+
+SWEEP_MAX_COMBOS = int(os.getenv("SWEEP_MAX_COMBOS", "2000"))
+# trần số process cho sweep / walk-forward (0 = os.cpu_count()); không lấy từ request
+SWEEP_MAX_WORKERS = int(os.getenv("SWEEP_MAX_WORKERS", "0"))
+
+# Mảng OHLC dùng chung trong mỗi process worker (set 1 lần qua initializer).
+# Chỉ dùng trong process con của pool — process web (đa luồng) luôn truyền bars tường minh.
+_BARS: Optional[Dict[str, np.ndarray]] = None
+
+
+def expand_grid(grid: Dict[str, Any], base_params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """{"a": [1, 2], "b": 3} → [{"a": 1, "b": 3}, {"a": 2, "b": 3}] (gộp thêm base_params)."""
+    keys = list(grid.keys())
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in grid.values()]
+    base = dict(base_params or {})
+    return [{**base, **dict(zip(keys, combo))} for combo in itertools.product(*values)]
+
+
+def _invalid_reason(strategy_type: str, params: Dict[str, Any]) -> Optional[str]:
+    if strategy_type == "MA_CROSS":
+        if int(params.get("short_window", 20)) >= int(params.get("long_window", 50)):
+            return "short_window >= long_window"
+    if strategy_type == "MACD":
+        if int(params.get("fast", 12)) >= int(params.get("slow", 26)):
+            return "fast >= slow"
+    return None
+
+
+def _init_worker(bars: Dict[str, np.ndarray]):
+    global _BARS
+    _BARS = bars
+
+
+def combo_summary(res: Dict[str, Any], close: np.ndarray, initial: float) -> Dict[str, Any]:
+    """Summary rút gọn (các cột của bảng xếp hạng) từ output của backtest_engine_arrays."""
+    final_eq = res["final_equity"]
+    arr = res["arrays"]
+    bh = None
+    if len(close) and close[0] > 0:
+        bh = round((float(close[-1]) / float(close[0]) - 1.0) * 100.0, 2)
+    return {
+        "final_equity": final_eq,
+        "total_return_pct": round((final_eq / initial - 1.0) * 100.0, 2),
+        "buy_and_hold_return_pct": bh,
+        "max_drawdown_pct": max_drawdown_pct_arr(arr["eq"]),
+        "profit_factor": profit_factor_arr(arr["pnl"]),
+        "num_trades": len(arr["pnl"]),
+        "win_rate_pct": win_rate_pct_arr(arr["pnl"]),
+    }
+
+
+# cột của combo_summary dùng được làm rank_by
+RANK_KEYS = ("final_equity", "total_return_pct", "buy_and_hold_return_pct", "max_drawdown_pct",
+             "profit_factor", "num_trades", "win_rate_pct")
+
+
+def check_rank_by(rank_by: str) -> str:
+    if rank_by not in RANK_KEYS:
+        raise ValueError(f"rank_by must be one of {', '.join(RANK_KEYS)}, got {rank_by!r}")
+    return rank_by
+
+
+def _check_top(top) -> Optional[int]:
+    if top is None:
+        return None
+    if isinstance(top, bool) or not isinstance(top, int) or top < 1:
+        raise ValueError(f"top must be a positive integer, got {top!r}")
+    return top
+
+
+def max_workers(requested: Optional[int], n_tasks: int) -> int:
+    """Số process thực dùng: ≤ SWEEP_MAX_WORKERS (hoặc số CPU), ≤ số task, ≥ 1."""
+    cap = SWEEP_MAX_WORKERS or os.cpu_count() or 1
+    workers = cap if requested is None else min(int(requested), cap)
+    return max(1, min(workers, n_tasks))
+
+
+def _run_combo(bars: Dict[str, np.ndarray], offset: int, sig: np.ndarray,
+               engine_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    b = bars
+    res = backtest_engine_arrays(
+        b["t"][offset:], b["open"][offset:], b["high"][offset:], b["low"][offset:], b["close"][offset:], sig,
+        **engine_kwargs,
+    )
+    return combo_summary(res, b["close"][offset:], float(engine_kwargs["initial_capital"]))
+
+
+def _run_combo_pooled(offset: int, sig: np.ndarray, engine_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return _run_combo(_BARS, offset, sig, engine_kwargs)
+
+
+def _rank_key(value, descending: bool):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return math.inf  # None/NaN luôn xếp cuối
+    return -value if descending else value
+
+
+def prepare_signals(df: pd.DataFrame, strategy_type: str,
+                    combos: List[Dict[str, Any]]) -> Tuple[List[tuple], List[Dict[str, Any]]]:
+    """
+    Chuẩn bị signal cho từng combo (indicator qua indicator_cache dùng chung).
+    Trả (tasks, skipped): tasks = [(params, offset, signal int8 của df[offset:])],
+    skipped = [{"params", "reason"}] cho combo không hợp lệ.
+    """
+    n = len(df)
+    t_all = df["t"].to_numpy()
+    prepare = STRATEGY_MAP[strategy_type]
+
+    tasks, skipped = [], []
+    for params in combos:
+        reason = _invalid_reason(strategy_type, params)
+        if reason is None:
+            try:
+                prepared = prepare(df, params)
+            except (AssertionError, TypeError, ValueError) as e:
+                reason = str(e) or type(e).__name__
+        if reason is not None:
+            skipped.append({"params": params, "reason": reason})
+            continue
+        # prepare_* chỉ cắt các hàng warm-up ở đầu → combo = bars[offset:] + signal
+        offset = n - len(prepared)
+        if len(prepared) and not np.array_equal(prepared["t"].to_numpy(), t_all[offset:]):
+            skipped.append({"params": params, "reason": "non_contiguous_rows"})
+            continue
+        tasks.append((params, offset, prepared["signal"].to_numpy(dtype=np.int8)))
+    return tasks, skipped
+
+
+def sweep(df: pd.DataFrame,
+          strategy_type: str,
+          grid: Dict[str, Any],
+          engine_kwargs: Dict[str, Any],
+          base_params: Optional[Dict[str, Any]] = None,
+          rank_by: str = "total_return_pct",
+          descending: bool = True,
+          top: Optional[int] = None,
+          workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Grid-search tham số của một strategy trên cùng một df nến.
+
+    - Tín hiệu của mọi combo được chuẩn bị ở process cha qua indicator cache
+      dùng chung (mỗi SMA/EMA/RSI chỉ tính 1 lần cho mỗi bộ tham số, và được
+      dùng lại ở các sweep/run sau trên cùng dữ liệu).
+    - Engine (backtest_engine_arrays) chạy song song trên ProcessPoolExecutor;
+      OHLC được gửi cho worker 1 lần, mỗi task chỉ mang mảng signal int8.
+    - Trả bảng summary đã xếp hạng theo `rank_by`.
+
+    engine_kwargs: initial_capital, position_pct, fee_pct, slippage_pct,
+                   allow_short, stop_loss_pct, take_profit_pct.
+    workers: bị chặn bởi max_workers (SWEEP_MAX_WORKERS / số CPU).
+    """
+    if strategy_type not in STRATEGY_MAP:
+        raise ValueError(f"strategy not supported: {strategy_type}")
+    check_rank_by(rank_by)
+    top = _check_top(top)
+    combos = expand_grid(grid, base_params)
+    if len(combos) > SWEEP_MAX_COMBOS:
+        raise ValueError(f"too many combinations: {len(combos)} > {SWEEP_MAX_COMBOS}")
+
+    bars = frame_to_arrays(df)
+    tasks, skipped = prepare_signals(df, strategy_type, combos)
+
+    workers = max_workers(workers, len(tasks))
+
+    if workers == 1:
+        summaries = [_run_combo(bars, off, sig, engine_kwargs) for _, off, sig in tasks]
+    else:
+        ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(bars,)) as ex:
+            futs = [ex.submit(_run_combo_pooled, off, sig, engine_kwargs) for _, off, sig in tasks]
+            summaries = [f.result() for f in futs]
+
+    rows = [{"params": params, **summ} for (params, _, _), summ in zip(tasks, summaries)]
+    rows.sort(key=lambda r: _rank_key(r.get(rank_by), descending))
+    for i, r in enumerate(rows, start=1):
+        r["rank"] = i
+    if top is not None:
+        rows = rows[:top]
+
+    return {
+        "strategy": strategy_type,
+        "rank_by": rank_by,
+        "num_combinations": len(combos),
+        "num_evaluated": len(tasks),
+        "results": rows,
+        "skipped": skipped,
+    }
@@ -0,0 +1,195 @@
+# backtest/core/walkforward.py
+"""
+Walk-forward optimization: chia dữ liệu thành các cửa sổ train/test trượt,
+tối ưu tham số trên train (grid như sweep), chạy bộ tốt nhất trên test kế
+tiếp rồi nối equity out-of-sample của các test lại.
+
+- Signal của mọi combo được chuẩn bị MỘT lần trên toàn bộ df (indicator qua
+  indicator_cache) rồi cắt theo cửa sổ: indicator đều nhân quả nên giá trị ở
+  bar k không phụ thuộc dữ liệu sau k, và cửa sổ sau có sẵn lịch sử warm-up.
+- Các cửa sổ train độc lập → chạy song song trên ProcessPoolExecutor; OHLC và
+  ma trận signal (combo × bar, int8) được gửi cho worker một lần.
+- Test chạy tuần tự ở process cha với vốn nối tiếp (vốn đầu test k = equity
+  cuối test k-1); vị thế còn mở được đóng ở cuối mỗi test ("End").
+"""
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest.core.engine import backtest_engine_arrays, frame_to_arrays
+from backtest.core.result import _iso_ms
+from backtest.core.metrics import max_drawdown_pct, profit_factor, win_rate_pct
+from backtest.core.strategies import STRATEGY_MAP
+from backtest.core.sweep import (SWEEP_MAX_COMBOS, _rank_key, check_rank_by, combo_summary, expand_grid,
+                                  max_workers, prepare_signals)
+
+WALKFORWARD_MAX_WINDOWS = int(os.getenv("WALKFORWARD_MAX_WINDOWS", "100"))
+WALKFORWARD_MAX_SIGNAL_MB = float(os.getenv("WALKFORWARD_MAX_SIGNAL_MB", "512"))
+
+# Dữ liệu dùng chung trong mỗi process worker (set 1 lần qua initializer).
+# Chỉ dùng trong process con của pool — đường chạy tuần tự truyền bars / sigs tường minh.
+_BARS: Optional[Dict[str, np.ndarray]] = None
+_SIGS: Optional[np.ndarray] = None
+
+
+def split_windows(n: int, train_bars: int, test_bars: int, step_bars: Optional[int] = None,
+                  anchored: bool = False) -> List[Tuple[int, int, int]]:
+    """
+    [(train_start, test_start, test_end)] theo index bar: train = [train_start, test_start),
+    test = [test_start, test_end). step_bars mặc định = test_bars (các test nối liền,
+    không chồng nhau). anchored=True: train luôn bắt đầu từ 0 (cửa sổ mở rộng).
+    """
+    train_bars, test_bars = int(train_bars), int(test_bars)
+    step = int(step_bars) if step_bars else test_bars
+    if train_bars < 2 or test_bars < 1 or step < 1:
+        raise ValueError("train_bars must be >= 2, test_bars and step_bars >= 1")
+    out = []
+    start = 0
+    while start + train_bars < n:
+        mid = start + train_bars
+        out.append((0 if anchored else start, mid, min(mid + test_bars, n)))
+        start += step
+    if not out:
+        raise ValueError(f"not enough bars ({n}) for train_bars={train_bars} + test_bars={test_bars}")
+    return out
+
+
+def _init_worker(bars: Dict[str, np.ndarray], sigs: np.ndarray):
+    global _BARS, _SIGS
+    _BARS, _SIGS = bars, sigs
+
+
+def _optimize_window(bars: Dict[str, np.ndarray], sigs: np.ndarray, a: int, b: int,
+                     engine_kwargs: Dict[str, Any], rank_by: str,
+                     descending: bool) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+    """Chạy mọi combo trên train [a, b); trả (index combo tốt nhất, summary của nó)."""
+    sl = slice(a, b)
+    t, o, h, l, c = (bars[k][sl] for k in ("t", "open", "high", "low", "close"))
+    initial = float(engine_kwargs["initial_capital"])
+    best_k, best, best_key = None, None, None
+    for k in range(sigs.shape[0]):
+        res = backtest_engine_arrays(t, o, h, l, c, sigs[k, sl], **engine_kwargs)  # chỉ đọc arrays → không dựng dict
+        summ = combo_summary(res, c, initial)
+        key = _rank_key(summ.get(rank_by), descending)
+        if best_key is None or key < best_key:
+            best_k, best, best_key = k, summ, key
+    return best_k, best
+
+
+def _optimize_window_pooled(a: int, b: int, engine_kwargs: Dict[str, Any], rank_by: str,
+                            descending: bool) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+    return _optimize_window(_BARS, _SIGS, a, b, engine_kwargs, rank_by, descending)
+
+
+def walk_forward(df: pd.DataFrame,
+                 strategy_type: str,
+                 grid: Dict[str, Any],
+                 engine_kwargs: Dict[str, Any],
+                 train_bars: int,
+                 test_bars: int,
+                 step_bars: Optional[int] = None,
+                 anchored: bool = False,
+                 base_params: Optional[Dict[str, Any]] = None,
+                 rank_by: str = "total_return_pct",
+                 descending: bool = True,
+                 workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    engine_kwargs / workers như sweep. Trả các cửa sổ (tham số chọn được, kết quả train/test),
+    oos_summary và trades / equity_curve out-of-sample đã nối.
+    """
+    if strategy_type not in STRATEGY_MAP:
+        raise ValueError(f"strategy not supported: {strategy_type}")
+    check_rank_by(rank_by)
+    combos = expand_grid(grid, base_params)
+    if len(combos) > SWEEP_MAX_COMBOS:
+        raise ValueError(f"too many combinations: {len(combos)} > {SWEEP_MAX_COMBOS}")
+    n = len(df)
+    windows = split_windows(n, train_bars, test_bars, step_bars, anchored)
+    if len(windows) > WALKFORWARD_MAX_WINDOWS:
+        raise ValueError(f"too many windows: {len(windows)} > {WALKFORWARD_MAX_WINDOWS}")
+    if len(combos) * n > WALKFORWARD_MAX_SIGNAL_MB * 1024 * 1024:
+        raise ValueError("combinations x bars too large; narrow the grid or the date range")
+
+    bars = frame_to_arrays(df)
+    tasks, skipped = prepare_signals(df, strategy_type, combos)
+    if not tasks:
+        raise ValueError("no valid parameter combination")
+    # signal toàn chuỗi của từng combo; các hàng warm-up (trước offset) = 0 → không vào lệnh
+    sigs = np.zeros((len(tasks), n), dtype=np.int8)
+    for k, (_, offset, sig) in enumerate(tasks):
+        sigs[k, offset:] = sig
+
+    workers = max_workers(workers, len(windows))
+    if workers == 1:
+        picked = [_optimize_window(bars, sigs, a, b, engine_kwargs, rank_by, descending) for a, b, _ in windows]
+    else:
+        ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(bars, sigs)) as ex:
+            futs = [ex.submit(_optimize_window_pooled, a, b, engine_kwargs, rank_by, descending) for a, b, _ in windows]
+            picked = [f.result() for f in futs]
+
+    # ---- out-of-sample: vốn nối tiếp qua các test
+    t_all = bars["t"]
+    capital = float(engine_kwargs["initial_capital"])
+    oos_trades: List[Dict[str, Any]] = []
+    oos_equity: List[Dict[str, Any]] = []
+    out_windows = []
+    for (a, b, e), (k, train_summ) in zip(windows, picked):
+        sl = slice(b, e)
+        res = backtest_engine_arrays(
+            t_all[sl], bars["open"][sl], bars["high"][sl], bars["low"][sl], bars["close"][sl], sigs[k, sl],
+            **{**engine_kwargs, "initial_capital": capital},
+        )
+        test_summ = combo_summary(res, bars["close"][sl], capital)
+        for tr in res["trades"]:
+            oos_trades.append({**tr, "id": len(oos_trades) + 1})
+        oos_equity.extend(res["equity_curve"])
+        out_windows.append({
+            "train": {"start": _iso_ms(int(t_all[a])), "end": _iso_ms(int(t_all[b - 1])), "bars": b - a},
+            "test": {"start": _iso_ms(int(t_all[b])), "end": _iso_ms(int(t_all[e - 1])), "bars": e - b},
+            "best_params": tasks[k][0],
+            "train_result": train_summ,
+            "test_result": test_summ,
+        })
+        capital = res["final_equity"]
+
+    initial = float(engine_kwargs["initial_capital"])
+    first, last = windows[0][1], windows[-1][2] - 1
+    close = bars["close"]
+    bh = None
+    if close[first] > 0:
+        bh = round((float(close[last]) / float(close[first]) - 1.0) * 100.0, 2)
+    oos_summary = {
+        "strategy": strategy_type,
+        "start": _iso_ms(int(t_all[first])),
+        "end": _iso_ms(int(t_all[last])),
+        "initial_capital": initial,
+        "final_equity": capital,
+        "total_return_pct": round((capital / initial - 1.0) * 100.0, 2),
+        "buy_and_hold_return_pct": bh,
+        "max_drawdown_pct": max_drawdown_pct(oos_equity),
+        "profit_factor": profit_factor(oos_trades),
+        "num_trades": len(oos_trades),
+        "win_rate_pct": win_rate_pct(oos_trades),
+    }
+    # Walk-forward efficiency: lợi nhuận test trung bình / lợi nhuận train trung bình (theo %/bar)
+    train_rate = np.mean([w["train_result"]["total_return_pct"] / w["train"]["bars"] for w in out_windows])
+    test_rate = np.mean([w["test_result"]["total_return_pct"] / w["test"]["bars"] for w in out_windows])
+    oos_summary["walk_forward_efficiency"] = round(float(test_rate / train_rate), 4) if train_rate > 0 else None
+
+    return {
+        "strategy": strategy_type,
+        "rank_by": rank_by,
+        "num_combinations": len(combos),
+        "num_evaluated": len(tasks),
+        "skipped": skipped,
+        "windows": out_windows,
+        "summary": oos_summary,
+        "trades": oos_trades,
+        "equity_curve": oos_equity,
+    }
@@ -1,10 +1,8 @@
-import requests, pandas as pd
-from typing import Optional
+import numpy as np, pandas as pd
+from typing import Dict, Optional
+from marketdata.klines import load_klines
 
-def _interval_ms(interval: str) -> int:
-    unit = interval[-1].lower(); val = int(interval[:-1])
-    mult = {"m":60_000, "h":3_600_000, "d":86_400_000}[unit]
-    return val * mult
+# Nến đọc qua kho chung với service predict (services/marketdata, KLINE_STORE_DIR).
 
 def _to_ms(ts: Optional[str]) -> Optional[int]:
     if not ts: return None
@@ -12,64 +10,21 @@ def _to_ms(ts: Optional[str]) -> Optional[int]:
     if pd.isna(dt): return None
     return int(dt.value // 1_000_000)
 
-def _fetch_batch(symbol: str, interval: str, start_ms=None, end_ms=None, limit=1000) -> pd.DataFrame:
-    url = "https://api.binance.com/api/v3/klines"
-    params = {"symbol": symbol.upper(), "interval": interval, "limit": limit}
-    if start_ms is not None: params["startTime"] = start_ms
-    if end_ms   is not None: params["endTime"]   = end_ms
-    r = requests.get(url, params=params, timeout=20); r.raise_for_status()
-    data = r.json()
-    if not data:
-        return pd.DataFrame(columns=["t","open","high","low","close","volume"])
-    df = pd.DataFrame(data, columns=[
-        "open_time","open","high","low","close","volume",
-        "close_time","q_vol","n_trades","tb_base","tb_quote","ignore"
-    ])
-    df["t"] = pd.to_datetime(df["open_time"], unit="ms", utc=True).dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-    df = df[["t","open","high","low","close","volume"]].astype({"open":"float64","high":"float64","low":"float64","close":"float64","volume":"float64"})
-    return df
+def _columns_to_frame(cols: Dict[str, np.ndarray]) -> pd.DataFrame:
+    t = np.asarray(cols["t"], dtype=np.int64).astype("datetime64[ms]").astype("datetime64[s]")
+    out = pd.DataFrame({c: np.asarray(cols[c]) for c in ("open", "high", "low", "close", "volume")})
+    out.insert(0, "t", np.char.add(np.datetime_as_string(t, unit="s"), "Z") if len(t) else np.array([], dtype=str))
+    out["t"] = out["t"].astype(object)
+    return out
 
 def fetch_klines_all(symbol: str, interval: str, start: Optional[str]=None, end: Optional[str]=None) -> pd.DataFrame:
-    start_ms = _to_ms(start)
-    end_ms   = _to_ms(end)
-    step = _interval_ms(interval) * 1000  # “khoảng thời gian” bao phủ ~1000 nến
-    frames = []
-    cur = start_ms
-
-    while True:
-        batch_end = None
-        if cur is not None and end_ms is not None:
-            batch_end = min(cur + step - 1, end_ms)
-        elif cur is not None:
-            batch_end = cur + step - 1
-
-        df = _fetch_batch(symbol, interval, start_ms=cur, end_ms=batch_end, limit=1000)
-        if df.empty:
-            break
-        frames.append(df)
-
-        # tiến con trỏ: + 1 “nến” theo interval
-        last_open = pd.to_datetime(df.iloc[-1]["t"], utc=True)
-        cur = int(last_open.value // 1_000_000) + _interval_ms(interval)
+    """
+    Nến [start, end] (t ISO "...Z", OHLCV float64).
+    Có store (KLINE_STORE_ENABLED=1, mặc định): đọc từ kho trên đĩa, chỉ tải
+    phần còn thiếu; nến đang chạy (chưa đóng) lấy trực tiếp và không lưu.
+    """
+    return _columns_to_frame(load_klines(symbol, interval, _to_ms(start), _to_ms(end)))
 
-        # dừng khi đủ end
-        if end_ms is not None and cur > end_ms:
-            break
-
-        # chặn vòng lặp bất thường
-        if len(frames) > 1000:
-            break
-
-    if not frames:
-        return pd.DataFrame(columns=["t","open","high","low","close","volume"])
-
-    out = pd.concat(frames, ignore_index=True)
-    out["t"] = pd.to_datetime(out["t"], utc=True, errors="coerce")
-    if start_ms: out = out[out["t"] >= pd.to_datetime(start_ms, unit="ms", utc=True)]
-    if end_ms:   out = out[out["t"] <= pd.to_datetime(end_ms,   unit="ms", utc=True)]
-    out = out.dropna().drop_duplicates(subset=["t"]).sort_values("t").reset_index(drop=True)
-    out["t"] = out["t"].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-    return out
     # -----------------------------
     # Test nhanh với main()
     # -----------------------------
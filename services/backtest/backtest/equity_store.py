@@ -0,0 +1,112 @@
+# backtest/equity_store.py
+"""
+Lưu equity curve theo block thay vì 1 document/điểm.
+
+Mỗi document trong backtest_equity_blocks chứa tối đa EQUITY_BLOCK_SIZE điểm:
+    {run_id, user_id, seq, t0, t1, n, t: <bytes>, eq: <bytes>}
+- t: int64 epoch ms, delta-encoded rồi nén zlib (bước thời gian đều → nén rất tốt)
+- eq: float64 nén zlib
+- t0/t1: thời gian điểm đầu/cuối của block → đọc theo khoảng chỉ giải nén các
+  block giao với [from, to].
+Run cũ (trước khi có block) vẫn đọc được từ backtest_equity.
+"""
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import Binary
+
+from backtest.core.result import _iso_ms_array, _to_ms_array
+
+EQUITY_BLOCKS = "backtest_equity_blocks"
+EQUITY_LEGACY = "backtest_equity"
+EQUITY_BLOCK_SIZE = 4096
+
+
+def init_equity_store(db):
+    db[EQUITY_BLOCKS].create_index([("run_id", 1), ("user_id", 1), ("seq", 1)])
+    db[EQUITY_BLOCKS].create_index([("run_id", 1), ("user_id", 1), ("t1", 1), ("t0", 1)])
+
+
+def _pack_t(t: np.ndarray) -> bytes:
+    return zlib.compress(np.diff(t, prepend=np.int64(0)).astype("<i8").tobytes(), 6)
+
+
+def _unpack_t(raw: bytes) -> np.ndarray:
+    return np.cumsum(np.frombuffer(zlib.decompress(raw), dtype="<i8"))
+
+
+def _pack_eq(eq: np.ndarray) -> bytes:
+    return zlib.compress(eq.astype("<f8").tobytes(), 6)
+
+
+def _unpack_eq(raw: bytes) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(raw), dtype="<f8")
+
+
+def equity_to_arrays(equity: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """[{"t": ISO, "eq": float}, ...] → (t int64 ms, eq float64)."""
+    if not equity:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    t = _to_ms_array([p["t"] for p in equity])
+    eq = np.fromiter((p["eq"] for p in equity), dtype=np.float64, count=len(equity))
+    return t, eq
+
+
+def write_equity(db, run_id: str, user_id: str, t: np.ndarray, eq: np.ndarray,
+                 block_size: int = EQUITY_BLOCK_SIZE) -> int:
+    """Ghi (t ms, eq) thành các block; trả số block."""
+    t = np.asarray(t, dtype=np.int64)
+    eq = np.asarray(eq, dtype=np.float64)
+    docs = []
+    for seq, i in enumerate(range(0, len(t), block_size)):
+        tb, eb = t[i:i + block_size], eq[i:i + block_size]
+        docs.append({
+            "run_id": run_id, "user_id": user_id, "seq": seq,
+            "t0": int(tb[0]), "t1": int(tb[-1]), "n": int(len(tb)),
+            "t": Binary(_pack_t(tb)), "eq": Binary(_pack_eq(eb)),
+        })
+    if docs:
+        db[EQUITY_BLOCKS].insert_many(docs)
+    return len(docs)
+
+
+def read_equity(db, run_id: str, user_id: Optional[str] = None,
+                from_ms: Optional[int] = None, to_ms: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(t ms, eq) trong [from_ms, to_ms]; chỉ giải nén các block giao với khoảng này."""
+    q = {"run_id": run_id}
+    if user_id is not None:
+        q["user_id"] = user_id
+    if from_ms is not None:
+        q["t1"] = {"$gte": int(from_ms)}
+    if to_ms is not None:
+        q["t0"] = {"$lte": int(to_ms)}
+    blocks = list(db[EQUITY_BLOCKS].find(q, {"t": 1, "eq": 1, "seq": 1}).sort("seq", 1))
+
+    if blocks:
+        t = np.concatenate([_unpack_t(b["t"]) for b in blocks])
+        eq = np.concatenate([_unpack_eq(b["eq"]) for b in blocks])
+    elif db[EQUITY_BLOCKS].find_one({"run_id": run_id}, {"_id": 1}) is not None:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    else:
+        # run lưu theo định dạng cũ: 1 document/điểm
+        lq = {k: v for k, v in q.items() if k in ("run_id", "user_id")}
+        pts = list(db[EQUITY_LEGACY].find(lq, {"_id": 0, "t": 1, "eq": 1}).sort("t", 1))
+        t, eq = equity_to_arrays(pts)
+
+    mask = np.ones(len(t), dtype=bool)
+    if from_ms is not None:
+        mask &= t >= from_ms
+    if to_ms is not None:
+        mask &= t <= to_ms
+    return t[mask], eq[mask]
+
+
+def equity_points(t: np.ndarray, eq: np.ndarray) -> List[Dict]:
+    """(t ms, eq) → [{"t": "YYYY-MM-DDTHH:MM:SSZ", "eq": float}, ...] như API cũ."""
+    return [{"t": ts, "eq": v} for ts, v in zip(_iso_ms_array(t), eq.tolist())]
+
+
+def delete_equity(db, run_id: str):
+    db[EQUITY_BLOCKS].delete_many({"run_id": run_id})
+    db[EQUITY_LEGACY].delete_many({"run_id": run_id})
@@ -0,0 +1,190 @@
+# backtest/jobs.py
+"""
+Hàng đợi job backtest trên Mongo (collection backtest_jobs).
+
+POST /run?mode=async chỉ enqueue rồi trả run_id; worker (thread trong app hoặc
+process riêng `python -m backtest.worker`) claim job bằng find_one_and_update
+nên nhiều replica có thể cùng lấy việc từ một hàng đợi. Tiến độ (phase,
+bars_done/bars_total, trades) được ghi lại cho GET /<run_id>/status.
+Job "running" mất heartbeat quá JOB_STALE_SECONDS sẽ được trả về hàng đợi.
+Mọi ghi trạng thái của worker đều lọc theo `worker` đã claim, nên worker cũ
+(bị coi là chết rồi sống lại) không ghi đè được lần chạy của worker mới.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+from backtest.db import get_db
+from backtest.equity_store import delete_equity
+from backtest.runner import execute_run, new_run_id
+
+JOBS = "backtest_jobs"
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+PROGRESS_MIN_INTERVAL = 1.0  # giây, giới hạn số lần ghi tiến độ
+HEARTBEAT_SECONDS = 30.0
+
+
+def init_jobs(db):
+    db[JOBS].create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    db[JOBS].create_index([("run_id", ASCENDING), ("user_id", ASCENDING)])
+
+
+def enqueue(p: Dict[str, Any], user_id: str) -> str:
+    run_id = new_run_id()
+    now = datetime.utcnow()
+    get_db()[JOBS].insert_one({
+        "run_id": run_id,
+        "user_id": user_id,
+        "status": "queued",
+        "params": p,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+        "progress": {"phase": "queued", "bars_done": 0, "bars_total": None, "trades": 0},
+    })
+    return run_id
+
+
+def get_status(run_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    return get_db()[JOBS].find_one(
+        {"run_id": run_id, "user_id": user_id},
+        {"_id": 0, "params": 0, "worker": 0},
+    )
+
+
+def claim(worker_id: str) -> Optional[Dict[str, Any]]:
+    now = datetime.utcnow()
+    return get_db()[JOBS].find_one_and_update(
+        {"status": "queued"},
+        {"$set": {"status": "running", "worker": worker_id, "started_at": now,
+                  "heartbeat": now, "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def requeue_stale() -> int:
+    """Job running mà worker đã chết (mất heartbeat) → queued, hoặc failed nếu quá số lần thử."""
+    db = get_db()
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    stale = {"status": "running", "heartbeat": {"$lt": cutoff}}
+    db[JOBS].update_many({**stale, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+                         {"$set": {"status": "failed", "error": "worker_lost", "updated_at": datetime.utcnow()}})
+    res = db[JOBS].update_many(stale, {"$set": {"status": "queued", "updated_at": datetime.utcnow()}})
+    return res.modified_count
+
+
+def _owned(run_id: str, worker_id: str) -> Dict[str, Any]:
+    """Filter job đang chạy bởi đúng worker đã claim."""
+    return {"run_id": run_id, "status": "running", "worker": worker_id}
+
+
+class JobLost(Exception):
+    """Job không còn thuộc worker này (đã bị requeue và worker khác claim)."""
+
+
+class _ProgressReporter:
+    def __init__(self, run_id: str, worker_id: str):
+        self.filter = _owned(run_id, worker_id)
+        self.state: Dict[str, Any] = {}
+        self.last_write = 0.0
+
+    def __call__(self, **fields):
+        phase_changed = "phase" in fields and fields["phase"] != self.state.get("phase")
+        self.state.update(fields)
+        now = time.monotonic()
+        if not phase_changed and now - self.last_write < PROGRESS_MIN_INTERVAL:
+            return
+        self.last_write = now
+        ts = datetime.utcnow()
+        res = get_db()[JOBS].update_one(
+            self.filter,
+            {"$set": {**{f"progress.{k}": v for k, v in self.state.items()},
+                      "heartbeat": ts, "updated_at": ts}},
+        )
+        if phase_changed and res.matched_count == 0:
+            # dừng trước khi sang phase kế (đặc biệt là "saving")
+            raise JobLost(self.filter["run_id"])
+
+
+def _heartbeat(run_id: str, worker_id: str, stop: threading.Event):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        get_db()[JOBS].update_one(_owned(run_id, worker_id),
+                                  {"$set": {"heartbeat": datetime.utcnow()}})
+
+
+def run_job(job: Dict[str, Any]):
+    run_id, worker_id = job["run_id"], job["worker"]
+    owned = _owned(run_id, worker_id)
+    db = get_db()
+    report = _ProgressReporter(run_id, worker_id)
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(run_id, worker_id, stop), daemon=True).start()
+    try:
+        if job.get("attempts", 1) > 1:
+            # lần chạy trước bị gián đoạn: xoá dữ liệu lưu dở của run này
+            for coll in ("backtest_runs", "backtest_trades"):
+                db[coll].delete_many({"run_id": run_id})
+            delete_equity(db, run_id)
+        out = execute_run(job["params"], job["user_id"], run_id=run_id, report=report)
+        db[JOBS].update_one(owned, {"$set": {
+            "status": "done",
+            "progress": {**report.state, "phase": "done"},
+            "summary": out["summary"],
+            "finished_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }})
+    except JobLost:
+        pass  # worker khác đang giữ job, không ghi gì thêm
+    except Exception as e:
+        traceback.print_exc()
+        db[JOBS].update_one(owned, {"$set": {
+            "status": "failed",
+            "error": f"{type(e).__name__}: {e}",
+            "finished_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }})
+    finally:
+        stop.set()
+
+
+class JobWorker(threading.Thread):
+    def __init__(self, name: str):
+        super().__init__(name=name, daemon=True)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{name}"
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        last_sweep = 0.0
+        while not self._stop_event.is_set():
+            try:
+                if time.monotonic() - last_sweep > JOB_STALE_SECONDS / 2:
+                    requeue_stale()
+                    last_sweep = time.monotonic()
+                job = claim(self.worker_id)
+            except Exception:
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self._stop_event.wait(JOB_POLL_SECONDS)
+                continue
+            run_job(job)
+
+
+def start_workers(n: int) -> List[JobWorker]:
+    workers = [JobWorker(f"job-worker-{i}") for i in range(n)]
+    for w in workers:
+        w.start()
+    return workers
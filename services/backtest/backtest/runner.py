@@ -0,0 +1,233 @@
+# backtest/runner.py
+"""
+Chạy một backtest từ body JSON của /api/backtest/run: tải nến, chuẩn bị signal,
+chạy engine, tính summary và lưu Mongo. Dùng chung cho route đồng bộ và job worker.
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+
+from backtest.schemas import RunRequest, CapitalCfg, BacktestCfg, StrategyCfg
+from backtest.data.loader_csv import fetch_klines_all
+from backtest.core.strategies import STRATEGY_MAP
+from backtest.core.dsl import compile_strategy
+from backtest.core.downsample import lttb
+from backtest.core.engine import ENGINE_MODES, EQUITY_MAX_POINTS, backtest_engine, clean_backtest_result
+from backtest.core.metrics import arrays_from_result, buy_hold_return_pct, compute_metrics
+from backtest.db import get_db
+from backtest.cache import canonical_key, result_cache
+from backtest.equity_store import write_equity, read_equity, equity_points
+
+
+class StrategyNotSupported(ValueError):
+    pass
+
+
+class InvalidRunRequest(ValueError):
+    """Body /run thiếu trường, sai kiểu hoặc giá trị không hợp lệ."""
+
+
+def check_strategy(strategy_type: str, params: Optional[Dict[str, Any]]):
+    """Kiểm tra strategy trước khi tải nến / enqueue: StrategyNotSupported hoặc DSLError (CUSTOM)."""
+    if strategy_type not in STRATEGY_MAP:
+        raise StrategyNotSupported(strategy_type)
+    if strategy_type == "CUSTOM":
+        compile_strategy(params or {})
+
+
+def _number(v, name: str, positive: bool = False, allow_none: bool = False):
+    if v is None and allow_none:
+        return
+    if isinstance(v, bool) or not isinstance(v, (int, float)) or not (v > 0 if positive else v >= 0):
+        raise InvalidRunRequest(f"{name} must be a number {'> 0' if positive else '>= 0'}, got {v!r}")
+
+
+def _check_run_request(r: RunRequest):
+    for name in ("symbol", "timeframe"):
+        if not isinstance(getattr(r, name), str) or not getattr(r, name):
+            raise InvalidRunRequest(f"{name} must be a non-empty string")
+    for name in ("start_date", "end_date"):
+        v = getattr(r, name)
+        if not isinstance(v, str) or pd.isna(pd.to_datetime(v, utc=True, errors="coerce")):
+            raise InvalidRunRequest(f"{name} must be an ISO date, got {v!r}")
+    _number(r.capital.initial, "capital.initial", positive=True)
+    _number(r.capital.position_pct, "capital.position_pct", positive=True)
+    _number(r.capital.fee_pct, "capital.fee_pct")
+    _number(r.backtest.slippage_pct, "backtest.slippage_pct")
+    _number(r.backtest.stop_loss_pct, "backtest.stop_loss_pct", allow_none=True)
+    _number(r.backtest.take_profit_pct, "backtest.take_profit_pct", allow_none=True)
+    if r.backtest.engine not in ENGINE_MODES:
+        raise InvalidRunRequest(f"backtest.engine must be one of {', '.join(ENGINE_MODES)}, got {r.backtest.engine!r}")
+
+
+def parse_run_request(p: Dict[str, Any]) -> RunRequest:
+    """Body /run → RunRequest; InvalidRunRequest nếu thiếu trường / sai kiểu (chưa tải nến gì)."""
+    if not isinstance(p, dict):
+        raise InvalidRunRequest("request body must be a JSON object")
+    try:
+        r = RunRequest(
+            symbol=p["symbol"],
+            timeframe=p["timeframe"],
+            start_date=p["start_date"],
+            end_date=p["end_date"],
+            market_data=p.get("market_data", {"source":"csv"}),
+            capital=CapitalCfg(**p["capital"]),
+            backtest=BacktestCfg(**p["backtest"]),
+            strategy=StrategyCfg(**p["strategy"])
+        )
+    except KeyError as e:
+        raise InvalidRunRequest(f"missing field: {e.args[0]}") from None
+    except TypeError as e:  # trường lạ / thiếu trong capital, backtest, strategy hoặc không phải object
+        raise InvalidRunRequest(str(e)) from None
+    _check_run_request(r)
+    return r
+
+
+def engine_kwargs(capital: CapitalCfg, bt: BacktestCfg) -> Dict[str, Any]:
+    return dict(
+        initial_capital=capital.initial,
+        position_pct=capital.position_pct,
+        fee_pct=capital.fee_pct,
+        slippage_pct=bt.slippage_pct,
+        allow_short=bt.allow_short,
+        stop_loss_pct=bt.stop_loss_pct or 9999.0,
+        take_profit_pct=bt.take_profit_pct or 9999.0,
+    )
+
+
+def new_run_id() -> str:
+    return f"bt_{ObjectId()}"  # string tiện cho FE
+
+
+def _compute(runreq: RunRequest, report: Callable[..., None]) -> Dict[str, Any]:
+    """Tải nến → signal → engine → summary. Trả {"summary", "trades", "equity": (t ms, eq)}."""
+    report(phase="fetching")
+    #df = load_csv(runreq.symbol, runreq.timeframe, runreq.start_date, runreq.end_date)
+    df = fetch_klines_all(runreq.symbol, runreq.timeframe, runreq.start_date, runreq.end_date)
+
+    # ---- data with signals
+    report(phase="preparing")
+    df = STRATEGY_MAP[runreq.strategy.type](df, runreq.strategy.params)
+
+    report(phase="running", bars_total=len(df), bars_done=0, trades=0)
+    result = backtest_engine(
+        df=df,
+        **engine_kwargs(runreq.capital, runreq.backtest),
+        mode=runreq.backtest.engine,
+        progress=lambda bars, n_trades: report(bars_done=bars, trades=n_trades),
+    )
+    trades = result["trades"]
+    final_eq = result["final_equity"]
+
+    # chỉ số tính trên mảng của engine (không duyệt lại list dict); equity giữ dạng mảng,
+    # không dựng list dict theo bar (chỉ payload đã downsample mới cần)
+    arrays = arrays_from_result(result)
+    metrics = compute_metrics(**arrays, initial_capital=runreq.capital.initial)
+    summary = {
+        "strategy": runreq.strategy.type,
+        "symbol": runreq.symbol,
+        "timeframe": runreq.timeframe,
+        "start": df.iloc[0]["t"] if not df.empty else runreq.start_date,
+        "end": df.iloc[-1]["t"] if not df.empty else runreq.end_date,
+        "initial_capital": runreq.capital.initial,
+        "final_equity": final_eq,
+        "total_return_pct": round((final_eq / runreq.capital.initial - 1.0) * 100.0, 2),
+        "buy_and_hold_return_pct": buy_hold_return_pct(df),
+        "max_drawdown_pct": metrics.pop("max_drawdown_pct"),
+        "profit_factor": metrics.pop("profit_factor"),
+        "num_trades": len([t for t in trades if "exit_time" in t]),
+        "win_rate_pct": metrics.pop("win_rate_pct"),
+        **metrics,
+    }
+    return {"summary": summary, "trades": trades, "equity": (arrays["t"], arrays["eq"])}
+
+
+def _load_stored(db, run_id: str) -> Dict[str, Any]:
+    proj = {"_id": 0, "run_id": 0, "user_id": 0}
+    run = db["backtest_runs"].find_one({"run_id": run_id}, {"summary": 1})
+    return {
+        "summary": run["summary"],
+        "trades": list(db["backtest_trades"].find({"run_id": run_id}, proj).sort("id", 1)),
+        "equity": read_equity(db, run_id),
+    }
+
+
+def _payload(run_id: str, res: Dict[str, Any]) -> Dict[str, Any]:
+    # downsample trên mảng trước (cùng LTTB như clean_backtest_result) → chỉ dựng ≤ EQUITY_MAX_POINTS dict
+    t, eq = res["equity"]
+    if len(eq) > EQUITY_MAX_POINTS:
+        idx = lttb(np.arange(len(eq), dtype=np.float64), eq, EQUITY_MAX_POINTS)
+        t, eq = t[idx], eq[idx]
+    # clean_backtest_result sửa summary tại chỗ → copy để không đụng vào bản trong cache
+    return clean_backtest_result({
+        "run_id": run_id,
+        "summary": dict(res["summary"]),
+        "trades": res["trades"],
+        "equity_curve": equity_points(t, eq),
+    })
+
+
+def execute_run(p: Dict[str, Any],
+                user_id: str,
+                run_id: Optional[str] = None,
+                report: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    """
+    Chạy và lưu một backtest; trả payload JSON (đã clean) như /run.
+    report(**fields): callback tiến độ — phase, bars_total, bars_done, trades.
+
+    Khoảng ngày đã qua hoàn toàn → kết quả lấy từ result cache nếu có; nếu user
+    đã có run cùng tham số (params_hash) thì trả lại run đó, không lưu thêm bản trùng.
+    """
+    report = report or (lambda **_: None)
+    runreq = parse_run_request(p)
+
+    # ---- prepare signals
+    check_strategy(runreq.strategy.type, runreq.strategy.params)
+
+    db = get_db()
+    cache = result_cache()
+    key = canonical_key(runreq)
+    res = cache.get(key)
+
+    if key and run_id is None:
+        prev = db["backtest_runs"].find_one({"user_id": user_id, "params_hash": key}, {"run_id": 1})
+        if prev:
+            if res is None:
+                res = _load_stored(db, prev["run_id"])
+                cache.set(key, res)
+            return _payload(prev["run_id"], res)
+
+    if res is None:
+        res = _compute(runreq, report)
+        cache.set(key, res)
+    else:
+        report(phase="cached")
+    summary, trades, (t_eq, eq) = res["summary"], res["trades"], res["equity"]
+
+    # ---------- LƯU VÀO MONGO ----------
+    report(phase="saving")
+    run_id = run_id or new_run_id()
+    run_oid = ObjectId(run_id[3:])
+    db["backtest_runs"].insert_one({
+        "user_id": user_id,
+        "_id": run_oid,
+        "run_id": run_id,
+        "created_at": datetime.utcnow(),
+        "params": p,         # lưu nguyên params FE gửi lên
+        "params_hash": key,  # None nếu không cache được (khoảng ngày chưa qua)
+        "summary": summary,  # lưu summary đã tính
+    })
+
+    if trades:
+        db["backtest_trades"].insert_many(
+            [{ "run_id": run_id, "user_id": user_id, **t } for t in trades]
+        )
+
+    if len(eq):
+        write_equity(db, run_id, user_id, t_eq, eq)
+
+    # ---------- TRẢ VỀ JSON ----------
+    return _payload(run_id, res)
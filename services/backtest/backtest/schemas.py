@@ -5,7 +5,7 @@ from dataclasses import dataclass
 # ---- Input ----
 @dataclass
 class StrategyCfg:
-    type: Literal["MA_CROSS", "RSI_THRESHOLD", "MACD"]
+    type: Literal["MA_CROSS", "RSI_THRESHOLD", "MACD", "CUSTOM"]  # CUSTOM: params là spec DSL (core/dsl.py)
     params: Dict[str, Any]
 
 @dataclass
@@ -22,6 +22,7 @@ class BacktestCfg:
     slippage_pct: float = 0.0
     stop_loss_pct: Optional[float] = None
     take_profit_pct: Optional[float] = None
+    engine: Literal["pandas", "numpy"] = "numpy"  # numpy = engine chạy trên mảng
 
 @dataclass
 class RunRequest:
@@ -64,3 +65,21 @@ class Summary:
     profit_factor: float
     num_trades: int
     win_rate_pct: float
+    # chỉ số mở rộng (core/metrics.compute_metrics); None khi không tính được
+    sharpe_ratio: Optional[float] = None
+    sortino_ratio: Optional[float] = None
+    volatility_pct: Optional[float] = None
+    cagr_pct: Optional[float] = None
+    calmar_ratio: Optional[float] = None
+    exposure_pct: float = 0.0
+    longest_drawdown_bars: int = 0
+    longest_drawdown_duration: str = "0:00"
+    avg_trade_pnl: Optional[float] = None
+    avg_trade_return_pct: Optional[float] = None
+    avg_win_pnl: Optional[float] = None
+    avg_loss_pnl: Optional[float] = None
+    largest_win_pnl: Optional[float] = None
+    largest_loss_pnl: Optional[float] = None
+    avg_bars_in_trade: Optional[float] = None
+    max_consecutive_wins: int = 0
+    max_consecutive_losses: int = 0
@@ -0,0 +1,38 @@
+# backtest/worker.py
+"""
+Process worker riêng cho hàng đợi job backtest:
+
+    python -m backtest.worker --threads 2
+"""
+import argparse
+import signal
+import threading
+
+from backtest.db import get_db
+from backtest.jobs import init_jobs, start_workers
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=1)
+    args = ap.parse_args()
+
+    init_jobs(get_db())
+    workers = start_workers(args.threads)
+    done = threading.Event()
+
+    def _shutdown(*_):
+        for w in workers:
+            w.stop()
+        done.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    print(f"backtest worker started ({args.threads} thread(s))")
+    done.wait()
+    for w in workers:
+        w.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark metrics: bản cũ (vòng lặp Python trên list dict) vs bản vector (mảng của engine).
+
+    PYTHONPATH=. python scripts/bench_metrics.py
+    PYTHONPATH=. python scripts/bench_metrics.py --sizes 1000000 5000000 --legacy-max 1000000
+
+Equity / trades được sinh ngẫu nhiên (không chạy engine) để đo riêng phần metrics;
+với mỗi size kiểm tra max_drawdown / profit_factor / win_rate hai bản bằng nhau rồi
+đo compute_metrics (toàn bộ chỉ số) và period_returns (daily, monthly).
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from backtest.core.result import _iso_ms
+from backtest.core.metrics import (compute_metrics, max_drawdown_pct_arr, period_returns,
+                                   profit_factor_arr, win_rate_pct_arr)
+
+
+def synth(n: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    t = np.int64(1_420_070_400_000) + np.arange(n, dtype=np.int64) * 60_000
+    eq = 10_000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.001, n)))
+    m = max(1, n // 40)
+    entry_i = np.sort(rng.choice(n - 1, m, replace=False))
+    exit_i = np.minimum(entry_i + rng.integers(1, 40, m), n - 1)
+    pnl = np.round(rng.normal(0.5, 20.0, m), 4)
+    return {"t": t, "eq": eq, "entry_i": entry_i, "exit_i": exit_i, "pnl": pnl,
+            "return_pct": np.round(pnl / 50.0, 4), "n_bars": n}
+
+
+# ---- bản tham chiếu: logic cũ của metrics.py (duyệt từng phần tử)
+def legacy_max_drawdown_pct(equity):
+    peak, mdd = -math.inf, 0.0
+    for p in equity:
+        v = float(p["eq"])
+        peak = max(peak, v)
+        if peak > 0:
+            mdd = min(mdd, (v / peak - 1.0) * 100.0)
+    return round(mdd, 2)
+
+
+def legacy_profit_factor(trades):
+    win = sum(float(t["pnl"]) for t in trades if float(t["pnl"]) >= 0)
+    loss = sum(float(t["pnl"]) for t in trades if float(t["pnl"]) < 0)
+    if abs(loss) < 1e-12:
+        return None if win > 0 else 0.0
+    return round(win / abs(loss), 2)
+
+
+def legacy_win_rate_pct(trades):
+    if not trades:
+        return None
+    return round(sum(1 for t in trades if float(t["pnl"]) > 0) / len(trades) * 100.0, 2)
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    ap.add_argument("--legacy-max", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    print(f"{'bars':>10} {'trades':>8} {'legacy (s)':>11} {'vector (s)':>11} {'speedup':>8} "
+          f"{'all (s)':>8} {'daily (s)':>10} {'monthly (s)':>12}")
+    for n in args.sizes:
+        a = synth(n)
+        _, dt_vec = _timed(lambda: (max_drawdown_pct_arr(a["eq"]), profit_factor_arr(a["pnl"]),
+                                    win_rate_pct_arr(a["pnl"])))
+        if n <= args.legacy_max:
+            # list dict như output engine cũ (không tính thời gian dựng)
+            equity = [{"t": _iso_ms(int(x)), "eq": float(v)} for x, v in zip(a["t"], a["eq"])]
+            trades = [{"pnl": float(p)} for p in a["pnl"]]
+            ref, dt_old = _timed(lambda: (legacy_max_drawdown_pct(equity), legacy_profit_factor(trades),
+                                          legacy_win_rate_pct(trades)))
+            vec = (max_drawdown_pct_arr(a["eq"]), profit_factor_arr(a["pnl"]), win_rate_pct_arr(a["pnl"]))
+            assert ref == vec, f"metrics diverged: {ref} != {vec}"
+            old_col, speedup = f"{dt_old:11.3f}", f"{dt_old / dt_vec:7.1f}x"
+        else:
+            old_col, speedup = f"{'skipped':>11}", f"{'-':>8}"
+        _, dt_all = _timed(lambda: compute_metrics(**a, initial_capital=10_000.0))
+        _, dt_d = _timed(lambda: period_returns(a["t"], a["eq"], 10_000.0, "daily"))
+        _, dt_m = _timed(lambda: period_returns(a["t"], a["eq"], 10_000.0, "monthly"))
+        print(f"{n:>10} {len(a['pnl']):>8} {old_col} {dt_vec:11.3f} {speedup} "
+              f"{dt_all:8.3f} {dt_d:10.3f} {dt_m:12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Server giả lập GET /api/v3/klines của Binance để thử fetcher mà không ra mạng.
+
+    PYTHONPATH=.:../marketdata python scripts/fake_binance.py --port 8765 --fail-rate 0.1
+    BINANCE_BASE_URL=http://127.0.0.1:8765 PYTHONPATH=.:../marketdata python scripts/fake_binance.py --check
+
+Nến sinh tất định từ open time (cùng startTime/endTime → cùng dữ liệu).
+--fail-rate: tỉ lệ request trả 429 (kèm Retry-After) hoặc 500 ngẫu nhiên.
+--check: chạy server trong thread, tải 1m trong 30 ngày bằng KlineFetcher và
+so với dữ liệu kỳ vọng.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from marketdata.fetcher import KlineFetcher, interval_ms
+
+
+def make_kline(open_ms: int, step_ms: int) -> list:
+    base = 100.0 + (open_ms // step_ms) % 97
+    return [open_ms, f"{base:.2f}", f"{base + 1:.2f}", f"{base - 1:.2f}", f"{base + 0.5:.2f}", "10.0",
+            open_ms + step_ms - 1, "1000.0", 10, "5.0", "500.0", "0"]
+
+
+def make_handler(fail_rate: float = 0.0, latency: float = 0.0):
+    stats = {"requests": 0, "failed": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code: int, body, headers=None):
+            raw = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            u = urlparse(self.path)
+            if u.path != "/api/v3/klines":
+                return self._send(404, {"code": -1, "msg": "not found"})
+            with lock:
+                stats["requests"] += 1
+                used = stats["requests"] * 2
+            if latency:
+                time.sleep(latency)
+            if random.random() < fail_rate:
+                with lock:
+                    stats["failed"] += 1
+                if random.random() < 0.5:
+                    return self._send(429, {"code": -1003, "msg": "too many requests"}, {"Retry-After": "0.05"})
+                return self._send(500, {"code": -1000, "msg": "internal error"})
+
+            q = {k: v[0] for k, v in parse_qs(u.query).items()}
+            step = interval_ms(q.get("interval", "1m"))
+            limit = min(int(q.get("limit", 500)), 1000)
+            now = int(time.time() * 1000)
+            end = int(q.get("endTime", now))
+            if "startTime" in q:
+                first = -(-int(q["startTime"]) // step) * step
+            else:
+                first = (min(end, now) // step - limit + 1) * step
+            rows = []
+            t = first
+            while t <= min(end, now) and len(rows) < limit:
+                rows.append(make_kline(t, step))
+                t += step
+            self._send(200, rows, {"X-MBX-USED-WEIGHT-1M": str(used % 6000)})
+
+    Handler.stats = stats
+    return Handler
+
+
+def serve(port: int = 8765, fail_rate: float = 0.0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """Khởi động server trong thread nền và trả về server (gọi .shutdown() để dừng)."""
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fail_rate, latency))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def _check(port: int, fail_rate: float, latency: float):
+    srv = serve(port, fail_rate, latency)
+    step = interval_ms("1m")
+    end = (int(time.time() * 1000) // step) * step - step
+    start = end - 30 * 86_400_000
+    for workers in (1, 8):
+        f = KlineFetcher(base_url=f"http://127.0.0.1:{port}", max_workers=workers, backoff=0.01)
+        t0 = time.perf_counter()
+        rows = f.fetch("BTCUSDT", "1m", start, end)
+        dt = time.perf_counter() - t0
+        expected = [make_kline(t, step) for t in range(start, end + 1, step)]
+        assert rows == expected, "fetched klines differ from expected"
+        print(f"workers={workers}: {len(rows)} klines in {dt:.2f}s (ok)")
+    print("server stats:", srv.RequestHandlerClass.stats)
+    srv.shutdown()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--latency", type=float, default=0.02, help="giây trễ giả lập mỗi request")
+    ap.add_argument("--check", action="store_true")
+    args = ap.parse_args()
+    if args.check:
+        _check(args.port, args.fail_rate, args.latency)
+    else:
+        srv = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.fail_rate, args.latency))
+        print(f"fake binance on http://127.0.0.1:{args.port}")
+        srv.serve_forever()
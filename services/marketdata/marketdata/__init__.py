@@ -0,0 +1,5 @@
+# marketdata
+"""
+Dữ liệu nến dùng chung cho backtest và predict: fetcher Binance (fetcher.py),
+kho cột trên đĩa (store.py) và lớp đọc read-through (klines.py).
+"""
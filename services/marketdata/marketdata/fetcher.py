@@ -0,0 +1,177 @@
+# marketdata/fetcher.py
+"""
+Tải klines Binance song song theo cửa sổ thời gian.
+
+Cửa sổ [a, a + limit*interval - 1] được tính trước từ interval nên các request
+không phải chờ open time cuối của batch trước. Dùng chung một requests.Session
+(connection pool), giới hạn số request đồng thời, giới hạn weight/phút
+(token bucket + header X-MBX-USED-WEIGHT-1M) và retry có backoff cho
+429/418/5xx/lỗi mạng. Kết quả được ghép theo thứ tự, bỏ trùng theo open time.
+
+BINANCE_BASE_URL cho phép trỏ sang server giả lập (backtest/scripts/fake_binance.py).
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL", "https://api.binance.com")
+KLINE_FETCH_CONCURRENCY = int(os.getenv("KLINE_FETCH_CONCURRENCY", "8"))
+BINANCE_WEIGHT_PER_MINUTE = int(os.getenv("BINANCE_WEIGHT_PER_MINUTE", "2400"))
+KLINES_REQUEST_WEIGHT = 2  # /api/v3/klines
+
+
+def interval_ms(interval: str) -> int:
+    # "1M" của Binance là 1 tháng (độ dài thay đổi), không phải 1 phút → không quy ra ms được
+    if interval.endswith("M"):
+        raise ValueError(f"interval not supported: {interval}")
+    unit = interval[-1].lower(); val = int(interval[:-1])
+    mult = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}[unit]
+    return val * mult
+
+
+def kline_windows(start_ms: int, end_ms: int, step_ms: int, limit: int = 1000) -> List[Tuple[int, int]]:
+    """Chia [start_ms, end_ms] thành các cửa sổ chứa tối đa `limit` nến."""
+    span = step_ms * limit
+    return [(a, min(a + span - 1, end_ms)) for a in range(start_ms, end_ms + 1, span)]
+
+
+class WeightLimiter:
+    """Token bucket theo weight/phút, dùng chung giữa các thread."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, weight: int = 1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = max(0.0, self.paused_until - now)
+                if wait == 0.0:
+                    if self.tokens >= weight:
+                        self.tokens -= weight
+                        return
+                    wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe_used(self, used_weight: int):
+        """Đồng bộ theo weight server báo; gần chạm trần thì đợi sang phút kế."""
+        if used_weight >= 0.9 * self.capacity:
+            self.pause(60.0 - (time.time() % 60.0))
+
+
+class KlineFetcher:
+    def __init__(self,
+                 base_url: Optional[str] = None,
+                 max_workers: Optional[int] = None,
+                 weight_per_minute: Optional[int] = None,
+                 retries: int = 5,
+                 backoff: float = 0.5,
+                 timeout: float = 20.0,
+                 limit: int = 1000):
+        self.base_url = (base_url or BINANCE_BASE_URL).rstrip("/")
+        self.max_workers = max(1, int(max_workers or KLINE_FETCH_CONCURRENCY))
+        self.limiter = WeightLimiter(weight_per_minute or BINANCE_WEIGHT_PER_MINUTE)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limit = limit
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _get(self, params: dict) -> list:
+        url = f"{self.base_url}/api/v3/klines"
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire(KLINES_REQUEST_WEIGHT)
+            try:
+                r = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+                continue
+
+            used = r.headers.get("X-MBX-USED-WEIGHT-1M")
+            if used and used.isdigit():
+                self.limiter.observe_used(int(used))
+            if r.status_code in (418, 429) or r.status_code >= 500:
+                if attempt == self.retries:
+                    r.raise_for_status()
+                retry_after = r.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after else self.backoff * 2 ** attempt * (1 + random.random())
+                if r.status_code in (418, 429):
+                    self.limiter.pause(delay)
+                time.sleep(delay)
+                continue
+            r.raise_for_status()
+            return r.json()
+        return []
+
+    def fetch_window(self, symbol: str, interval: str, start_ms: Optional[int], end_ms: Optional[int]) -> list:
+        params = {"symbol": symbol.upper(), "interval": interval, "limit": self.limit}
+        if start_ms is not None: params["startTime"] = start_ms
+        if end_ms is not None: params["endTime"] = end_ms
+        return self._get(params)
+
+    def fetch(self, symbol: str, interval: str,
+              start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> list:
+        """
+        Trả list kline thô của Binance ([open_time, open, high, low, close, volume, ...]),
+        sắp theo open time, không trùng, nằm trong [start_ms, end_ms].
+        start_ms=None → chỉ `limit` nến mới nhất (một request).
+        """
+        if start_ms is None:
+            rows = self.fetch_window(symbol, interval, None, end_ms)
+        else:
+            if end_ms is None:
+                end_ms = int(time.time() * 1000)
+            windows = kline_windows(start_ms, end_ms, interval_ms(interval), self.limit)
+            if len(windows) == 1 or self.max_workers == 1:
+                batches = [self.fetch_window(symbol, interval, a, b) for a, b in windows]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(windows))) as ex:
+                    batches = list(ex.map(lambda w: self.fetch_window(symbol, interval, *w), windows))
+            rows = [row for batch in batches for row in batch]
+
+        seen, out = set(), []
+        for row in rows:
+            ot = int(row[0])
+            if ot in seen:
+                continue
+            if (start_ms is not None and ot < start_ms) or (end_ms is not None and ot > end_ms):
+                continue
+            seen.add(ot)
+            out.append(row)
+        out.sort(key=lambda r: int(r[0]))
+        return out
+
+
+_DEFAULT: Optional[KlineFetcher] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_fetcher() -> KlineFetcher:
+    """Fetcher dùng chung trong process (chung session + rate limiter)."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = KlineFetcher()
+        return _DEFAULT
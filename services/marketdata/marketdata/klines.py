@@ -0,0 +1,108 @@
+# marketdata/klines.py
+"""
+Đọc nến qua kho chung trên đĩa (read-through), dùng cho cả backtest và predict.
+
+- Nến ĐÃ ĐÓNG được lưu trong KlineStore (KLINE_STORE_DIR; trong docker-compose
+  là volume kline_data mount vào cả hai service): mỗi khoảng (symbol, interval)
+  chỉ tải từ sàn một lần, lần sau đọc memmap.
+- Request coalescing: phần còn thiếu được tải trong lúc giữ flock của
+  (symbol, interval). Request đồng thời (thread khác, worker khác hay service
+  khác cùng mount kho) chờ lock rồi tính lại phần thiếu — thường là không còn
+  gì — và đọc luôn dữ liệu vừa ghi.
+- Nến đang chạy (chưa đóng) luôn lấy trực tiếp và không lưu.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from marketdata.fetcher import default_fetcher, interval_ms
+from marketdata.store import COLUMNS, DTYPES, KlineStore
+
+KLINE_STORE_ENABLED = os.getenv("KLINE_STORE_ENABLED", "1") == "1"
+
+_STORE: Optional[KlineStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def default_store() -> KlineStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = KlineStore()
+        return _STORE
+
+
+def rows_to_columns(rows: list) -> Dict[str, np.ndarray]:
+    """Kline thô của Binance → cột t (int64 ms) + OHLCV float64."""
+    if not rows:
+        return {c: np.empty(0, dtype=DTYPES[c]) for c in COLUMNS}
+    cols = {"t": np.fromiter((int(r[0]) for r in rows), dtype=np.int64, count=len(rows))}
+    for j, c in enumerate(COLUMNS[1:], start=1):
+        cols[c] = np.fromiter((float(r[j]) for r in rows), dtype=np.float64, count=len(rows))
+    return cols
+
+
+def fetch_remote(symbol: str, interval: str, start_ms: Optional[int] = None,
+                 end_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Tải thẳng từ Binance REST, không qua kho."""
+    return rows_to_columns(default_fetcher().fetch(symbol, interval, start_ms, end_ms))
+
+
+def last_closed_ms(interval: str, now_ms: Optional[int] = None) -> int:
+    """Open time của nến đã đóng gần nhất (nến [T, T+iv) đóng khi T+iv <= now)."""
+    iv = interval_ms(interval)
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    return (now_ms // iv) * iv - iv
+
+
+def sync_klines(symbol: str, interval: str, start_ms: int, end_ms: int,
+                store: Optional[KlineStore] = None) -> int:
+    """
+    Đảm bảo store có mọi nến ĐÃ ĐÓNG trong [start_ms, end_ms]: chỉ tải phần
+    thiếu (đầu/đuôi/gap) rồi merge vào store. Trả về open time của nến đã đóng
+    cuối cùng (mốc mà store được phép phủ tới).
+    """
+    store = store or default_store()
+    iv = interval_ms(interval)
+    last_closed = last_closed_ms(interval)
+    hi = min(end_ms, last_closed)
+    if hi < start_ms:
+        return last_closed
+    if not store.missing_ranges(symbol, interval, start_ms, hi, iv):
+        return last_closed  # đủ rồi: không cần lock
+    # giữ lock khi tải: request song song cho cùng symbol/interval sẽ đợi rồi đọc lại store
+    with store.lock(symbol, interval):
+        for a, b in store.missing_ranges(symbol, interval, start_ms, hi, iv):
+            store.write(symbol, interval, fetch_remote(symbol, interval, a, b), verified=(a, b))
+    return last_closed
+
+
+def load_klines(symbol: str, interval: str, start_ms: Optional[int] = None,
+                end_ms: Optional[int] = None, store: Optional[KlineStore] = None,
+                live: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Các cột t/open/high/low/close/volume của nến trong [start_ms, end_ms].
+    start_ms=None → `limit` nến mới nhất tính tới end_ms (như một request Binance không startTime).
+    live=True: nối thêm nến đang chạy nếu khoảng chạm tới hiện tại.
+    Không có store (KLINE_STORE_ENABLED=0) → tải thẳng từ sàn.
+    """
+    if not KLINE_STORE_ENABLED:
+        return fetch_remote(symbol, interval, start_ms, end_ms)
+
+    store = store or default_store()
+    iv = interval_ms(interval)
+    now_ms = int(time.time() * 1000)
+    if start_ms is None:
+        anchor = min(end_ms, now_ms) if end_ms is not None else now_ms
+        start_ms = (anchor // iv) * iv - (default_fetcher().limit - 1) * iv
+
+    last_closed = sync_klines(symbol, interval, start_ms, end_ms if end_ms is not None else now_ms, store)
+    out = store.read(symbol, interval, start_ms, end_ms)
+    if live and (end_ms is None or end_ms >= last_closed + iv):
+        tail = fetch_remote(symbol, interval, last_closed + iv, end_ms)
+        if len(tail["t"]):
+            out = {c: np.concatenate([out[c], tail[c]]) for c in COLUMNS}
+    return out
@@ -0,0 +1,226 @@
+# marketdata/store.py
+"""
+Kho nến OHLCV trên đĩa, dạng cột, theo (symbol, interval).
+
+Layout:
+    {root}/{SYMBOL}/{interval}/meta.json   {"rows", "gen", "first", "last", "verified": [[a, b], ...]}
+    {root}/{SYMBOL}/{interval}/.lock       flock cho writer
+    {root}/{SYMBOL}/{interval}/[g{gen}/]t.bin     int64 (open time, epoch ms), tăng dần, không trùng
+    {root}/{SYMBOL}/{interval}/[g{gen}/]open.bin  float64 (tương tự high/low/close/volume)
+  (gen = 0: các file cột nằm thẳng trong thư mục — layout cũ)
+
+- Đọc: đọc meta.json một lần (rows + gen) rồi np.memmap + searchsorted → slice
+  view, không copy; reader không cần lock.
+- Ghi nối đuôi (trường hợp phổ biến): append bytes vào từng file cột của gen hiện
+  tại rồi mới ghi meta.json (rows) → reader luôn thấy một prefix nhất quán.
+- Ghi chèn giữa (lấp gap / lịch sử cũ hơn): merge vào thư mục gen mới rồi chuyển
+  sang bằng một lần os.replace meta.json → reader thấy trọn gen cũ hoặc trọn gen
+  mới, không bao giờ trộn cột của hai gen. Gen trước đó được giữ lại (cho reader
+  vừa đọc meta cũ), các gen cũ hơn bị xoá.
+- "verified": các khoảng đã tải từ sàn; lỗ hổng còn lại trong đó là gap thật
+  của sàn nên không tải lại.
+"""
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+KLINE_STORE_DIR = os.getenv("KLINE_STORE_DIR", "./kline_store")
+
+COLUMNS: Tuple[str, ...] = ("t", "open", "high", "low", "close", "volume")
+DTYPES = {"t": np.int64, "open": np.float64, "high": np.float64,
+          "low": np.float64, "close": np.float64, "volume": np.float64}
+
+
+def _merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+    out: List[List[int]] = []
+    for a, b in sorted(ranges):
+        if out and a <= out[-1][1] + 1:
+            out[-1][1] = max(out[-1][1], b)
+        else:
+            out.append([a, b])
+    return out
+
+
+def _subtract(a: int, b: int, ranges: List[List[int]]) -> List[Tuple[int, int]]:
+    """[a, b] trừ đi các khoảng trong `ranges` (đã merge, tăng dần)."""
+    out, cur = [], a
+    for ra, rb in ranges:
+        if rb < cur or ra > b:
+            continue
+        if ra > cur:
+            out.append((cur, ra - 1))
+        cur = max(cur, rb + 1)
+        if cur > b:
+            break
+    if cur <= b:
+        out.append((cur, b))
+    return out
+
+
+class KlineStore:
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or KLINE_STORE_DIR
+
+    # ---------- paths / meta
+    def _dir(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, symbol.upper(), interval)
+
+    def _gen_dir(self, symbol: str, interval: str, gen: int) -> str:
+        d = self._dir(symbol, interval)
+        return os.path.join(d, f"g{gen}") if gen else d
+
+    def _col_path(self, symbol: str, interval: str, col: str, gen: int = 0) -> str:
+        return os.path.join(self._gen_dir(symbol, interval, gen), f"{col}.bin")
+
+    def meta(self, symbol: str, interval: str) -> Dict:
+        path = os.path.join(self._dir(symbol, interval), "meta.json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"rows": 0, "gen": 0, "first": None, "last": None, "verified": []}
+
+    def _write_meta(self, symbol: str, interval: str, meta: Dict):
+        d = self._dir(symbol, interval)
+        tmp = os.path.join(d, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(d, "meta.json"))
+
+    @contextmanager
+    def lock(self, symbol: str, interval: str):
+        """Khoá độc quyền (liên process) cho một (symbol, interval)."""
+        d = self._dir(symbol, interval)
+        os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, ".lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    # ---------- read
+    def _columns(self, symbol: str, interval: str, meta: Dict) -> Dict[str, np.ndarray]:
+        """Các cột của đúng snapshot `meta` (rows + gen)."""
+        rows, gen = int(meta["rows"]), int(meta.get("gen", 0))
+        if rows == 0:
+            return {c: np.empty(0, dtype=DTYPES[c]) for c in COLUMNS}
+        return {c: np.memmap(self._col_path(symbol, interval, c, gen), dtype=DTYPES[c], mode="r", shape=(rows,))
+                for c in COLUMNS}
+
+    def _snapshot(self, symbol: str, interval: str) -> Dict[str, np.ndarray]:
+        # gen của meta vừa đọc có thể đã bị xoá nếu có 2 lần merge xen vào → đọc lại meta
+        for _ in range(3):
+            try:
+                return self._columns(symbol, interval, self.meta(symbol, interval))
+            except FileNotFoundError:
+                continue
+        return self._columns(symbol, interval, self.meta(symbol, interval))
+
+    def read(self, symbol: str, interval: str,
+             start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Các cột trong [start_ms, end_ms] (bao gồm 2 đầu) — view trên memmap, không copy."""
+        cols = self._snapshot(symbol, interval)
+        t = cols["t"]
+        lo = 0 if start_ms is None else int(np.searchsorted(t, start_ms, side="left"))
+        hi = len(t) if end_ms is None else int(np.searchsorted(t, end_ms, side="right"))
+        return {c: v[lo:hi] for c, v in cols.items()}
+
+    def missing_ranges(self, symbol: str, interval: str, start_ms: int, end_ms: int,
+                       interval_ms: int) -> List[Tuple[int, int]]:
+        """Các khoảng [a, b] (ms) trong [start_ms, end_ms] chưa có nến và chưa từng được tải."""
+        if end_ms < start_ms:
+            return []
+        meta = self.meta(symbol, interval)
+        verified = meta.get("verified", [])
+        if not meta["rows"]:
+            return _subtract(start_ms, end_ms, verified)
+
+        t = self.read(symbol, interval, start_ms, end_ms)["t"]
+        holes: List[Tuple[int, int]] = []
+        if len(t) == 0:
+            holes.append((start_ms, end_ms))
+        else:
+            if t[0] > start_ms:
+                holes.append((start_ms, int(t[0]) - 1))
+            gaps = np.flatnonzero(np.diff(t) > interval_ms)
+            holes.extend((int(t[i]) + interval_ms, int(t[i + 1]) - 1) for i in gaps)
+            if t[-1] + interval_ms <= end_ms:
+                holes.append((int(t[-1]) + interval_ms, end_ms))
+
+        out: List[Tuple[int, int]] = []
+        for a, b in holes:
+            out.extend(_subtract(a, b, verified))
+        return out
+
+    # ---------- write
+    def write(self, symbol: str, interval: str, data: Dict[str, np.ndarray],
+              verified: Optional[Tuple[int, int]] = None):
+        """
+        Merge các cột `data` (t tăng dần) vào store; `verified` = khoảng vừa tải
+        từ sàn (kể cả khi không có nến nào). Gọi trong `with store.lock(...)`.
+        """
+        meta = self.meta(symbol, interval)
+        rows, gen = int(meta["rows"]), int(meta.get("gen", 0))
+        new = {c: np.ascontiguousarray(data[c], dtype=DTYPES[c]) for c in COLUMNS}
+        d = self._dir(symbol, interval)
+        os.makedirs(d, exist_ok=True)
+        old_gen = None
+
+        if len(new["t"]):
+            if rows == 0 or new["t"][0] > meta["last"]:
+                # append nhanh; cắt phần dư nếu lần ghi trước bị dừng giữa chừng
+                for c in COLUMNS:
+                    with open(self._col_path(symbol, interval, c, gen), "ab") as f:
+                        f.truncate(rows * np.dtype(DTYPES[c]).itemsize)
+                        f.write(new[c].tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                rows += len(new["t"])
+            else:
+                old = self._columns(symbol, interval, meta)
+                t_all = np.concatenate([new["t"], old["t"]])
+                # np.unique giữ lần xuất hiện đầu → nến mới ghi đè nến cũ cùng t
+                t_uniq, idx = np.unique(t_all, return_index=True)
+                # ghi trọn các cột vào gen mới; reader vẫn đọc gen cũ tới khi meta.json đổi
+                old_gen, gen = gen, gen + 1
+                gd = self._gen_dir(symbol, interval, gen)
+                shutil.rmtree(gd, ignore_errors=True)  # sót lại từ lần merge bị dừng giữa chừng
+                os.makedirs(gd)
+                for c in COLUMNS:
+                    merged = np.concatenate([new[c], old[c]])[idx] if c != "t" else t_uniq
+                    with open(self._col_path(symbol, interval, c, gen), "wb") as f:
+                        f.write(merged.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                rows = len(t_uniq)
+
+        if rows:
+            t = self._columns(symbol, interval, {"rows": rows, "gen": gen})["t"]
+            meta["first"], meta["last"] = int(t[0]), int(t[-1])
+        meta["rows"], meta["gen"] = rows, gen
+        if verified is not None:
+            meta["verified"] = _merge_ranges(meta.get("verified", []) + [[int(verified[0]), int(verified[1])]])
+        self._write_meta(symbol, interval, meta)
+        if old_gen is not None:
+            self._drop_gens(symbol, interval, keep=(old_gen, gen))
+
+    def _drop_gens(self, symbol: str, interval: str, keep: Tuple[int, int]):
+        """Xoá file cột của các gen không còn được tham chiếu (giữ gen hiện tại và gen ngay trước)."""
+        d = self._dir(symbol, interval)
+        if 0 not in keep:
+            for c in COLUMNS:
+                try:
+                    os.remove(self._col_path(symbol, interval, c, 0))
+                except FileNotFoundError:
+                    pass
+        for name in os.listdir(d):
+            if name.startswith("g") and name[1:].isdigit() and int(name[1:]) not in keep:
+                shutil.rmtree(os.path.join(d, name), ignore_errors=True)